@@ -9,7 +9,7 @@ def make_system_prompt(agent_role: str):
         Eres un asistente IA del área de Gestión Humana y debes ayudar a procesar las solicitudes de vacaciones.
         Asegurate que las respuestas sean en español.
         Asegurate de obtener la información necesaria de las herramientas disponibles.
-        Asegurate de no llamar a las herramientas de forma paralela o dará error, y puedes usar la carpeta "./adjuntos" para guardar archivos.
+        Puedes llamar a varias herramientas a la vez cuando sus llamadas no dependen entre si, y puedes usar la carpeta "./adjuntos" para guardar archivos.
 
         A continuación explico el procedimiento para procesar las solicitudes de vacaciones:
 
@@ -33,27 +33,66 @@ def make_system_prompt(agent_role: str):
         
     )
 
-def build_vacation_request_agent():
-    from validar_solicitud import validate_pdf
+#Instrucción inicial para el agente o supervisor, en modo incremental solo se consideran los correos nuevos
+def search_instruction(action: str, incremental: bool = False) -> str:
+    if incremental:
+        return f"{action} las posibles solicitudes de vacaciones de los correos nuevos"
+    return f"{action} las posibles solicitudes de vacaciones de los ultimos 7 días"
+
+#Si se envia sync_state (sincronizacion_bandeja.py), el agente busca solo los correos nuevos desde la ultima ejecución
+#Si se envia checkpointer (puntos_control.py), el estado del agente se guarda en cada paso para poder continuarlo
+#(cuando el agente es parte del supervisor no se envia, usa el checkpointer del supervisor)
+def build_vacation_request_agent(sync_state=None, checkpointer=None):
+    from validar_solicitud import get_validation_mode, validate_pdf, validate_vacation_request
     #Esta herramienta se personalizo en el modulo gmail_get_message_with_attachments.py, 
     #ver comentarios en el código para mas detalle
-    from gmail_get_message_with_attachments import GmailGetMessageWithAttachments
-    from langchain_google_community import GmailToolkit
+    from gmail_get_message_with_attachments import GmailGetMessageWithAttachments, GmailBatchGetMessagesWithAttachments
+    from recursos_gmail import get_gmail_toolkit
+    from triaje_correos import GmailTriageMessages, is_triage_enabled
     from langchain_google_community.gmail.search import GmailSearch
-    from langchain.chat_models import init_chat_model
+    from registro_modelos import get_chat_model
     from langgraph.prebuilt import create_react_agent
+    from contexto_mensajes import HANDOFF_INSTRUCTIONS, make_pre_model_hook
 
-    #Se crea el chat model a usar con buena capacidad agentica o Tool Calling
-    llm = init_chat_model("google_genai:gemini-2.0-flash", temperature=0)
+    #Se obtiene el chat model compartido (registro_modelos.py) con buena capacidad agentica o Tool Calling
+    llm = get_chat_model("google_genai:gemini-2.0-flash", temperature=0)
 
     #Se instancia el Toolkit para GMail con el definiremos herramientas a usar
-    toolkit = GmailToolkit()
+    toolkit = get_gmail_toolkit()
     #Se crea la lista de herramientas necesarias para el agente
+    if sync_state is None:
+        search_tool = GmailSearch(api_resource=toolkit.api_resource) #Herramienta para hacer la busqueda en la bandeja de correo
+    else:
+        from sincronizacion_bandeja import GmailSearchNewMessages
+        #Herramienta que devuelve solo los correos nuevos (API de historial de GMail) que no fueron procesados
+        search_tool = GmailSearchNewMessages(api_resource=toolkit.api_resource, state=sync_state)
     vacation_request_tools = [
-        GmailSearch(api_resource=toolkit.api_resource), #Herramienta para hacer la busqueda en la bandeja de correo
-        GmailGetMessageWithAttachments(api_resource=toolkit.api_resource),  #Esta herramienta es personalizada y leera los correos
-        validate_pdf, #Herramienta creada en el primer ejemplo para validar si un PDF es una solicitud de vacaciones válida
+        search_tool,
+        #Esta herramienta es personalizada y leera los correos, solo descarga los adjuntos PDF (los demas se registran como omitidos)
+        GmailGetMessageWithAttachments(api_resource=toolkit.api_resource, lazy_attachments=True),
+        #Variante que lee varios correos en una sola llamada (peticiones batch del API de GMail), evita una llamada por cada correo
+        GmailBatchGetMessagesWithAttachments(api_resource=toolkit.api_resource, lazy_attachments=True),
     ]
+    triage_hint = ""
+    if is_triage_enabled():
+        #Herramienta que descarta los correos solo con sus metadatos, antes de leerlos completos (triaje_correos.py)
+        vacation_request_tools.append(GmailTriageMessages(api_resource=toolkit.api_resource, sync_state=sync_state))
+        triage_hint = (
+            "Antes de leer los correos encontrados en la busqueda, usa la herramienta de triaje con sus ids: "
+            "lee y valida solo los correos candidatos, los correos sin PDF son solicitudes invalidas porque no tienen "
+            "un archivo adjunto con formato PDF (no es necesario leerlos) y los demas correos se descartan."
+        )
+    if get_validation_mode() == "structured":
+        #Herramienta que devuelve el veredicto final del correo (las condiciones de validez se revisan en código)
+        vacation_request_tools.append(validate_vacation_request)
+        validation_hint = (
+            "Para validar cada correo usa la herramienta que devuelve el veredicto final con sus archivos adjuntos, "
+            "no vuelvas a evaluar las condiciones, usa el veredicto y el motivo de rechazo tal como los devuelve."
+        )
+    else:
+        #Herramienta creada en el primer ejemplo para validar si un PDF es una solicitud de vacaciones válida
+        vacation_request_tools.append(validate_pdf)
+        validation_hint = "Asegurate de que cada solicitud cumpla todas las condiciones para considerarla válida."
 
     #Se definen el aegente con su respecitvo LLM, Prompt y herramientas
     #Notese que en el Prompt tiene en su contexto todo el procedimiento pero se le indica un rol limitado
@@ -64,39 +103,92 @@ def build_vacation_request_agent():
             "Tu rol es solo buscar las posibles solicitudes de vacaciones, e identificar si son validas o invalidas,"
             "aunque no tengan archivos adjuntos se deben considerar como invalidas y procesarlas."
             "Considerar que los archivos adjuntos de cada correo se guardan en una subcarpeta que se llama igual al id del correo, como [carpeta_de_trabajo]/[id_correo]."
-            "Asegurate de que cada solicitud cumpla todas las condiciones para considerarla válida."
+            "Para leer los correos encontrados en la busqueda, usa una sola llamada a la herramienta que obtiene varios correos a la vez con la lista de sus ids."
+            + triage_hint + validation_hint +
             "También mostrar la fecha y hora de recepción de su correo."
             "Trabajas con otro agente que se encargará de procesar las solicitudes que tu encuentres."
+            + HANDOFF_INSTRUCTIONS
         ),
-        name="vacation_request_agent"
+        #Antes de cada llamada al LLM se compactan los mensajes (contexto_mensajes.py), el costo por llamada no crece con los correos
+        pre_model_hook=make_pre_model_hook(),
+        name="vacation_request_agent",
+        checkpointer=checkpointer,
     )
     return vacation_request_agent
 
 #Esta es la lógica principal del ejemplo
 def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Agente que busca las solicitudes de vacaciones")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo los correos nuevos desde la ultima ejecución (historyId de GMail)")
+    parser.add_argument("--resume", metavar="THREAD_ID", default=None,
+                        help="Continuar una ejecución interrumpida desde su ultimo checkpoint (SQLite)")
+    options = parser.parse_args(args)
+
     from dotenv import load_dotenv
     # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
     load_dotenv()
 
+    #Metricas de cada modelo, herramienta y nodo de los grafos (metricas.py), el resumen se muestra al terminar
+    import json
+    from metricas import enable_metrics, get_metrics_summary
+    enable_metrics()
+
     from langchain_core.messages import HumanMessage
 
-    #Creamos instancia del agente de solicitudes de vacaciones
-    vacation_request_agent = build_vacation_request_agent()
-    
-    #Se ejecuta el agente en modo stream que envia las respuestas según las va generando
-    events = vacation_request_agent.stream(
-        {"messages": [
-            HumanMessage("Buscar las posibles solicitudes de vacaciones de los ultimos 7 días"
-                         )
-        ]},
-        {"recursion_limit": 100},
-        stream_mode="values",
-    )
+    #En modo incremental se usa el estado guardado de la ultima ejecución
+    sync_state = None
+    if options.incremental:
+        from sincronizacion_bandeja import get_inbox_sync_state
+        sync_state = get_inbox_sync_state()
+
+    #Cada ejecución tiene un thread_id, con el que se guardan sus checkpoints y se puede continuar si se interrumpe
+    from puntos_control import new_thread_id, open_checkpointer, resume_input, run_config
+    from contexto_mensajes import TokenBudgetCallback
+    thread_id = options.resume or new_thread_id()
+    #El callback cuenta los tokens de cada llamada al LLM y detiene la ejecución si se agota RUN_TOKEN_BUDGET
+    token_budget = TokenBudgetCallback.from_env()
+    config = {**run_config(thread_id), "callbacks": [token_budget]}
+    if sync_state is not None:
+        #Registra los correos cuyas herramientas fallaron, para no marcarlos como procesados al confirmar
+        from sincronizacion_bandeja import InboxSyncCallback
+        sync_callback = InboxSyncCallback(sync_state)
+        config["callbacks"].append(sync_callback)
+    print(f"thread_id de la ejecución: {thread_id} (para continuarla si se interrumpe: --resume {thread_id})")
+
+    with open_checkpointer() as checkpointer:
+        #Creamos instancia del agente de solicitudes de vacaciones
+        vacation_request_agent = build_vacation_request_agent(sync_state, checkpointer=checkpointer)
+
+        #Al continuar, si quedaron pasos pendientes se retoma desde el ultimo checkpoint (entrada None)
+        if options.resume:
+            agent_input = resume_input(vacation_request_agent, config, "Buscar", thread_id)
+        else:
+            agent_input = {"messages": [HumanMessage(search_instruction("Buscar", options.incremental))]}
+
+        #Se ejecuta el agente en modo stream que envia las respuestas según las va generando
+        events = vacation_request_agent.stream(
+            agent_input,
+            config,
+            stream_mode="values",
+        )
+
+        #Se va mostrando en la consola cada interacción o mensaje del agente
+        #Se puede ver el detalle de lo que hace el agente al revisar la traza en LangSmith (incluyendo las llamdas a las herrameintas)
+        try:
+            for event in events:
+                event["messages"][-1].pretty_print()
+        except Exception:
+            print(f"Ejecución interrumpida, para continuarla: --resume {thread_id}")
+            raise
+        finally:
+            print("Tokens de la ejecución:", token_budget.report())
+            print("Metricas de la ejecución:", json.dumps(get_metrics_summary(), ensure_ascii=False, indent=2))
 
-    #Se va mostrando en la consola cada interacción o mensaje del agente
-    #Se puede ver el detalle de lo que hace el agente al revisar la traza en LangSmith (incluyendo las llamdas a las herrameintas)
-    for event in events:
-        event["messages"][-1].pretty_print()
+    #Si la ejecución termino bien, se guarda el historyId y los correos procesados (salvo los que fallaron)
+    if sync_state is not None:
+        print(sync_state.commit())
 
 #Solo se llamará al método principal si se ejecuta este modulo directamente
 if __name__ == "__main__":
@@ -1,19 +1,102 @@
+#Modelo y versión del prompt usados para validar, forman parte de la llave de la cache de validaciones
+#(si se cambia el modelo o el texto del prompt, se debe cambiar la versión para no reutilizar resultados anteriores)
+VALIDATION_MODEL = "openai:gpt-4o-mini"
+PROMPT_VERSION = "v1"
+
 #Funcion para convertir un archivo local a Base64
+#Si el PDF tiene mas páginas de las necesarias, se codifica un PDF reducido con las páginas del formato (recorte_pdf.py),
+#si no, el archivo se mapea en memoria y se codifica por bloques, sin leer antes una copia completa del archivo
 def _get_base64_file(folder: str, file_name: str)-> str:
-    """Obtiene el contenido de un archivo en base64"""
-    import base64
+    """Obtiene el contenido de un archivo (o de su versión reducida) en base64"""
     from pathlib import Path
+    from archivos_pdf import encode_base64, open_pdf_buffer
+    from recorte_pdf import trim_pdf
 
     folder_path = Path(folder)
     file_path = folder_path / file_name
 
-    with open(file_path, "rb") as f:
-        pdf = base64.b64encode(f.read()).decode("utf-8")
+    trimmed = trim_pdf(file_path)
+    if trimmed.data is not None:
+        return encode_base64(trimmed.data)
+
+    with open_pdf_buffer(file_path) as buffer:
+        pdf = encode_base64(buffer)
     return pdf
 
-#Funcion que usara un LLM para validar si un archivo es una solicitud de vacaciones válida
+#Texto de la consulta que se envia al LLM junto con el PDF
+VALIDATION_QUERY = """"
+                            ¿El contenido del documento es una solicitud de vacaciones?, 
+                            si es así, obtener lo siguiente:
+                            el nombre del solicitante 
+                            si hay una firma
+                            """
+
+#Funcion que consulta la cache de validaciones, devuelve el resultado guardado (o None) y la llave del PDF
+def _get_cached_validation(file_hash: str):
+    from cache_validacion import get_validation_cache
+    from recorte_pdf import get_trim_cache_tag
+
+    cache = get_validation_cache()
+    cache_key = cache.make_key(file_hash, VALIDATION_MODEL, PROMPT_VERSION, get_trim_cache_tag())
+    return cache.get(cache_key), cache_key
+
+#Funcion que consulta la cache de validaciones para un archivo local
+def _get_cached_file_validation(folder: str, file_name: str):
+    from pathlib import Path
+    from cache_validacion import file_sha256
+
+    return _get_cached_validation(file_sha256(Path(folder) / file_name))
+
+#Funcion que guarda en la cache la respuesta del LLM para no volver a enviar el mismo PDF
+def _save_validation(cache_key: str, result) -> None:
+    from cache_validacion import get_validation_cache
+
+    if isinstance(result, str):
+        get_validation_cache().set(cache_key, result)
+
+#Funcion que ejecuta el prefiltro local, devuelve el texto de rechazo o None si el PDF se debe enviar al LLM
+def _prefilter_file(folder: str, file_name: str):
+    from pathlib import Path
+    from prefiltro_solicitud import check_pdf
+
+    return check_pdf(Path(folder) / file_name)
+
+#Funcion que crea los mensajes con el contenido del PDF (en base64) a validar
 #Al momento de esta publicación, Langchain no soporta archivo PDF de forma dinámica (con plantillas), 
-#por eso se crea un mensaje estático con el contenido de cada PDF, pero el texto si es dinámico
+#por eso se crea un mensaje estático con el contenido de cada PDF, y se envia junto al texto de la consulta
+#(los mensajes se crean directamente, sin armar una plantilla y una cadena en cada llamada)
+def _build_pdf_messages(pdf_base64: str, file_name: str) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    return [
+        SystemMessage("""Asegurate que las respuestas sean en español."""),
+        HumanMessage(
+            [
+                {
+                    "type": "file",
+                    "source_type": "base64",
+                    "data": pdf_base64,
+                    "filename": file_name,
+                    "mime_type": "application/pdf",
+                }                    
+            ]),
+        HumanMessage(VALIDATION_QUERY),
+    ]
+
+#Funcion que crea los mensajes con el contenido de un archivo local
+def _build_validation_messages(folder: str, file_name: str) -> list:
+    #Obtengo el contenido del archivo en Base64 para poder enviarlo al API del LLM
+    return _build_pdf_messages(_get_base64_file(folder, file_name), file_name)
+
+#Funcion que devuelve el chat model compartido usando un modelo que soporta recibir PDFs
+#En este ejemplo usaremos GPT4o mini, el cliente (y su pool de conexiones) se crea una sola vez
+#Si deseas puedes usar Gemini, cambiando VALIDATION_MODEL por "google_genai:gemini-2.0-flash-lite"
+def _get_validation_llm():
+    from registro_modelos import get_chat_model
+
+    return get_chat_model(VALIDATION_MODEL)
+
+#Funcion que usara un LLM para validar si un archivo es una solicitud de vacaciones válida
 def validate_pdf(folder: str, file_name: str)-> str:
     """Devuelve  si el contenido del archivo pdf es una solicitud de vacaciones, 
     el nombre del solicitante y si el documento tiene una firma
@@ -24,74 +107,251 @@ def validate_pdf(folder: str, file_name: str)-> str:
     """
     if file_name[-4:].lower()!=".pdf":
         return "El archivo no es un PDF, no es una solicitud de vacaciones"
-    
-    from langchain.chat_models import init_chat_model
-    from langchain_core.messages import HumanMessage, SystemMessage
-    from langchain_core.prompts import ChatPromptTemplate
-    
-    #Se crea el chat model usando un modelo que soporta recibir PDFs
-    #En este ejemplo usaremos GPT4o mini
-    llm = init_chat_model("gpt-4o-mini", model_provider="openai")
-    #Si deseas puedes usar Gemini, comentando la linea anterior y descomentando la siguiente
-    #llm = init_chat_model("google_genai:gemini-2.0-flash-lite", temperature=0)
 
-    #Obtengo el contenido del archivo en Base64 para poder enviarlo al API del LLM
-    pdf_base64 = _get_base64_file(folder, file_name)
-
-    #Se crea el prompt desde los mensajes y plantilla (ultimo mensaje con {query})
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage("""Asegurate que las respuestas sean en español."""),
-            HumanMessage(
-                [
-                    {
-                        "type": "file",
-                        "source_type": "base64",
-                        "data": pdf_base64,
-                        "filename": file_name,
-                        "mime_type": "application/pdf",
-                    }                    
-                ]),
-            ("human", "{query}"),
-        ]
-    )
-    
-    #Se encadena el output del prompt con el input del llm
-    chain = prompt | llm
+    #Si el mismo PDF (por contenido) ya fue validado con el mismo modelo y prompt, se devuelve el resultado guardado
+    cached_result, cache_key = _get_cached_file_validation(folder, file_name)
+    if cached_result is not None:
+        return cached_result
+
+    #Prefiltro local: los PDFs que claramente no son solicitudes se descartan sin llamar al LLM
+    rejection = _prefilter_file(folder, file_name)
+    if rejection is not None:
+        return rejection
+
+    messages = _build_validation_messages(folder, file_name)
     
-    # Ejecuta la cadena 
     # Envio el PDF al LLM para que lo valide segun las instrucciones indicadas
-    response = chain.invoke({"query":""""
-                            ¿El contenido del documento es una solicitud de vacaciones?, 
-                            si es así, obtener lo siguiente:
-                            el nombre del solicitante 
-                            si hay una firma
-                            """})
+    response = _get_validation_llm().invoke(messages)
+
+    _save_validation(cache_key, response.content)
 
     #Solo se devuleve un texto con la respuesta del pedido de validación del PDF (el formato es libre y lo redacta el LLM)
     return response.content
 
+#Version asincrona de validate_pdf, no bloquea un hilo del servidor mientras se espera la respuesta del LLM
+#(la lectura del archivo y la cache se ejecutan en un hilo aparte porque son operaciones de disco)
+async def avalidate_pdf(folder: str, file_name: str)-> str:
+    """Devuelve  si el contenido del archivo pdf es una solicitud de vacaciones, 
+    el nombre del solicitante y si el documento tiene una firma
+    
+    Args: 
+        folder: carpeta del archivo a validar
+        file_name: nombre del archivo a validar
+    """
+    import asyncio
 
-#Esta es la lógica principal del ejemplo que iniciara un servicio REST
-def main(args=None):
-    from dotenv import load_dotenv
-    from fastapi import FastAPI
-    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
-    load_dotenv()
+    if file_name[-4:].lower()!=".pdf":
+        return "El archivo no es un PDF, no es una solicitud de vacaciones"
+
+    cached_result, cache_key = await asyncio.to_thread(_get_cached_file_validation, folder, file_name)
+    if cached_result is not None:
+        return cached_result
+
+    rejection = await asyncio.to_thread(_prefilter_file, folder, file_name)
+    if rejection is not None:
+        return rejection
+
+    messages = await asyncio.to_thread(_build_validation_messages, folder, file_name)
+    response = await _get_validation_llm().ainvoke(messages)
+
+    await asyncio.to_thread(_save_validation, cache_key, response.content)
+    return response.content
+
+#Valida un PDF recibido por el endpoint de carga de archivos (ya guardado en un archivo temporal)
+#El hash para la cache y el base64 se calculan sobre el mismo buffer, sin copias completas del archivo
+async def avalidate_pdf_upload(spooled_file, file_name: str)-> str:
+    """Devuelve  si el contenido del archivo pdf es una solicitud de vacaciones, 
+    el nombre del solicitante y si el documento tiene una firma
     
-    from pydantic import BaseModel
+    Args: 
+        spooled_file: archivo temporal con el contenido del PDF
+        file_name: nombre del archivo a validar
+    """
+    import asyncio
+    import hashlib
+    from archivos_pdf import encode_base64, spooled_file_buffer
+
+    from prefiltro_solicitud import check_pdf
+    from recorte_pdf import trim_pdf
+
+    def prepare():
+        with spooled_file_buffer(spooled_file) as buffer:
+            cached_result, cache_key = _get_cached_validation(hashlib.sha256(buffer).hexdigest())
+            if cached_result is not None:
+                return cached_result, cache_key, None
+        #Prefiltro local: los PDFs que claramente no son solicitudes se descartan sin llamar al LLM
+        rejection = check_pdf(spooled_file)
+        if rejection is not None:
+            return rejection, cache_key, None
+        #Se envia al LLM un PDF reducido con las páginas del formato, si no se pudo reducir se envia el original
+        trimmed = trim_pdf(spooled_file)
+        if trimmed.data is not None:
+            return None, cache_key, _build_pdf_messages(encode_base64(trimmed.data), file_name)
+        with spooled_file_buffer(spooled_file) as buffer:
+            return None, cache_key, _build_pdf_messages(encode_base64(buffer), file_name)
+
+    cached_result, cache_key, messages = await asyncio.to_thread(prepare)
+    if cached_result is not None:
+        return cached_result
+
+    response = await _get_validation_llm().ainvoke(messages)
+
+    await asyncio.to_thread(_save_validation, cache_key, response.content)
+    return response.content
+
+#Excepción para rechazar una carga de archivo, con el código HTTP a devolver
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+#Recibe un PDF enviado como multipart/form-data leyendo el body por partes (sin cargarlo completo en memoria)
+#El archivo se escribe en un archivo temporal que se mantiene en memoria hasta spool_bytes y luego pasa a disco,
+#si se supera max_bytes se corta la lectura sin esperar el resto del body
+async def _receive_pdf_upload(request, field_name: str, max_bytes: int, spool_bytes: int):
+    import tempfile
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError(400, "Falta el boundary del contenido multipart/form-data")
+
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "is_file": False,
+             "file_name": None, "found": False, "size": 0}
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["is_file"] = False
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("utf-8", "replace") == field_name and b"filename" in options and not state["found"]:
+            state["is_file"] = True
+            state["found"] = True
+            state["file_name"] = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(data, start, end):
+        if not state["is_file"]:
+            return
+        state["size"] += end - start
+        if state["size"] > max_bytes:
+            raise UploadError(413, f"El archivo supera el tamaño máximo permitido ({max_bytes} bytes)")
+        spooled_file.write(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except Exception:
+        spooled_file.close()
+        raise
+
+    if not state["found"]:
+        spooled_file.close()
+        raise UploadError(400, f"No se envió el archivo en el campo '{field_name}'")
+    spooled_file.seek(0)
+    return spooled_file, state["file_name"]
+
+
+#Crea la aplicacion de FastAPI con los endpoints de validación
+def create_app():
+    import asyncio
+    import json
+    import os
+    import time
+    from contextlib import asynccontextmanager
+    from typing import List, Optional
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+    from pydantic import BaseModel, Field
     
     #Se define entidad para los parametros del body para nuestro endpoint
     class dto_payload(BaseModel):
         folder: str = '../pdfs'
         file_name: str = 'vacaciones.pdf'
+
+    #Entidad para validar varios archivos en una sola llamada
+    class dto_batch_payload(BaseModel):
+        items: List[dto_payload]
+        max_concurrency: Optional[int] = Field(
+            default=None, ge=1,
+            description="Cantidad máxima de validaciones simultaneas con el LLM (no puede superar VALIDATION_BATCH_MAX_CONCURRENCY)",
+        )
+
+    #Limite de llamadas simultaneas al LLM por cada lote (se puede configurar con variables de ambiente)
+    default_concurrency = int(os.getenv("VALIDATION_BATCH_CONCURRENCY", "8"))
+    max_concurrency = int(os.getenv("VALIDATION_BATCH_MAX_CONCURRENCY", "32"))
+    #Tamaño máximo de los PDFs cargados y tamaño hasta el que se mantienen en memoria antes de pasar a disco
+    upload_max_bytes = int(os.getenv("VALIDATION_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+    upload_spool_bytes = int(os.getenv("VALIDATION_UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+    
+    #Workers de la cola de trabajos en este proceso (cola_validaciones.py), 0 para usar solo workers en procesos aparte
+    job_workers = int(os.getenv("VALIDATION_JOB_WORKERS", "4"))
+    worker_pool = None
+
+    #Los workers se inician y detienen junto con el servidor
+    @asynccontextmanager
+    async def lifespan(app):
+        nonlocal worker_pool
+        if job_workers > 0:
+            from cola_validaciones import get_worker_pool
+            worker_pool = get_worker_pool(job_workers)
+            await worker_pool.start()
+        try:
+            yield
+        finally:
+            if worker_pool is not None:
+                await worker_pool.stop()
     
+    #Metricas de cada modelo, herramienta y nodo (metricas.py), se consultan en GET /metrics
+    from metricas import enable_metrics
+    metrics_enabled = enable_metrics()
+
     #Se crea aplicacion de FastAPI
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
+
+    #Latencia y errores de cada endpoint (por ruta, no por URL, para no crear una metrica por cada job_id)
+    if metrics_enabled:
+        @app.middleware("http")
+        async def metrics_middleware(request: Request, call_next):
+            from metricas import KIND_ENDPOINT, record_call
+            start = time.perf_counter()
+            error = None
+            try:
+                return await call_next(request)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                route = getattr(request.scope.get("route"), "path", request.url.path)
+                record_call(KIND_ENDPOINT, f"{request.method} {route}", time.perf_counter() - start, error)
 
     #Defino el endpoint para la validacion del recurso solicitud de vacaciones con FastAPI
+    #Es asincrono para no ocupar un hilo del servidor durante la llamada al LLM
     @app.post("/vacation_request/validate")
-    def validate_pdf_endpoint(dto: dto_payload)-> str:
+    async def validate_pdf_endpoint(dto: dto_payload)-> str:
         """Devuelve  si el contenido del archivo pdf es una solicitud de vacaciones, 
         el nombre del solicitante y si el documento tiene una firma
         
@@ -100,14 +360,184 @@ def main(args=None):
             file_name: nombre del archivo a validar
         """
         #Simplemente es una fachada y se redirige a la función que valida con un LLM
-        return validate_pdf(dto.folder, dto.file_name)
+        return await avalidate_pdf(dto.folder, dto.file_name)
+
+    #Endpoint para validar un lote de archivos de forma concurrente
+    #Los resultados se devuelven como NDJSON (un JSON por linea) en el orden en que van terminando
+    @app.post("/vacation_request/validate/batch")
+    async def validate_pdf_batch_endpoint(dto: dto_batch_payload):
+        """Valida una lista de archivos pdf y devuelve un resultado por cada archivo (NDJSON),
+        en el orden en que se completan, cada uno con su posición (index) en la lista enviada
+        
+        Args: 
+            items: lista de archivos a validar (folder y file_name)
+            max_concurrency: cantidad máxima de validaciones simultaneas
+        """
+        limit = min(dto.max_concurrency or default_concurrency, max_concurrency)
+        semaphore = asyncio.Semaphore(limit)
+
+        async def validate_item(index: int, item: dto_payload) -> dict:
+            result = {"index": index, "folder": item.folder, "file_name": item.file_name}
+            async with semaphore:
+                try:
+                    result["result"] = await avalidate_pdf(item.folder, item.file_name)
+                except Exception as e:
+                    #Un error en un archivo no debe detener el resto del lote
+                    result["error"] = str(e)
+            return result
+
+        async def stream_results():
+            tasks = [asyncio.create_task(validate_item(i, item)) for i, item in enumerate(dto.items)]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield json.dumps(await task, ensure_ascii=False) + "\n"
+            finally:
+                #Si el cliente cierra la conexión se cancelan las validaciones pendientes
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    #Endpoint para encolar una validación, responde de inmediato (202) con el id del trabajo
+    #La validación la hace un worker de la cola (en este proceso o en otro), sin ocupar la conexión HTTP
+    @app.post("/vacation_request/jobs", status_code=202)
+    async def create_job_endpoint(dto: dto_payload)-> dict:
+        """Encola la validación de un archivo pdf y devuelve el id del trabajo, 
+        el resultado se consulta con GET /vacation_request/jobs/{job_id}
+        
+        Args: 
+            folder: carpeta del archivo a validar
+            file_name: nombre del archivo a validar
+        """
+        from cola_validaciones import PENDING, get_job_queue
+
+        job_id = await asyncio.to_thread(get_job_queue().enqueue, dto.folder, dto.file_name)
+        if worker_pool is not None:
+            worker_pool.notify()
+        return {"job_id": job_id, "status": PENDING, "status_url": f"/vacation_request/jobs/{job_id}"}
+
+    #Endpoint para consultar la cantidad de trabajos en cola y los tiempos de espera y de procesamiento
+    #(se define antes que /vacation_request/jobs/{job_id} para que "stats" no se tome como un id)
+    @app.get("/vacation_request/jobs/stats")
+    async def job_stats_endpoint()-> dict:
+        """Devuelve la cantidad de trabajos por estado y los tiempos de espera y de procesamiento"""
+        from cola_validaciones import get_job_queue
+        return {**await asyncio.to_thread(get_job_queue().stats), "workers_in_process": job_workers}
+
+    #Endpoint para consultar el estado y el resultado de un trabajo
+    @app.get("/vacation_request/jobs/{job_id}")
+    async def get_job_endpoint(job_id: str)-> dict:
+        """Devuelve el estado del trabajo (pending, running, done o error) y su resultado
+        
+        Args: 
+            job_id: id del trabajo devuelto al encolar la validación
+        """
+        from cola_validaciones import get_job_queue
+
+        job = await asyncio.to_thread(get_job_queue().get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"No existe el trabajo {job_id}")
+        return job
+
+    #Endpoint para validar un PDF enviado como archivo (multipart/form-data, campo "file")
+    #No usa UploadFile porque FastAPI leeria todo el body antes de llamar al endpoint,
+    #aca se lee por partes para poder rechazar los archivos que superen el tamaño máximo
+    @app.post("/vacation_request/validate/upload", openapi_extra={
+        "requestBody": {"content": {"multipart/form-data": {"schema": {
+            "type": "object", "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}}}}}}})
+    async def validate_pdf_upload_endpoint(request: Request)-> str:
+        """Devuelve  si el contenido del archivo pdf enviado es una solicitud de vacaciones, 
+        el nombre del solicitante y si el documento tiene una firma
+        
+        Args: 
+            file: archivo pdf a validar (multipart/form-data)
+        """
+        if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+            raise HTTPException(status_code=415, detail="Se debe enviar el archivo como multipart/form-data")
+        #Si el cliente envia el tamaño del body, se rechaza antes de leerlo (se deja margen para los encabezados multipart)
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > upload_max_bytes + 64 * 1024:
+            raise HTTPException(status_code=413, detail=f"El archivo supera el tamaño máximo permitido ({upload_max_bytes} bytes)")
+
+        try:
+            spooled_file, file_name = await _receive_pdf_upload(request, "file", upload_max_bytes, upload_spool_bytes)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        with spooled_file:
+            #Se valida el contenido (firma %PDF) ademas de la extensión, para no enviar otro tipo de archivo al LLM
+            header = spooled_file.read(5)
+            spooled_file.seek(0)
+            if file_name[-4:].lower()!=".pdf" or header != b"%PDF-":
+                return "El archivo no es un PDF, no es una solicitud de vacaciones"
+            return await avalidate_pdf_upload(spooled_file, file_name)
 
+    #Endpoint para consultar los aciertos/fallos de la cache de validaciones
+    @app.get("/vacation_request/cache/stats")
+    def cache_stats_endpoint()-> dict:
+        """Devuelve las estadísticas de la cache de validaciones de PDFs"""
+        from cache_validacion import get_validation_cache
+        return get_validation_cache().stats()
+
+    #Endpoint para consultar cuantos PDFs descarto el prefiltro local (llamadas al LLM ahorradas)
+    @app.get("/vacation_request/prefilter/stats")
+    def prefilter_stats_endpoint()-> dict:
+        """Devuelve las estadísticas del prefiltro local de PDFs"""
+        from prefiltro_solicitud import get_prefilter_stats
+        return get_prefilter_stats()
+
+    #Endpoint para consultar los bytes y páginas enviados al LLM antes y despues de reducir los PDFs
+    @app.get("/vacation_request/trim/stats")
+    def trim_stats_endpoint()-> dict:
+        """Devuelve las estadísticas de la reducción de PDFs"""
+        from recorte_pdf import get_trim_stats
+        return get_trim_stats()
+
+    #Endpoint para consultar cuantos chat models se crearon, cuantas veces se reutilizaron, el pool HTTP y el limitador de uso
+    @app.get("/vacation_request/models/stats")
+    def model_stats_endpoint()-> dict:
+        """Devuelve las estadísticas del registro de chat models compartidos"""
+        from registro_modelos import get_model_registry_stats
+        return get_model_registry_stats()
+
+    #Endpoint con las llamadas, errores, latencia y tokens de cada modelo y herramienta en formato Prometheus
+    #(con varios procesos, API_PROCESSES, cada proceso tiene sus propias metricas)
+    if metrics_enabled:
+        @app.get("/metrics", response_class=PlainTextResponse)
+        def metrics_endpoint():
+            """Devuelve las metricas del proceso en el formato de texto de Prometheus (modelos, herramientas, nodos y endpoints)"""
+            from metricas import render_prometheus
+            return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+#Esta es la lógica principal del ejemplo que iniciara un servicio REST
+def main(args=None):
+    from dotenv import load_dotenv
+    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
+    load_dotenv()
+
+    #Se crea el chat model de validación al iniciar, para que la primera petición no pague la creación del cliente
+    from registro_modelos import warm_up_models
+    warm_up_models([(VALIDATION_MODEL, {})])
+
+    import os
     import uvicorn
+    host = os.getenv("API_HOST", "localhost")
+    port = int(os.getenv("API_PORT", "8000"))
+    processes = int(os.getenv("API_PROCESSES", "1"))
+    #Con varios procesos cada uno crea su aplicacion (y sus workers), todos comparten la cola en SQLite
+    if processes > 1:
+        uvicorn.run("api_validar_solicitud:create_app", factory=True, host=host, port=port, workers=processes)
+        return
+
+    app = create_app()
+
     #Iniciamos el servidor web con uvicorn y la aplicacion de FastaAPI
-    uvicorn.run(app, host="localhost", port=8000)
+    uvicorn.run(app, host=host, port=port)
     #Pruebas desde la documentación OpenAPI: http://localhost:8000/docs
 
 #Solo se llamará al método principal si se ejecuta este modulo directamente
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,79 @@
+#=======================================================================================
+# Funciones para leer y codificar archivos PDF sin hacer copias completas en memoria.
+# Antes se leia todo el archivo (una copia) y luego se creaba el texto en base64 (otra copia 33% mas grande),
+# ahora el archivo se mapea en memoria (mmap) y se codifica por bloques directamente al texto final.
+#=======================================================================================
+import binascii
+import io
+import mmap
+from contextlib import contextmanager
+
+#Tamaño de bloque para codificar en base64, debe ser multiplo de 3 para no generar relleno (=) entre bloques
+_BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def encode_base64(buffer) -> str:
+    """
+    Codifica en base64 un objeto tipo bytes (bytes, memoryview, mmap) por bloques
+
+    Args:
+        buffer: contenido a codificar
+    """
+    view = memoryview(buffer)
+    try:
+        size = len(view)
+        #Se reserva de una vez el tamaño final del texto en base64 y se llena por bloques
+        encoded = bytearray(4 * ((size + 2) // 3))
+        position = 0
+        for start in range(0, size, _BASE64_CHUNK_SIZE):
+            chunk = binascii.b2a_base64(view[start:start + _BASE64_CHUNK_SIZE], newline=False)
+            encoded[position:position + len(chunk)] = chunk
+            position += len(chunk)
+    finally:
+        view.release()
+    return encoded.decode("ascii")
+
+
+@contextmanager
+def open_pdf_buffer(file_path):
+    """
+    Mapea un archivo en memoria (solo lectura) y lo devuelve como objeto tipo bytes
+
+    Args:
+        file_path: ruta del archivo
+    """
+    with open(file_path, "rb") as f:
+        #mmap no soporta archivos vacios
+        if f.seek(0, io.SEEK_END) == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+@contextmanager
+def spooled_file_buffer(spooled_file):
+    """
+    Devuelve el contenido de un SpooledTemporaryFile como objeto tipo bytes sin copiarlo:
+    si todavia esta en memoria se usa el buffer del BytesIO, si ya se escribió en disco se mapea con mmap
+
+    Args:
+        spooled_file: archivo temporal (tempfile.SpooledTemporaryFile)
+    """
+    spooled_file.flush()
+    inner_file = getattr(spooled_file, "_file", spooled_file)
+    if isinstance(inner_file, io.BytesIO):
+        buffer = inner_file.getbuffer()
+        try:
+            yield buffer
+        finally:
+            buffer.release()
+        return
+    position = spooled_file.tell()
+    size = spooled_file.seek(0, io.SEEK_END)
+    spooled_file.seek(position)
+    if size == 0:
+        yield b""
+        return
+    with mmap.mmap(inner_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield buffer
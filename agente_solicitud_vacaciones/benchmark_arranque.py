@@ -0,0 +1,90 @@
+#=======================================================================================
+# Benchmark del arranque en frio, para las ejecuciones cortas programadas (cron).
+# Cada medición se hace en un proceso nuevo de Python y se informa cuanto demora cada etapa hasta la
+# primera llamada a una herramienta: importar las librerias, cargar las credenciales y crear el recurso de GMail,
+# crear los modelos y los agentes, y la primera busqueda en GMail.
+# Uso: python benchmark_arranque.py --runs 3 (con --skip-tool-call no se llama al API de GMail)
+#=======================================================================================
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+def _measure(skip_tool_call: bool) -> Dict:
+    """Mide cada etapa del arranque en el proceso actual (se debe ejecutar en un proceso nuevo)"""
+    timings = {}
+    start = time.perf_counter()
+
+    #Librerias que los agentes importan de forma diferida
+    import langchain.chat_models
+    import langchain_google_community
+    import langgraph.prebuilt
+    import langgraph_supervisor
+    import multiagente_solicitud_vacaciones
+    timings["imports"] = time.perf_counter() - start
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    phase_start = time.perf_counter()
+    from recursos_gmail import get_api_resource_stats, get_gmail_toolkit
+    toolkit = get_gmail_toolkit()
+    timings["gmail_resource"] = time.perf_counter() - phase_start
+
+    #Los dos agentes del supervisor, con sus modelos (registro_modelos.py) y el mismo recurso de GMail
+    phase_start = time.perf_counter()
+    multiagente_solicitud_vacaciones.build_vacation_request_agent()
+    multiagente_solicitud_vacaciones.build_vacation_process_agent()
+    timings["agents"] = time.perf_counter() - phase_start
+
+    if not skip_tool_call:
+        from langchain_google_community.gmail.search import GmailSearch
+
+        phase_start = time.perf_counter()
+        GmailSearch(api_resource=toolkit.api_resource).invoke({"query": "in:inbox", "max_results": 1})
+        timings["first_tool_call"] = time.perf_counter() - phase_start
+
+    timings["time_to_first_tool_call"] = time.perf_counter() - start
+    return {
+        "timings": {phase: round(seconds, 4) for phase, seconds in timings.items()},
+        "gmail_resources": get_api_resource_stats(),
+    }
+
+
+def _summarize(runs: List[Dict]) -> Dict:
+    phases = list(runs[0]["timings"]) + ["process_seconds"]
+    values = {phase: [run["process_seconds"] if phase == "process_seconds" else run["timings"][phase] for run in runs]
+              for phase in phases}
+    return {
+        phase: {"avg": round(sum(v) / len(v), 4), "min": round(min(v), 4), "max": round(max(v), 4)}
+        for phase, v in values.items()
+    }
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frio de los agentes")
+    parser.add_argument("--runs", type=int, default=3, help="Cantidad de procesos nuevos a medir")
+    parser.add_argument("--skip-tool-call", action="store_true", help="No llamar al API de GMail (solo imports y creación)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+
+    if options.child:
+        print(json.dumps(_measure(options.skip_tool_call)))
+        return
+
+    runs = []
+    for _ in range(options.runs):
+        command = [sys.executable, __file__, "--child"] + (["--skip-tool-call"] if options.skip_tool_call else [])
+        start = time.perf_counter()
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        #El tiempo del proceso incluye el inicio del interprete de Python
+        run = {**json.loads(output.strip().splitlines()[-1]), "process_seconds": round(time.perf_counter() - start, 4)}
+        runs.append(run)
+        print(json.dumps(run, ensure_ascii=False))
+    print(json.dumps({"runs": len(runs), "summary": _summarize(runs)}, ensure_ascii=False, indent=2))
+
+#Solo se llamará al método principal si se ejecuta este modulo directamente
+if __name__ == "__main__":
+    main()
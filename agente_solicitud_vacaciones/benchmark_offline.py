@@ -0,0 +1,367 @@
+#=======================================================================================
+# Benchmark offline del throughput y la latencia, sin GMail, sin Gemini/OpenAI y sin el servidor MCP de Postgres.
+# Usa el API de GMail simulado (gmail_simulado.py), los modelos simulados con latencia y tokens configurables
+# (modelo_simulado.py) y el servidor MCP local con SQLite (servidor_mcp_sqlite.py) en lugar de postgres-mcp.
+# Escenarios:
+#   - agente: agente de solicitudes (agente_busca_solicitud.py), la latencia es hasta el veredicto de cada correo
+#   - supervisor: supervisor con sus dos agentes (multiagente_solicitud_vacaciones.py), latencia hasta el borrador
+#   - supervisor_mcp: supervisor con registro por MCP (mcp_multiagente_solicitud_vacaciones.py), latencia hasta el borrador
+#   - api: endpoint /vacation_request/validate (api_validar_solicitud.py), latencia de cada petición
+# Cada escenario y cantidad de correos se mide en un proceso nuevo y en una carpeta temporal (cache, adjuntos, SQLite),
+# y se informa correos por segundo, latencia p50/p95, llamadas al LLM y tokens por correo, memoria máxima (RSS)
+# y que porcentaje de los correos se completó, en JSON para comparar entre versiones. Tambien se incluyen las metricas
+# de cada modelo, herramienta y nodo por correo (metricas.py), para ver donde se usa el tiempo.
+# Si una medición falla o completa menos correos que --min-completion, termina con código de salida 1.
+# Con --rate-limit-rate los modelos simulados responden 429 en esa fracción de las llamadas y se activa el limitador
+# de uso (limite_uso.py) sin limites de RPM ni TPM, para medir sus esperas, reintentos y concurrencia adaptativa.
+# Uso: python benchmark_offline.py --scales 10 100 1000 --output resultados_benchmark.json
+#=======================================================================================
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+SCENARIOS = ["agente", "supervisor", "supervisor_mcp", "api"]
+
+#Variables de los procesos del benchmark, se pueden reemplazar con --env
+DEFAULT_ENV = {
+    #Los modelos simulados no tienen los limites de uso de los proveedores
+    "RATE_LIMIT_ENABLED": "0",
+    "LANGSMITH_TRACING": "false",
+    "LANGCHAIN_TRACING_V2": "false",
+    #Registro con el servidor MCP local (SQLite) ejecutado como subproceso
+    "MCP_REGISTRATION_MODE": "direct",
+    "MCP_SQL_TRANSPORT": "stdio",
+    "MCP_SQL_DIALECT": "sqlite",
+    "MCP_SQL_SERVER_SCRIPT": os.path.join(os.path.dirname(os.path.abspath(__file__)), "servidor_mcp_sqlite.py"),
+}
+
+
+def _summary(values: List[float]) -> Optional[Dict]:
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "avg": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def _verdict_times(started: float):
+    """Callback que registra los segundos hasta el veredicto de cada correo (fin de su validación o del triaje)"""
+    import threading
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class VerdictTimes(BaseCallbackHandler):
+        def __init__(self):
+            self.times: Dict[str, float] = {}
+            self._runs: Dict = {}
+            self._lock = threading.Lock()
+
+        def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+            with self._lock:
+                self._runs[run_id] = ((serialized or {}).get("name"), inputs or {})
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            seconds = time.perf_counter() - started
+            with self._lock:
+                name, inputs = self._runs.pop(run_id, (None, {}))
+            if name in ("validate_vacation_request", "validate_pdf"):
+                message_ids = [inputs.get("folder", "").rstrip("/").rsplit("/", 1)[-1]]
+            elif name == "triage_gmail_messages":
+                #Las solicitudes sin PDF tienen su veredicto en el triaje
+                content = getattr(output, "content", output)
+                result = json.loads(content) if isinstance(content, str) else content
+                message_ids = [message["id"] for message in result.get("without_pdf", [])]
+            else:
+                return
+            with self._lock:
+                for message_id in message_ids:
+                    self.times.setdefault(message_id, seconds)
+
+    return VerdictTimes()
+
+
+def _run_agent(mailbox) -> Dict:
+    from langchain_core.messages import HumanMessage
+    from agente_busca_solicitud import build_vacation_request_agent, search_instruction
+    from puntos_control import new_thread_id, open_checkpointer, run_config
+
+    with open_checkpointer() as checkpointer:
+        agent = build_vacation_request_agent(checkpointer=checkpointer)
+        thread_id = new_thread_id()
+        mailbox.started = time.perf_counter()
+        verdicts = _verdict_times(mailbox.started)
+        agent.invoke({"messages": [HumanMessage(search_instruction("Buscar"))]},
+                     {**run_config(thread_id), "callbacks": [verdicts]})
+        seconds = time.perf_counter() - mailbox.started
+    return {"seconds": seconds, "completed": verdicts.times}
+
+
+def _run_supervisor(mailbox) -> Dict:
+    from langchain_core.messages import HumanMessage
+    from multiagente_solicitud_vacaciones import build_vacation_supervisor, search_instruction
+    from puntos_control import new_thread_id, open_checkpointer, run_config
+
+    thread_id = new_thread_id()
+    with open_checkpointer() as checkpointer:
+        supervisor = build_vacation_supervisor(None, thread_id, checkpointer)
+        mailbox.started = time.perf_counter()
+        supervisor.invoke({"messages": [HumanMessage(search_instruction("Procesar") + ".")]}, run_config(thread_id))
+        seconds = time.perf_counter() - mailbox.started
+    return {"seconds": seconds, "completed": mailbox.reply_times()}
+
+
+async def _run_mcp_supervisor(mailbox) -> Dict:
+    from langchain_core.messages import HumanMessage
+    from mcp_multiagente_solicitud_vacaciones import build_vacation_supervisor, search_instruction
+    from puntos_control import new_thread_id, open_async_checkpointer, run_config
+    from registro_mcp import get_registration_backend
+
+    #La sesión MCP se abre antes de medir, como en el main del supervisor
+    registration_backend = get_registration_backend()
+    await registration_backend.start()
+    thread_id = new_thread_id()
+    try:
+        async with open_async_checkpointer() as checkpointer:
+            supervisor = build_vacation_supervisor(None, thread_id, checkpointer)
+            mailbox.started = time.perf_counter()
+            await supervisor.ainvoke({"messages": [HumanMessage(search_instruction("Procesar") + ".")]},
+                                     run_config(thread_id))
+            seconds = time.perf_counter() - mailbox.started
+    finally:
+        await registration_backend.close()
+    return {"seconds": seconds, "completed": mailbox.reply_times(), "mcp": registration_backend.stats()}
+
+
+async def _run_api(size: int, concurrency: int) -> Dict:
+    import asyncio
+    from pathlib import Path
+    import httpx
+    from api_validar_solicitud import create_app
+    from gmail_simulado import build_request_pdfs
+
+    folder = Path("pdfs")
+    folder.mkdir(exist_ok=True)
+    file_names = []
+    for file_name, pdf in build_request_pdfs(size):
+        (folder / file_name).write_bytes(pdf)
+        file_names.append(file_name)
+
+    app = create_app()
+    semaphore = asyncio.Semaphore(concurrency)
+    completed: Dict[str, float] = {}
+    errors = 0
+
+    async def validate(client, file_name: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/vacation_request/validate", json={"folder": str(folder), "file_name": file_name})
+            if response.status_code == 200:
+                completed[file_name] = time.perf_counter() - start
+            else:
+                errors += 1
+
+    #Las peticiones se envian a la aplicación en el mismo proceso (sin servidor HTTP), con sus workers iniciados
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(validate(client, file_name) for file_name in file_names))
+            seconds = time.perf_counter() - start
+    return {"seconds": seconds, "completed": completed, "expected": len(file_names), "http_errors": errors}
+
+
+def _measure(options) -> Dict:
+    """Ejecuta un escenario en el proceso actual (se debe ejecutar en un proceso nuevo y en una carpeta temporal)"""
+    import asyncio
+    import resource
+    import gmail_simulado
+    import limite_uso
+    import metricas
+    import modelo_simulado
+    import recursos_gmail
+    import registro_modelos
+
+    #Metricas por modelo, herramienta y nodo, para ver en que se usa el tiempo de cada correo
+    metricas.enable_metrics()
+    mailbox = gmail_simulado.SyntheticMailbox(options.emails, latency_seconds=options.gmail_latency)
+    recursos_gmail.set_http_factory(mailbox.http)
+    registro_modelos.set_chat_model_factory(modelo_simulado.make_model_factory(
+        latency_seconds=options.llm_latency, input_tokens=options.input_tokens, output_tokens=options.output_tokens,
+        rate_limit_rate=options.rate_limit_rate, retry_after_seconds=options.retry_after,
+    ))
+
+    if options.scenario == "agente":
+        run = _run_agent(mailbox)
+    elif options.scenario == "supervisor":
+        run = _run_supervisor(mailbox)
+    elif options.scenario == "supervisor_mcp":
+        run = asyncio.run(_run_mcp_supervisor(mailbox))
+    else:
+        run = asyncio.run(_run_api(options.emails, options.api_concurrency))
+    expected = run.pop("expected", None) or len(mailbox.expected_replies())
+
+    models = modelo_simulado.get_simulated_model_stats()
+    calls = sum(stats["calls"] for stats in models.values())
+    tokens = sum(stats["input_tokens"] + stats["output_tokens"] for stats in models.values())
+    seconds = run.pop("seconds")
+    completed = run.pop("completed")
+    return {
+        "scenario": options.scenario,
+        "emails": options.emails,
+        "seconds": round(seconds, 3),
+        "emails_per_second": round(options.emails / seconds, 3) if seconds else None,
+        "latency_seconds": _summary(list(completed.values())),
+        "completed": len(completed),
+        "expected": expected,
+        "completion_rate": round(len(completed) / expected, 3) if expected else None,
+        "llm": {
+            "calls": calls,
+            "tokens": tokens,
+            "calls_per_email": round(calls / options.emails, 3),
+            "tokens_per_email": round(tokens / options.emails, 1),
+            "models": models,
+        },
+        "gmail": mailbox.stats() if options.scenario != "api" else None,
+        #Esperas por cuota (throttled), 429 recibidos, reintentos y concurrencia minima de cada modelo
+        "rate_limit": limite_uso.get_rate_limit_stats() if limite_uso.is_rate_limit_enabled() else None,
+        "metrics": metricas.get_metrics_summary(options.emails),
+        #En Linux ru_maxrss esta en KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **run,
+    }
+
+
+def _run_child(options, scenario: str, emails: int, env: Dict[str, str]) -> Dict:
+    import tempfile
+
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", "--scenario", scenario, "--emails", str(emails),
+        "--llm-latency", str(options.llm_latency), "--gmail-latency", str(options.gmail_latency),
+        "--api-concurrency", str(options.api_concurrency), "--rate-limit-rate", str(options.rate_limit_rate),
+    ]
+    if options.input_tokens is not None:
+        command += ["--input-tokens", str(options.input_tokens)]
+    if options.output_tokens is not None:
+        command += ["--output-tokens", str(options.output_tokens)]
+    if options.retry_after is not None:
+        command += ["--retry-after", str(options.retry_after)]
+
+    #Cada medición usa su propia carpeta (cache de validaciones, adjuntos, checkpoints y SQLite del MCP)
+    with tempfile.TemporaryDirectory(prefix="benchmark_offline_") as workdir:
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(command, cwd=workdir, env={**os.environ, **env}, capture_output=True, text=True,
+                                     timeout=options.timeout)
+        except subprocess.TimeoutExpired:
+            return {"scenario": scenario, "emails": emails, "error": f"Superó el tiempo máximo de {options.timeout} segundos"}
+        if process.returncode != 0:
+            return {"scenario": scenario, "emails": emails, "error": process.stderr.strip().splitlines()[-1:]}
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+    #El tiempo del proceso incluye el inicio del interprete, los imports y la creación de los agentes
+    return {**result, "process_seconds": round(time.perf_counter() - start, 3)}
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark offline con GMail, LLM y MCP simulados")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Escenarios a medir")
+    parser.add_argument("--scales", nargs="+", type=int, default=[10, 100, 1000], help="Cantidades de correos")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Segundos de cada llamada al LLM simulado")
+    parser.add_argument("--input-tokens", type=int, default=None,
+                        help="Tokens de entrada de cada llamada (por defecto se aproximan con los mensajes)")
+    parser.add_argument("--output-tokens", type=int, default=None,
+                        help="Tokens de salida de cada llamada (por defecto se aproximan con la respuesta)")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="Segundos de cada petición al API de GMail simulado")
+    parser.add_argument("--api-concurrency", type=int, default=8, help="Peticiones simultaneas al endpoint de validación")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fracción de las llamadas al LLM simulado que responden 429 (activa el limitador de uso)")
+    parser.add_argument("--retry-after", type=float, default=None,
+                        help="Segundos de Retry-After de los 429 simulados (por defecto no se indica y se usa el backoff)")
+    parser.add_argument("--env", action="append", default=[], metavar="VARIABLE=VALOR",
+                        help="Variable de ambiente de los procesos medidos, por ejemplo CONTEXT_MAX_PROMPT_TOKENS=200000")
+    parser.add_argument("--timeout", type=float, default=1800, help="Segundos máximos de cada medición")
+    parser.add_argument("--min-completion", type=float, default=1.0,
+                        help="Fracción mínima (0 a 1) de correos completados de cada medición; si una medición falla "
+                             "o queda por debajo el benchmark termina con código de salida 1")
+    parser.add_argument("--output", default=None, help="Archivo JSON donde se guardan los resultados")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--emails", type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+
+    if options.child:
+        print(json.dumps(_measure(options), ensure_ascii=False))
+        return
+
+    env = dict(DEFAULT_ENV)
+    if options.rate_limit_rate:
+        from limite_uso import DEFAULT_LIMITS
+        #Solo se prueban los 429: el limitador se activa sin limites de RPM ni TPM
+        env["RATE_LIMIT_ENABLED"] = "1"
+        env["RATE_LIMITS"] = json.dumps({name: {"rpm": 0, "tpm": 0} for name in DEFAULT_LIMITS})
+    env.update(item.split("=", 1) for item in options.env)
+    results = []
+    for scenario in options.scenarios:
+        for emails in options.scales:
+            result = _run_child(options, scenario, emails, env)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {
+            "llm_latency": options.llm_latency, "input_tokens": options.input_tokens,
+            "output_tokens": options.output_tokens, "gmail_latency": options.gmail_latency,
+            "api_concurrency": options.api_concurrency, "rate_limit_rate": options.rate_limit_rate,
+            "retry_after": options.retry_after, "min_completion": options.min_completion, "env": env,
+        },
+        "results": results,
+        #Mediciones con error o con menos correos completados que --min-completion
+        "failures": [f"{result['scenario']}/{result['emails']}" for result in results
+                     if not _passed(result, options.min_completion)],
+    }
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    #Resumen: una linea por escenario y cantidad de correos
+    for result in results:
+        latency = result.get("latency_seconds") or {}
+        print(f"{result['scenario']:>15} {result['emails']:>6} correos: " + (
+            f"error {result['error']}" if "error" in result else
+            f"{result['emails_per_second']} correos/s, p50 {latency.get('p50')} s, p95 {latency.get('p95')} s, "
+            f"{result['llm']['calls_per_email']} llamadas y {result['llm']['tokens_per_email']} tokens por correo, "
+            f"{result['peak_rss_mb']} MB, completados {result['completed']}/{result['expected']}"
+            + _rate_limit_summary(result.get("rate_limit"))
+        ) + ("" if _passed(result, options.min_completion) else " [FALLA]"))
+    if report["failures"]:
+        print(f"Mediciones con error o con menos del {options.min_completion:.0%} de correos completados: "
+              + ", ".join(report["failures"]))
+        sys.exit(1)
+
+
+def _rate_limit_summary(stats: Optional[Dict]) -> str:
+    #429 recibidos, reintentos, llamadas que fallaron tras los reintentos y esperas por cuota de todos los modelos
+    if not stats:
+        return ""
+    total = {key: sum(model[key] for model in stats.values()) for key in ("rate_limited", "retried", "failed", "throttled")}
+    return (f", 429 {total['rate_limited']}, reintentos {total['retried']}, fallidas {total['failed']}, "
+            f"esperas {total['throttled']}")
+
+
+def _passed(result: Dict, min_completion: float) -> bool:
+    #Una medición pasa si terminó sin error y completó al menos la fracción pedida de los correos esperados
+    if "error" in result:
+        return False
+    return result["completion_rate"] is None or result["completion_rate"] >= min_completion
+
+#Solo se llamará al método principal si se ejecuta este modulo directamente
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#=======================================================================================
+# Borradores de respuesta a las solicitudes de vacaciones armados con plantillas, sin LLM.
+# Antes el LLM redactaba el texto de cada borrador (GmailCreateDraft) aunque el contenido es siempre el mismo
+# salvo algunos datos: aceptación informal con id, fecha y nombre, o rechazo formal con el motivo.
+# Ahora el texto se arma con una plantilla por resultado (aceptada y cada motivo de rechazo de reglas_solicitud.py)
+# con los datos de la validación y del registro, y se crea el borrador llamando directamente a GmailCreateDraft.
+# Las plantillas usan variables con el formato de Jinja ("{{ nombre_solicitante }}"), se pueden reemplazar
+# con archivos <plantilla>.txt en DRAFT_TEMPLATES_PATH y, si se desea, el LLM solo pule el texto (DRAFT_POLISH=1).
+#=======================================================================================
+import os
+import re
+import threading
+from dataclasses import dataclass
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Dict, List, Optional
+
+#Modelo usado solo para pulir el texto de las plantillas (DRAFT_POLISH=1)
+DRAFT_POLISH_MODEL = "google_genai:gemini-2.5-flash-lite"
+
+_FORMAL_CLOSING = "\n\nAtentamente,\nÁrea de Gestión Humana"
+
+#Plantillas por defecto: "aceptada", una por motivo de rechazo y "rechazada" para otros motivos
+DRAFT_TEMPLATES: Dict[str, str] = {
+    "aceptada": (
+        "¡Hola {{ nombre_solicitante }}!\n\n"
+        "Recibimos tu solicitud de vacaciones el {{ fecha_recepcion }} y te contamos que fue aceptada.\n"
+        "Quedó registrada con el id {{ solicitud_vacacion_id }} el {{ fecha_registro_solicitud }}, "
+        "guárdalo por si necesitas hacer alguna consulta.\n\n"
+        "¡Que disfrutes tus vacaciones!\nGestión Humana"
+    ),
+    "no_relacionado": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su correo recibido el {{ fecha_recepcion }} no fue procesado como una solicitud de vacaciones, "
+        "debido a que {{ motivo_rechazo }}.\n"
+        "Si desea solicitar vacaciones, por favor envíe un correo indicándolo en el asunto, "
+        "con el formato de solicitud firmado adjunto en PDF." + _FORMAL_CLOSING
+    ),
+    "sin_pdf": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su solicitud de vacaciones recibida el {{ fecha_recepcion }} ha sido rechazada, "
+        "debido a que {{ motivo_rechazo }}.\n"
+        "Por favor, vuelva a enviar su solicitud adjuntando el formato de solicitud de vacaciones firmado en PDF." + _FORMAL_CLOSING
+    ),
+    "no_es_solicitud": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su solicitud de vacaciones recibida el {{ fecha_recepcion }} ha sido rechazada, "
+        "debido a que {{ motivo_rechazo }}.\n"
+        "Por favor, vuelva a enviar su solicitud adjuntando el formato de solicitud de vacaciones firmado." + _FORMAL_CLOSING
+    ),
+    "sin_firma": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su solicitud de vacaciones recibida el {{ fecha_recepcion }} ha sido rechazada, "
+        "debido a que {{ motivo_rechazo }}.\n"
+        "Por favor, firme el formato de solicitud y vuelva a enviarlo adjunto en PDF." + _FORMAL_CLOSING
+    ),
+    "nombre_no_corresponde": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su solicitud de vacaciones recibida el {{ fecha_recepcion }} ha sido rechazada, "
+        "debido a que {{ motivo_rechazo }} ({{ nombre_solicitante }}).\n"
+        "Cada colaborador debe enviar su propia solicitud de vacaciones desde su correo." + _FORMAL_CLOSING
+    ),
+    "rechazada": (
+        "Estimado(a) {{ destinatario }}:\n\n"
+        "Le informamos que su solicitud de vacaciones recibida el {{ fecha_recepcion }} ha sido rechazada "
+        "por el siguiente motivo: {{ motivo_rechazo }}." + _FORMAL_CLOSING
+    ),
+}
+
+_VARIABLE = re.compile(r"{{\s*(\w+)\s*}}")
+
+
+def _template_keys() -> Dict[str, str]:
+    #Plantilla de cada motivo de rechazo de reglas_solicitud.py
+    from reglas_solicitud import (REASON_NAME_MISMATCH, REASON_NO_PDF, REASON_NO_SIGNATURE, REASON_NOT_RELATED,
+                                  REASON_NOT_REQUEST)
+    return {
+        REASON_NOT_RELATED: "no_relacionado",
+        REASON_NO_PDF: "sin_pdf",
+        REASON_NOT_REQUEST: "no_es_solicitud",
+        REASON_NO_SIGNATURE: "sin_firma",
+        REASON_NAME_MISMATCH: "nombre_no_corresponde",
+    }
+
+
+def render_template(template: str, values: Dict) -> str:
+    """
+    Reemplaza las variables "{{ nombre }}" de la plantilla (el mismo resultado que Jinja para plantillas solo con variables)
+
+    Args:
+        template: texto de la plantilla
+        values: valor de cada variable, las variables sin valor generan un error
+    """
+    def replace(match):
+        name = match.group(1)
+        if values.get(name) is None:
+            raise ValueError(f"Falta el valor de la variable {name} de la plantilla del borrador")
+        return str(values[name])
+    return _VARIABLE.sub(replace, template)
+
+
+@dataclass
+class ReplyDraft:
+    """
+    Borrador de respuesta a una solicitud
+
+    Args:
+        to: destinatarios
+        subject: asunto
+        message: texto del borrador
+        template: plantilla usada
+        polished: True si el texto lo pulió el LLM
+    """
+
+    to: List[str]
+    subject: str
+    message: str
+    template: str
+    polished: bool = False
+
+
+def is_polish_enabled() -> bool:
+    """Con DRAFT_POLISH=1 el LLM pule el texto de las plantillas (una llamada por borrador)"""
+    return os.getenv("DRAFT_POLISH", "0") == "1"
+
+
+def get_draft_mode() -> str:
+    """Modo de los borradores: "template" (plantillas, por defecto) o "llm" (el LLM redacta el texto)"""
+    return os.getenv("DRAFT_MODE", "template")
+
+
+def _polish(message: str, formal: bool) -> str:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from registro_modelos import get_chat_model
+
+    llm = get_chat_model(DRAFT_POLISH_MODEL, temperature=0)
+    return llm.invoke([
+        SystemMessage("Mejora la redacción del correo en español, con un estilo " + ("formal" if formal else "informal") +
+                      ". No cambies nombres, fechas, ids ni motivos, responde solo con el texto del correo."),
+        HumanMessage(message),
+    ]).content
+
+
+def render_reply_draft(sender: Optional[str], subject: Optional[str], date: Optional[str], valid: bool,
+                       applicant_name: Optional[str] = None, reason: Optional[str] = None,
+                       request_id=None, registration_date: Optional[str] = None) -> ReplyDraft:
+    """
+    Arma el borrador de respuesta de una solicitud con la plantilla de su resultado
+
+    Args:
+        sender: remitente del correo, por ejemplo "Juan Perez <jperez@empresa.com>"
+        subject: asunto del correo
+        date: fecha de recepción del correo
+        valid: True si la solicitud es válida
+        applicant_name: nombre del solicitante que está en el PDF
+        reason: motivo de rechazo (los de reglas_solicitud.py tienen su propia plantilla)
+        request_id: id de la solicitud registrada
+        registration_date: fecha de registro de la solicitud
+    """
+    display_name, address = parseaddr(sender or "")
+    key = "aceptada" if valid else _template_keys().get(reason, "rechazada")
+    values = {
+        "nombre_solicitante": applicant_name,
+        "destinatario": applicant_name if valid else (display_name or address),
+        "remitente": sender,
+        "asunto": subject,
+        "fecha_recepcion": date,
+        "motivo_rechazo": reason,
+        "solicitud_vacacion_id": request_id,
+        "fecha_registro_solicitud": registration_date,
+    }
+    try:
+        message = render_template(get_draft_templates()[key], values)
+    except ValueError:
+        #Si faltan datos de la plantilla del motivo se usa la de rechazo general (una aceptación sin registro es un error)
+        if valid:
+            raise
+        key = "rechazada"
+        message = render_template(get_draft_templates()[key], values)
+    polished = is_polish_enabled()
+    if polished:
+        message = _polish(message, formal=not valid)
+    _record(key, polished)
+    return ReplyDraft(to=[address], subject=f"Re: {subject or ''}", message=message, template=key, polished=polished)
+
+
+def create_reply_draft(draft_tool, **kwargs) -> str:
+    """
+    Arma el borrador con la plantilla (render_reply_draft) y lo crea en GMail, devuelve el resultado de GmailCreateDraft
+
+    Args:
+        draft_tool: herramienta GmailCreateDraft
+        kwargs: datos de la solicitud (argumentos de render_reply_draft)
+    """
+    draft = render_reply_draft(**kwargs)
+    return draft_tool.invoke({"message": draft.message, "to": draft.to, "subject": draft.subject})
+
+
+def make_reply_draft_tool(api_resource):
+    """Crea la herramienta con la que el agente crea el borrador de respuesta sin redactar el texto"""
+    from langchain_core.tools import tool
+    from langchain_google_community.gmail.create_draft import GmailCreateDraft
+
+    draft_tool = GmailCreateDraft(api_resource=api_resource)
+
+    @tool
+    def create_vacation_reply_draft(remitente: str, asunto: str, fecha_recepcion: str, es_valida: bool,
+                                    nombre_solicitante: Optional[str] = None, motivo_rechazo: Optional[str] = None,
+                                    solicitud_vacacion_id: Optional[str] = None,
+                                    fecha_registro_solicitud: Optional[str] = None) -> str:
+        """Crea el borrador de correo de respuesta a una solicitud de vacaciones (válida o inválida) con el texto ya redactado,
+        para las solicitudes validas registrar la solicitud antes de crear el borrador
+
+        Args:
+            remitente: remitente del correo de la solicitud
+            asunto: asunto del correo de la solicitud
+            fecha_recepcion: fecha en que se recibió el correo
+            es_valida: True si la solicitud de vacaciones es válida
+            nombre_solicitante: nombre del solicitante que está en el PDF adjunto
+            motivo_rechazo: motivo por el que la solicitud es invalida
+            solicitud_vacacion_id: id de la solicitud registrada (solicitudes validas)
+            fecha_registro_solicitud: fecha de registro de la solicitud (solicitudes validas)
+        """
+        return create_reply_draft(
+            draft_tool, sender=remitente, subject=asunto, date=fecha_recepcion, valid=es_valida,
+            applicant_name=nombre_solicitante, reason=motivo_rechazo,
+            request_id=solicitud_vacacion_id, registration_date=fecha_registro_solicitud,
+        )
+
+    return create_vacation_reply_draft
+
+
+_templates: Optional[Dict[str, str]] = None
+_lock = threading.Lock()
+_stats: Dict = {"rendered": 0, "by_template": {}, "polished": 0}
+
+
+def get_draft_templates() -> Dict[str, str]:
+    """Devuelve las plantillas, las de DRAFT_TEMPLATES_PATH (<plantilla>.txt) reemplazan a las de DRAFT_TEMPLATES"""
+    global _templates
+    with _lock:
+        if _templates is None:
+            templates = dict(DRAFT_TEMPLATES)
+            path = os.getenv("DRAFT_TEMPLATES_PATH", "")
+            if path:
+                for file_path in Path(path).glob("*.txt"):
+                    templates[file_path.stem] = file_path.read_text(encoding="utf-8")
+            _templates = templates
+        return _templates
+
+
+def _record(key: str, polished: bool) -> None:
+    with _lock:
+        _stats["rendered"] += 1
+        _stats["by_template"][key] = _stats["by_template"].get(key, 0) + 1
+        _stats["polished"] += 1 if polished else 0
+
+
+def get_draft_stats() -> Dict:
+    """Devuelve cuantos borradores se armaron con cada plantilla y cuantos pulió el LLM"""
+    with _lock:
+        return {"rendered": _stats["rendered"], "by_template": dict(_stats["by_template"]), "polished": _stats["polished"]}
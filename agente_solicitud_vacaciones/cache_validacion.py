@@ -0,0 +1,198 @@
+#=======================================================================================
+# Cache de resultados de validate_pdf, direccionada por el contenido del PDF.
+# La llave es el SHA-256 de los bytes del archivo + id del modelo + versión del prompt,
+# asi el mismo adjunto descargado varias veces (en distintas carpetas o corridas) solo se envia una vez al LLM.
+# Tiene dos niveles: un LRU en memoria del proceso y un archivo SQLite en disco que comparten
+# el CLI, el API REST y la herramienta de los agentes (aunque se ejecuten en procesos distintos).
+#=======================================================================================
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+#Tamaño de bloque para leer archivos sin cargarlos completos en memoria
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path) -> str:
+    """Calcula el SHA-256 de un archivo leyendolo por bloques"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    """
+    Cache de dos niveles (LRU en memoria + SQLite en disco) para los resultados de validación de PDFs
+
+    Args:
+        db_path: ruta del archivo SQLite, None para usar solo el nivel en memoria
+        max_memory_entries: cantidad máxima de resultados en memoria
+        max_disk_entries: cantidad máxima de resultados en disco (se eliminan los menos usados)
+        ttl_seconds: tiempo de vida de cada resultado, 0 para que no expiren
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = "./cache/validaciones.sqlite",
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10000,
+        ttl_seconds: int = 7 * 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "expired": 0,
+            "evicted": 0,
+        }
+        self._conn = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            #La conexión se comparte entre hilos (FastAPI ejecuta los endpoints sync en un pool), se protege con el lock
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS validation_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_validation_cache_last_access ON validation_cache(last_access)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(file_hash: str, model_id: str, prompt_version: str, trim_tag: str = "") -> str:
+        """Arma la llave de cache a partir del hash del archivo, el modelo, la versión del prompt y la reducción del PDF"""
+        key = f"{file_hash}:{model_id}:{prompt_version}"
+        return f"{key}:{trim_tag}" if trim_tag else key
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Devuelve el resultado guardado para la llave, o None si no existe o expiró"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return result
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT result, created_at FROM validation_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    result, created_at = row
+                    if not self._is_expired(created_at, now):
+                        self._conn.execute(
+                            "UPDATE validation_cache SET last_access = ? WHERE cache_key = ?", (now, key)
+                        )
+                        self._conn.commit()
+                        #Se promueve al nivel en memoria para las siguientes consultas
+                        self._put_memory(key, created_at, result)
+                        self._counters["disk_hits"] += 1
+                        return result
+                    self._conn.execute("DELETE FROM validation_cache WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                    self._counters["expired"] += 1
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, result: str) -> None:
+        """Guarda el resultado en ambos niveles y aplica la eviccion por tamaño"""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, result)
+            self._counters["sets"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO validation_cache (cache_key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, result, now, now),
+                )
+                #Se eliminan los expirados y los menos usados si se supera el tamaño máximo
+                if self.ttl_seconds > 0:
+                    cursor = self._conn.execute(
+                        "DELETE FROM validation_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                    )
+                    self._counters["expired"] += cursor.rowcount
+                cursor = self._conn.execute(
+                    """DELETE FROM validation_cache WHERE cache_key IN (
+                        SELECT cache_key FROM validation_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_disk_entries,),
+                )
+                self._counters["evicted"] += cursor.rowcount
+                self._conn.commit()
+
+    def _put_memory(self, key: str, created_at: float, result: str) -> None:
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evicted"] += 1
+
+    def clear(self) -> None:
+        """Elimina todos los resultados de ambos niveles"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM validation_cache")
+                self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Devuelve los contadores de aciertos/fallos y el tamaño de cada nivel"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = (
+                self._conn.execute("SELECT COUNT(*) FROM validation_cache").fetchone()[0]
+                if self._conn is not None
+                else 0
+            )
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_validation_cache: Optional[ValidationCache] = None
+_validation_cache_lock = threading.Lock()
+
+
+def get_validation_cache() -> ValidationCache:
+    """Devuelve la instancia de cache compartida por el proceso, configurada con variables de ambiente"""
+    global _validation_cache
+    with _validation_cache_lock:
+        if _validation_cache is None:
+            db_path = os.getenv("VALIDATION_CACHE_PATH", "./cache/validaciones.sqlite")
+            _validation_cache = ValidationCache(
+                db_path=db_path or None,
+                max_memory_entries=int(os.getenv("VALIDATION_CACHE_MEMORY_ENTRIES", "256")),
+                max_disk_entries=int(os.getenv("VALIDATION_CACHE_DISK_ENTRIES", "10000")),
+                ttl_seconds=int(os.getenv("VALIDATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            )
+        return _validation_cache
@@ -0,0 +1,238 @@
+#=======================================================================================
+# Cascada de modelos para las respuestas estructuradas (datos de los PDFs y nombres ambiguos).
+# Antes cada llamada usaba un modelo fijo, aunque la mayoria de los PDFs son faciles de leer.
+# Ahora primero se usa el modelo mas barato y solo se pasa a uno mas capaz cuando la respuesta
+# no cumple el esquema, no es consistente, su confianza es menor a CASCADE_MIN_CONFIDENCE o la llamada falla
+# (solo el error del ultimo modelo se propaga).
+# Se registra por modelo cuantas respuestas se aceptaron, cuantas se escalaron (y por que), los tokens
+# y el costo aproximado, comparado con usar siempre el modelo mas capaz.
+#=======================================================================================
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+#Precios aproximados en USD por millón de tokens (entrada, salida), solo para estimar el ahorro de la cascada
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "google_genai:gemini-2.0-flash-lite": (0.075, 0.30),
+    "google_genai:gemini-2.0-flash": (0.10, 0.40),
+    "google_genai:gemini-2.5-flash-lite": (0.10, 0.40),
+    "google_genai:gemini-2.5-flash": (0.30, 2.50),
+    "google_genai:gemini-2.5-pro": (1.25, 10.0),
+    "openai:gpt-4o-mini": (0.15, 0.60),
+    "openai:gpt-4o": (2.50, 10.0),
+}
+
+#Motivos de escalamiento
+ESCALATE_SCHEMA = "esquema"
+ESCALATE_CHECK = "inconsistente"
+ESCALATE_CONFIDENCE = "confianza"
+ESCALATE_ERROR = "error"
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Costo aproximado en USD de una llamada (0 si el modelo no está en MODEL_PRICES)"""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+@dataclass
+class CascadeResult:
+    """
+    Respuesta de la cascada
+
+    Args:
+        result: respuesta estructurada aceptada
+        model: modelo que dio la respuesta
+        calls: llamadas al LLM realizadas (1 si no se escaló)
+        escalations: motivo de cada escalamiento
+    """
+
+    result: BaseModel
+    model: str
+    calls: int
+    escalations: List[str] = field(default_factory=list)
+
+
+class ModelCascade:
+    """
+    Cascada de modelos para una respuesta estructurada, del mas barato al mas capaz
+
+    Args:
+        name: nombre de la cascada en las estadísticas
+        models: modelos en orden de costo, por ejemplo ["google_genai:gemini-2.0-flash-lite", "google_genai:gemini-2.5-flash"]
+        schema: modelo pydantic de la respuesta
+        min_confidence: confianza minima para aceptar la respuesta de un modelo que no es el ultimo
+        confidence_field: campo de la respuesta con la confianza (si el esquema no lo tiene solo se revisa el esquema)
+        check: revisión adicional de la respuesta (False para escalar), por ejemplo datos que faltan
+    """
+
+    def __init__(self, name: str, models: List[str], schema: Type[BaseModel], min_confidence: float = 0.8,
+                 confidence_field: str = "confianza", check: Optional[Callable[[BaseModel], bool]] = None):
+        if not models:
+            raise ValueError(f"La cascada {name} no tiene modelos")
+        self.name = name
+        self.models = list(models)
+        self.schema = schema
+        self.min_confidence = min_confidence
+        self.confidence_field = confidence_field
+        self.check = check
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "escalated": 0, "cost_usd": 0.0, "cost_strongest_usd": 0.0}
+        self._tier_stats = {
+            model: {"calls": 0, "accepted": 0, "errors": 0, "escalated": {}, "input_tokens": 0, "output_tokens": 0,
+                    "seconds": 0.0}
+            for model in self.models
+        }
+
+    @property
+    def cache_name(self) -> str:
+        """Identifica los modelos de la cascada en la llave de la cache de validaciones"""
+        return "+".join(self.models)
+
+    def _escalation_reason(self, parsed: Optional[BaseModel]) -> Optional[str]:
+        if parsed is None:
+            return ESCALATE_SCHEMA
+        if self.check is not None and not self.check(parsed):
+            return ESCALATE_CHECK
+        confidence = getattr(parsed, self.confidence_field, None)
+        if confidence is not None and confidence < self.min_confidence:
+            return ESCALATE_CONFIDENCE
+        return None
+
+    def invoke(self, messages) -> CascadeResult:
+        """
+        Envia los mensajes a cada modelo de la cascada hasta obtener una respuesta aceptable
+
+        Args:
+            messages: mensajes de la consulta (los mismos para todos los modelos)
+        """
+        from registro_modelos import get_chat_model
+
+        escalations, best, error, cost, first_usage = [], None, None, 0.0, None
+        for tier, model in enumerate(self.models):
+            last = tier == len(self.models) - 1
+            llm = get_chat_model(model, temperature=0).with_structured_output(self.schema, include_raw=True)
+            start = time.perf_counter()
+            try:
+                response = llm.invoke(messages)
+            except Exception as e:
+                #Si falla un modelo que no es el ultimo (por ejemplo un 429 sin mas reintentos) se pasa al siguiente
+                with self._lock:
+                    stats = self._tier_stats[model]
+                    stats["calls"] += 1
+                    stats["errors"] += 1
+                    stats["seconds"] += time.perf_counter() - start
+                    if not last:
+                        stats["escalated"][ESCALATE_ERROR] = stats["escalated"].get(ESCALATE_ERROR, 0) + 1
+                if last:
+                    self._record_request(escalations, cost, first_usage)
+                    raise
+                escalations.append(ESCALATE_ERROR)
+                error = e
+                continue
+            seconds = time.perf_counter() - start
+
+            usage = getattr(response["raw"], "usage_metadata", None) or {}
+            input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+            first_usage = first_usage or (input_tokens, output_tokens)
+            cost += estimate_cost(model, input_tokens, output_tokens)
+            parsed = response["parsed"]
+            reason = self._escalation_reason(parsed)
+            with self._lock:
+                stats = self._tier_stats[model]
+                stats["calls"] += 1
+                stats["input_tokens"] += input_tokens
+                stats["output_tokens"] += output_tokens
+                stats["seconds"] += seconds
+                if reason is None or (last and parsed is not None):
+                    stats["accepted"] += 1
+                else:
+                    stats["escalated"][reason] = stats["escalated"].get(reason, 0) + 1
+
+            if parsed is not None:
+                best = (parsed, model)
+            else:
+                error = response.get("parsing_error")
+            if reason is None:
+                break
+            if not last:
+                escalations.append(reason)
+
+        self._record_request(escalations, cost, first_usage)
+        if best is None:
+            raise ValueError(f"Ningun modelo de la cascada {self.name} devolvió una respuesta válida: {error}")
+        #Si ningun modelo supera la confianza minima se usa la ultima respuesta válida (la del modelo mas capaz)
+        return CascadeResult(result=best[0], model=best[1], calls=len(escalations) + 1, escalations=escalations)
+
+    def _record_request(self, escalations: List[str], cost: float, first_usage: Optional[Tuple[int, int]]) -> None:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["escalated"] += 1 if escalations else 0
+            self._stats["cost_usd"] += cost
+            #Costo si se hubiera usado solo el ultimo modelo, con los tokens de la primera llamada que respondió
+            if first_usage is not None:
+                self._stats["cost_strongest_usd"] += estimate_cost(self.models[-1], *first_usage)
+
+    def stats(self) -> Dict:
+        """Devuelve la tasa de escalamiento, las respuestas aceptadas y escaladas por modelo y el ahorro estimado"""
+        with self._lock:
+            tiers = {}
+            for model, stats in self._tier_stats.items():
+                tiers[model] = {
+                    **stats,
+                    "escalated": dict(stats["escalated"]),
+                    "seconds": round(stats["seconds"], 3),
+                    "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else None,
+                }
+            requests = self._stats["requests"]
+            return {
+                "models": list(self.models),
+                "min_confidence": self.min_confidence,
+                "requests": requests,
+                "escalated": self._stats["escalated"],
+                "escalation_rate": round(self._stats["escalated"] / requests, 3) if requests else None,
+                "tiers": tiers,
+                "cost_usd": round(self._stats["cost_usd"], 6),
+                "cost_strongest_usd": round(self._stats["cost_strongest_usd"], 6),
+                "savings_usd": round(self._stats["cost_strongest_usd"] - self._stats["cost_usd"], 6),
+            }
+
+
+_lock = threading.Lock()
+_cascades: Dict[str, ModelCascade] = {}
+
+
+def get_model_cascade(name: str, default_models: List[str], schema: Type[BaseModel],
+                      check: Optional[Callable[[BaseModel], bool]] = None) -> ModelCascade:
+    """
+    Devuelve la cascada compartida del proceso, los modelos se pueden cambiar con la variable <NAME>_CASCADE
+    (modelos separados por coma) y la confianza minima con CASCADE_MIN_CONFIDENCE
+
+    Args:
+        name: nombre de la cascada, por ejemplo "validation" (variable VALIDATION_CASCADE)
+        default_models: modelos si no se configura la variable, del mas barato al mas capaz
+        schema: modelo pydantic de la respuesta
+        check: revisión adicional de la respuesta (False para escalar)
+    """
+    with _lock:
+        cascade = _cascades.get(name)
+        if cascade is None:
+            models = os.getenv(f"{name.upper()}_CASCADE", "")
+            models = [model.strip() for model in models.split(",") if model.strip()] or default_models
+            cascade = _cascades[name] = ModelCascade(
+                name, models, schema,
+                min_confidence=float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.8")),
+                check=check,
+            )
+        return cascade
+
+
+def get_cascade_stats() -> Dict:
+    """Devuelve las estadísticas de cada cascada creada en el proceso"""
+    with _lock:
+        cascades = list(_cascades.values())
+    return {cascade.name: cascade.stats() for cascade in cascades}
@@ -0,0 +1,291 @@
+#=======================================================================================
+# Cola persistente (SQLite) de validaciones de PDFs para el API REST.
+# Antes cada validación se hacia dentro de la petición HTTP: las llamadas lentas al LLM ocupaban conexiones
+# y no habia forma de absorber picos de trabajo. Ahora POST /vacation_request/jobs solo guarda el trabajo
+# en la cola y responde 202 con su id, y un grupo de workers (tareas asyncio en el mismo proceso del API
+# o procesos aparte con "python cola_validaciones.py --workers N") toma los trabajos pendientes y los valida.
+# Como la cola está en SQLite, los workers y los servidores HTTP se pueden escalar por separado.
+#=======================================================================================
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+#Estados de un trabajo
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+#Cantidad de trabajos terminados que se usan para calcular los tiempos de espera y de procesamiento
+_STATS_WINDOW = 1000
+
+
+class ValidationJobQueue:
+    """
+    Cola de trabajos de validación en SQLite, compartida por los servidores HTTP y los workers
+
+    Args:
+        db_path: ruta del archivo SQLite
+    """
+
+    def __init__(self, db_path: str = "./cache/cola_validaciones.sqlite"):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS validation_jobs (
+                job_id TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_validation_jobs_status ON validation_jobs(status, created_at)")
+        self._conn.commit()
+
+    def enqueue(self, folder: str, file_name: str) -> str:
+        """Agrega un trabajo pendiente y devuelve su id"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO validation_jobs (job_id, folder, file_name, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, folder, file_name, PENDING, time.time()),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Toma el trabajo pendiente mas antiguo y lo marca en proceso (None si no hay pendientes)"""
+        with self._lock:
+            #Una sola sentencia, asi dos workers (aunque sean de procesos distintos) no toman el mismo trabajo
+            row = self._conn.execute(
+                "UPDATE validation_jobs SET status = ?, started_at = ? WHERE job_id = ("
+                "SELECT job_id FROM validation_jobs WHERE status = ? ORDER BY created_at LIMIT 1"
+                ") AND status = ? RETURNING job_id, folder, file_name, started_at",
+                (RUNNING, time.time(), PENDING, PENDING),
+            ).fetchone()
+            self._conn.commit()
+        return dict(row) if row is not None else None
+
+    def _finish(self, job_id: str, started_at: float, status: str, result: Optional[str], error: Optional[str]) -> bool:
+        with self._lock:
+            #Solo termina el trabajo el worker que lo tomó: si se volvió a encolar por lento, su resultado tardío
+            #no pisa al reintento (que tiene otro started_at)
+            count = self._conn.execute(
+                "UPDATE validation_jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE job_id = ? AND status = ? AND started_at = ?",
+                (status, result, error, time.time(), job_id, RUNNING, started_at),
+            ).rowcount
+            self._conn.commit()
+        return count > 0
+
+    def complete(self, job: Dict, result: str) -> bool:
+        """Guarda el resultado de un trabajo tomado con claim, devuelve False si el trabajo ya no era de este worker"""
+        return self._finish(job["job_id"], job["started_at"], DONE, result, None)
+
+    def fail(self, job: Dict, error: str) -> bool:
+        """Guarda el error de un trabajo tomado con claim, devuelve False si el trabajo ya no era de este worker"""
+        return self._finish(job["job_id"], job["started_at"], ERROR, None, error)
+
+    def requeue_stale(self, timeout_seconds: float) -> int:
+        """
+        Devuelve a pendientes los trabajos en proceso hace mas de timeout_seconds (su worker se detuvo sin terminarlos)
+
+        Args:
+            timeout_seconds: tiempo máximo de una validación, los trabajos de otros workers activos no se tocan.
+                Si el worker original sigue vivo y termina despues, su resultado se descarta (ver _finish)
+        """
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE validation_jobs SET status = ?, started_at = NULL WHERE status = ? AND started_at < ?",
+                (PENDING, RUNNING, time.time() - timeout_seconds),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Devuelve el estado y el resultado de un trabajo, con sus tiempos de espera y de procesamiento"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM validation_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["wait_seconds"] = round(job["started_at"] - job["created_at"], 3) if job["started_at"] else None
+        job["processing_seconds"] = (
+            round(job["finished_at"] - job["started_at"], 3) if job["finished_at"] and job["started_at"] else None
+        )
+        return job
+
+    def stats(self) -> Dict:
+        """Devuelve la cantidad de trabajos por estado y los tiempos de espera y de procesamiento de los ultimos trabajos"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM validation_jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM validation_jobs WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT started_at - created_at, finished_at - started_at FROM validation_jobs "
+                "WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+                (_STATS_WINDOW,),
+            ).fetchall()
+        return {
+            "queue_depth": counts.get(PENDING, 0),
+            "running": counts.get(RUNNING, 0),
+            "done": counts.get(DONE, 0),
+            "error": counts.get(ERROR, 0),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else None,
+            "wait_seconds": _summary([row[0] for row in rows]),
+            "processing_seconds": _summary([row[1] for row in rows]),
+        }
+
+
+def _summary(values: List[float]) -> Optional[Dict]:
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "avg": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+class ValidationWorkerPool:
+    """
+    Grupo de workers (tareas asyncio) que toman los trabajos pendientes de la cola y validan cada PDF
+
+    Args:
+        queue: cola de trabajos
+        concurrency: cantidad de workers, es el limite de validaciones simultaneas con el LLM
+        poll_seconds: cada cuanto se revisa la cola si no hay trabajos (los de otros procesos no avisan)
+        job_timeout_seconds: tiempo tras el que un trabajo en proceso se considera abandonado y se vuelve a encolar
+    """
+
+    def __init__(self, queue: ValidationJobQueue, concurrency: int = 4, poll_seconds: float = 1.0,
+                 job_timeout_seconds: float = 600):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wake_up: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Inicia los workers, los trabajos abandonados por workers detenidos se vuelven a encolar"""
+        self._wake_up = asyncio.Event()
+        await asyncio.to_thread(self.queue.requeue_stale, self.job_timeout_seconds)
+        self._tasks = [asyncio.create_task(self._run(), name=f"validation-worker-{i}") for i in range(self.concurrency)]
+
+    def notify(self) -> None:
+        """Avisa a los workers que hay un trabajo nuevo (para no esperar a la siguiente revisión de la cola)"""
+        if self._wake_up is not None:
+            self._wake_up.set()
+
+    async def wait(self) -> None:
+        """Espera a que los workers terminen (solo terminan al detenerlos)"""
+        await asyncio.gather(*self._tasks)
+
+    async def stop(self) -> None:
+        """Detiene los workers, el trabajo que se estaba validando se vuelve a encolar cuando se considera abandonado"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        from api_validar_solicitud import avalidate_pdf
+
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                #Se revisan los trabajos abandonados solo cuando no hay pendientes
+                await asyncio.to_thread(self.queue.requeue_stale, self.job_timeout_seconds)
+                self._wake_up.clear()
+                try:
+                    await asyncio.wait_for(self._wake_up.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                result = await avalidate_pdf(job["folder"], job["file_name"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                #Un error en un trabajo no debe detener al worker
+                await asyncio.to_thread(self.queue.fail, job, str(e))
+            else:
+                await asyncio.to_thread(self.queue.complete, job, result)
+
+
+_queue: Optional[ValidationJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> ValidationJobQueue:
+    """Devuelve la cola de trabajos del proceso, la ruta se configura con VALIDATION_JOBS_DB_PATH"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ValidationJobQueue(os.getenv("VALIDATION_JOBS_DB_PATH", "./cache/cola_validaciones.sqlite"))
+        return _queue
+
+
+def get_worker_pool(concurrency: Optional[int] = None) -> ValidationWorkerPool:
+    """
+    Crea el grupo de workers de la cola del proceso (variables VALIDATION_JOB_*)
+
+    Args:
+        concurrency: cantidad de workers, por defecto VALIDATION_JOB_WORKERS
+    """
+    return ValidationWorkerPool(
+        get_job_queue(),
+        concurrency=int(os.getenv("VALIDATION_JOB_WORKERS", "4")) if concurrency is None else concurrency,
+        poll_seconds=float(os.getenv("VALIDATION_JOB_POLL_SECONDS", "1")),
+        job_timeout_seconds=float(os.getenv("VALIDATION_JOB_TIMEOUT_SECONDS", "600")),
+    )
+
+
+#Ejecuta solo los workers (sin servidor HTTP), para escalarlos por separado de los servidores del API
+def main(args=None):
+    import argparse
+    from dotenv import load_dotenv
+    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
+    #Se cargan antes de leer los argumentos, porque el valor por defecto de --workers viene de VALIDATION_JOB_WORKERS
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Workers que validan los PDFs de la cola de trabajos")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("VALIDATION_JOB_WORKERS", "4")),
+                        help="Cantidad de validaciones simultaneas (por defecto VALIDATION_JOB_WORKERS)")
+    options = parser.parse_args(args)
+
+    async def run():
+        pool = get_worker_pool(options.workers)
+        await pool.start()
+        print(f"{options.workers} workers validando la cola {get_job_queue().db_path}")
+        try:
+            await pool.wait()
+        finally:
+            await pool.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(get_job_queue().stats())
+
+#Solo se llamará al método principal si se ejecuta este modulo directamente
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#=======================================================================================
+# Manejo de la ventana de contexto del supervisor y de los agentes.
+# La lista de mensajes crece con cada correo (cuerpos de correos, resultados de herramientas, respuestas de validate_pdf)
+# y cada llamada al LLM vuelve a enviar todo, por eso el costo por llamada crece con la cantidad de correos.
+# Antes de cada llamada al LLM (pre_model_hook) se compactan los mensajes que se envian, sin modificar el estado:
+#   - los resultados de herramientas de los correos ya terminados se reemplazan por su registro corto,
+#   - los resultados de herramientas antiguos se recortan, solo los ultimos se envian completos,
+#   - si aún supera el limite de tokens por llamada, se descartan los mensajes mas antiguos (salvo el ultimo traspaso de un agente).
+# Además se controla un presupuesto de tokens por ejecución, que se informa al terminar.
+#=======================================================================================
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+#Instrucción para que los agentes se entreguen datos estructurados y cortos, en lugar de textos libres
+HANDOFF_INSTRUCTIONS = (
+    "Al terminar tu trabajo responde solo con una lista JSON, un elemento por correo, con los campos: "
+    "message_id, remitente, fecha_recepcion, es_valida, nombre_solicitante, motivo_rechazo, solicitud_vacacion_id "
+    "(los campos que no apliquen van en null), sin repetir el contenido de los correos ni de los PDFs."
+)
+
+
+@dataclass
+class ContextPolicy:
+    """
+    Politica de mensajes que se envian al LLM en cada llamada
+
+    Args:
+        max_prompt_tokens: tokens máximos (aproximados) de los mensajes de cada llamada al LLM
+        keep_last_tool_results: cantidad de resultados de herramientas recientes que se envian completos
+        tool_result_max_chars: caracteres que se conservan de los resultados de herramientas antiguos
+    """
+
+    max_prompt_tokens: int = 12000
+    keep_last_tool_results: int = 4
+    tool_result_max_chars: int = 300
+
+    @classmethod
+    def from_env(cls) -> "ContextPolicy":
+        """Crea la politica desde las variables de ambiente CONTEXT_*"""
+        return cls(
+            max_prompt_tokens=int(os.getenv("CONTEXT_MAX_PROMPT_TOKENS", "12000")),
+            keep_last_tool_results=int(os.getenv("CONTEXT_KEEP_LAST_TOOL_RESULTS", "4")),
+            tool_result_max_chars=int(os.getenv("CONTEXT_TOOL_RESULT_MAX_CHARS", "300")),
+        )
+
+
+def _completed_emails(messages) -> Dict[str, str]:
+    #Registro corto de cada correo terminado, tomado de las llamadas a mark_email_completed (puntos_control.py)
+    completed = {}
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            if tool_call["name"] == "mark_email_completed":
+                args = tool_call.get("args", {})
+                completed[args.get("message_id")] = args.get("resultado", "")
+    return completed
+
+
+def _tool_call_message_ids(messages) -> Dict[str, List[str]]:
+    #Ids de correo usados en cada llamada a herramienta (por tool_call_id)
+    ids = {}
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            args = tool_call.get("args", {})
+            message_ids = list(args.get("message_ids") or [])
+            if args.get("message_id"):
+                message_ids.append(args["message_id"])
+            ids[tool_call["id"]] = message_ids
+    return ids
+
+
+def compact_messages(messages, policy: Optional[ContextPolicy] = None) -> List:
+    """
+    Devuelve los mensajes compactados que se envian al LLM, la lista original no se modifica
+
+    Args:
+        messages: mensajes del estado del agente o supervisor
+        policy: politica de compactación, por defecto se toma de las variables de ambiente
+    """
+    from langchain_core.messages import ToolMessage, trim_messages
+    from langchain_core.messages.utils import count_tokens_approximately
+
+    policy = policy or get_context_policy()
+    completed = _completed_emails(messages)
+    call_ids = _tool_call_message_ids(messages)
+    tool_positions = [i for i, message in enumerate(messages) if isinstance(message, ToolMessage)]
+    recent = set(tool_positions[-policy.keep_last_tool_results:]) if policy.keep_last_tool_results else set()
+
+    compacted = []
+    for i, message in enumerate(messages):
+        if isinstance(message, ToolMessage) and i not in recent:
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            message_ids = call_ids.get(message.tool_call_id, [])
+            if message_ids and all(message_id in completed for message_id in message_ids):
+                #Los correos terminados se reemplazan por su registro corto
+                content = "; ".join(f"[correo {m} terminado: {completed[m]}]" for m in message_ids)
+            elif len(content) > policy.tool_result_max_chars:
+                content = (
+                    content[:policy.tool_result_max_chars]
+                    + f" ... [resultado recortado, {len(content)} caracteres]"
+                )
+            message = message.model_copy(update={"content": content})
+        compacted.append(message)
+
+    #Si aún supera el limite, se descartan los mensajes mas antiguos
+    if count_tokens_approximately(compacted) <= policy.max_prompt_tokens:
+        return compacted
+    #Siempre se conservan el mensaje del sistema y la instrucción inicial (primer mensaje del usuario)
+    first_human = next((i for i, m in enumerate(compacted) if m.type == "human"), -1)
+    head, rest = compacted[:first_human + 1], compacted[first_human + 1:]
+    budget = policy.max_prompt_tokens - count_tokens_approximately(head)
+
+    #El ultimo traspaso de un agente (sus registros JSON) tampoco se descarta: sin el, el agente siguiente no tiene trabajo
+    handoff = _last_handoff(rest)
+    if handoff is None:
+        return head + _trim_last(rest, budget)
+    before, after = rest[:handoff], rest[handoff + 1:]
+    budget -= count_tokens_approximately([rest[handoff]])
+    #Despues del traspaso van los pasos del agente actual, y si sobra espacio los mensajes anteriores al traspaso
+    tail = _trim_last(after, budget)
+    if len(tail) == len(after):
+        before = trim_messages(
+            before,
+            max_tokens=max(budget - count_tokens_approximately(tail), 0),
+            strategy="last",
+            token_counter=count_tokens_approximately,
+            start_on="ai",
+            allow_partial=False,
+        ) if before else []
+    else:
+        before = []
+    return head + before + [rest[handoff]] + tail
+
+
+def _last_handoff(messages) -> Optional[int]:
+    #Respuesta final de un agente (mensaje del LLM con nombre, con contenido y sin llamadas a herramientas)
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if message.type == "ai" and getattr(message, "name", None) and message.content and not message.tool_calls:
+            return i
+    return None
+
+
+def _trim_last(messages, max_tokens: int) -> List:
+    """Conserva los ultimos mensajes que entran en max_tokens, empezando en un mensaje del LLM"""
+    from langchain_core.messages import trim_messages
+    from langchain_core.messages.utils import count_tokens_approximately
+
+    if not messages:
+        return []
+    tail = trim_messages(
+        messages,
+        max_tokens=max(max_tokens, 0),
+        strategy="last",
+        token_counter=count_tokens_approximately,
+        #Se empieza en un mensaje del LLM, para no enviar resultados de herramientas sin su llamada
+        start_on="ai",
+        allow_partial=False,
+    )
+    if not tail:
+        #Si ni el ultimo paso entra en el limite se envia completo, desde la ultima respuesta del LLM
+        last_ai = max((i for i, m in enumerate(messages) if m.type == "ai"), default=0)
+        tail = messages[last_ai:]
+    return tail
+
+
+def make_pre_model_hook(policy: Optional[ContextPolicy] = None):
+    """Crea el pre_model_hook de create_react_agent/create_supervisor que compacta los mensajes enviados al LLM"""
+
+    def pre_model_hook(state) -> Dict:
+        #llm_input_messages solo cambia lo que se envia al LLM, el estado conserva todos los mensajes
+        return {"llm_input_messages": compact_messages(state["messages"], policy)}
+
+    return pre_model_hook
+
+
+_policy: Optional[ContextPolicy] = None
+
+
+def get_context_policy() -> ContextPolicy:
+    """Devuelve la politica de contexto del proceso (se lee una vez de las variables de ambiente)"""
+    global _policy
+    if _policy is None:
+        _policy = ContextPolicy.from_env()
+    return _policy
+
+
+class TokenBudgetExceeded(Exception):
+    """Se lanza cuando la ejecución agotó su presupuesto de tokens"""
+
+
+class TokenBudgetCallback(BaseCallbackHandler):
+    """
+    Callback que cuenta los tokens de cada llamada al LLM y detiene la ejecución si se agota el presupuesto
+
+    Args:
+        max_tokens: presupuesto de tokens (entrada + salida) de la ejecución, 0 para no limitar
+    """
+
+    #Si no se activa, LangChain solo registra las excepciones de los callbacks y la ejecución continúa
+    raise_error = True
+
+    def __init__(self, max_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._stats = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0, "max_input_tokens_per_call": 0}
+
+    @classmethod
+    def from_env(cls) -> "TokenBudgetCallback":
+        """Crea el callback con el presupuesto de la variable RUN_TOKEN_BUDGET"""
+        return cls(int(os.getenv("RUN_TOKEN_BUDGET", "0")))
+
+    def used_tokens(self) -> int:
+        with self._lock:
+            return self._stats["input_tokens"] + self._stats["output_tokens"]
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        if self.max_tokens and self.used_tokens() >= self.max_tokens:
+            raise TokenBudgetExceeded(
+                f"Se agotó el presupuesto de {self.max_tokens} tokens de la ejecución ({self.used_tokens()} usados)"
+            )
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        with self._lock:
+            self._stats["llm_calls"] += 1
+            self._stats["input_tokens"] += usage.get("input_tokens", 0)
+            self._stats["output_tokens"] += usage.get("output_tokens", 0)
+            self._stats["max_input_tokens_per_call"] = max(
+                self._stats["max_input_tokens_per_call"], usage.get("input_tokens", 0)
+            )
+
+    def report(self) -> Dict:
+        """Devuelve los tokens usados, el presupuesto y el promedio de tokens de entrada por llamada"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
+        stats["budget"] = self.max_tokens or None
+        stats["avg_input_tokens_per_call"] = round(stats["input_tokens"] / stats["llm_calls"]) if stats["llm_calls"] else 0
+        return stats
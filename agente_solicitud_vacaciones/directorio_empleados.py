@@ -0,0 +1,278 @@
+#=======================================================================================
+# Condición 3 del procedimiento sin LLM: el nombre en el archivo de la solicitud debe corresponder al remitente del correo.
+# El remitente (encabezado From de GmailGetMessageWithAttachments) se busca en el directorio de empleados
+# (CSV o SQLite, indexado por correo) y el nombre del PDF se compara por palabras con puntaje aproximado,
+# sin tildes ni mayusculas, contra el nombre del directorio o el nombre del remitente.
+# Las palabras parecidas pero distintas ("Maria" y "Mario") nunca cuentan como coincidencia, se envian al LLM.
+# Solo los casos ambiguos (puntaje intermedio o remitente sin nombre y fuera del directorio) se envian al LLM.
+#=======================================================================================
+import csv
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+#Modelos usados solo para los casos ambiguos, el segundo si la confianza del primero es baja (cascada_modelos.py)
+NAME_MATCH_MODEL = "google_genai:gemini-2.0-flash-lite"
+NAME_MATCH_CASCADE = [NAME_MATCH_MODEL, "google_genai:gemini-2.5-flash"]
+#Similitud minima entre dos palabras para sumar al puntaje ("Perez" y "Peres"), solo las iguales aseguran coincidencia
+_TOKEN_SIMILARITY = 0.8
+
+
+def _strip_accents(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def normalize_name(text: Optional[str]) -> List[str]:
+    """Devuelve las palabras del nombre sin tildes ni mayusculas (se ignoran las de una letra)"""
+    return [token for token in re.split(r"[^a-z]+", _strip_accents(text)) if len(token) > 1]
+
+
+def _compare_names(applicant_name: Optional[str], reference_name: Optional[str]) -> Tuple[float, bool]:
+    #Devuelve el puntaje y si todas las palabras comparadas son iguales (sin tildes ni mayusculas)
+    applicant, reference = normalize_name(applicant_name), normalize_name(reference_name)
+    if not applicant or not reference:
+        return 0.0, False
+    #Cada palabra del nombre mas corto se compara con la palabra mas parecida del otro nombre
+    #("Juan Pérez" corresponde a "Juan Carlos Pérez López")
+    shorter, longer = sorted((applicant, reference), key=len)
+    total = 0.0
+    exact = True
+    for token in shorter:
+        best = 1.0 if token in longer else max(SequenceMatcher(None, token, other).ratio() for other in longer)
+        exact = exact and best == 1.0
+        total += best if best >= _TOKEN_SIMILARITY else 0.0
+    score = total / len(shorter)
+    #Una sola palabra en comun ("Juan" y "Juan Pérez") no alcanza para asegurar que es la misma persona
+    if len(shorter) == 1 and len(longer) > 1:
+        score *= 0.7
+    return round(score, 3), exact
+
+
+def name_score(applicant_name: Optional[str], reference_name: Optional[str]) -> float:
+    """
+    Puntaje entre 0 y 1 de cuanto corresponde el nombre del PDF a un nombre de referencia, comparando palabra por palabra
+
+    Args:
+        applicant_name: nombre del solicitante que está en el PDF
+        reference_name: nombre del directorio de empleados o del remitente
+    """
+    return _compare_names(applicant_name, reference_name)[0]
+
+
+def _address_score(applicant_name: Optional[str], address: str) -> float:
+    #Sin nombre del remitente se compara con la dirección: "juan.perez" o "jperez" corresponden a "Juan Pérez"
+    names = normalize_name(applicant_name)
+    local_part = re.sub(r"[^a-z]+", "", _strip_accents(address.split("@")[0]))
+    if not names or not local_part:
+        return 0.0
+    matches = [name for name in names if len(name) > 2 and name in local_part]
+    if len(matches) >= 2:
+        return 1.0
+    if not matches:
+        return 0.0
+    #Lo que queda de la dirección sin la palabra encontrada deben ser iniciales de las otras palabras ("jperez")
+    rest = local_part.replace(matches[0], "", 1)
+    initials = [name[0] for name in names if name not in matches]
+    if rest and len(rest) <= len(initials) and all(c in initials for c in rest):
+        return 0.9
+    return 0.5
+
+
+class EmployeeDirectory:
+    """
+    Directorio de empleados cargado en memoria, indexado por correo
+
+    Args:
+        employees: nombre de cada empleado por su correo
+    """
+
+    def __init__(self, employees: Optional[Dict[str, str]] = None):
+        self._employees = {email.strip().lower(): name for email, name in (employees or {}).items()}
+
+    @classmethod
+    def from_path(cls, path: str) -> "EmployeeDirectory":
+        """
+        Carga el directorio desde un CSV (columnas email y nombre) o un SQLite (tabla empleados con email y nombre)
+
+        Args:
+            path: ruta del archivo .csv o .sqlite
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                return cls({row["email"]: row["nombre"] for row in csv.DictReader(f) if row.get("email")})
+        conn = sqlite3.connect(path)
+        try:
+            return cls(dict(conn.execute("SELECT email, nombre FROM empleados")))
+        finally:
+            conn.close()
+
+    def get_name(self, email: str) -> Optional[str]:
+        return self._employees.get((email or "").strip().lower())
+
+    def __len__(self) -> int:
+        return len(self._employees)
+
+
+@dataclass
+class NameMatch:
+    """
+    Resultado de la comparación del nombre del PDF con el remitente
+
+    Args:
+        result: "coincide", "no_coincide" o "ambiguo"
+        score: puntaje de la comparación entre 0 y 1
+        source: con que se comparó ("directorio", "remitente" o "direccion")
+    """
+
+    result: str
+    score: float
+    source: str
+
+
+@dataclass
+class NameMatchConfig:
+    """
+    Umbrales del puntaje: desde match_threshold coincide, hasta mismatch_threshold no coincide, entre ambos es ambiguo
+    """
+
+    match_threshold: float = 0.85
+    mismatch_threshold: float = 0.4
+
+    @classmethod
+    def from_env(cls) -> "NameMatchConfig":
+        """Crea la configuración desde las variables de ambiente NAME_MATCH_*"""
+        return cls(
+            match_threshold=float(os.getenv("NAME_MATCH_THRESHOLD", "0.85")),
+            mismatch_threshold=float(os.getenv("NAME_MISMATCH_THRESHOLD", "0.4")),
+        )
+
+
+def match_applicant(applicant_name: Optional[str], sender: Optional[str], directory: Optional[EmployeeDirectory] = None,
+                    config: Optional[NameMatchConfig] = None) -> NameMatch:
+    """
+    Compara el nombre del PDF con el remitente del correo sin LLM
+
+    Args:
+        applicant_name: nombre del solicitante que está en el PDF
+        sender: encabezado From del correo, por ejemplo "Juan Perez <jperez@empresa.com>"
+        directory: directorio de empleados, por defecto el de la variable EMPLOYEE_DIRECTORY_PATH
+        config: umbrales del puntaje, por defecto los de las variables NAME_MATCH_*
+    """
+    directory = get_employee_directory() if directory is None else directory
+    config = config or get_name_match_config()
+    if not normalize_name(applicant_name):
+        return NameMatch("no_coincide", 0.0, "remitente")
+
+    display_name, address = parseaddr(sender or "")
+    #El nombre del directorio es el oficial, el nombre del remitente lo puede cambiar cada persona
+    employee_name = directory.get_name(address)
+    if employee_name:
+        (score, exact), source = _compare_names(applicant_name, employee_name), "directorio"
+        if display_name:
+            score, exact = max((score, exact), _compare_names(applicant_name, display_name))
+    elif normalize_name(display_name):
+        (score, exact), source = _compare_names(applicant_name, display_name), "remitente"
+    else:
+        score, source = _address_score(applicant_name, address), "direccion"
+        exact = True
+
+    #Con palabras parecidas pero distintas ("Maria" y "Mario") decide el LLM aunque el puntaje sea alto
+    if score >= config.match_threshold and exact:
+        return NameMatch("coincide", score, source)
+    #Con un remitente desconocido (sin nombre ni directorio) un puntaje bajo no asegura que no coincida
+    if score <= config.mismatch_threshold and source != "direccion":
+        return NameMatch("no_coincide", score, source)
+    return NameMatch("ambiguo", score, source)
+
+
+class NameMatchDecision(BaseModel):
+    """Decisión del LLM para un caso ambiguo"""
+
+    corresponde: bool = Field(description="True si el nombre del documento corresponde al remitente del correo")
+    confianza: float = Field(default=1.0, ge=0, le=1, description="Confianza en la respuesta, entre 0 y 1")
+
+
+def _llm_name_match(applicant_name: str, sender: str, employee_name: Optional[str]) -> bool:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from cascada_modelos import get_model_cascade
+
+    cascade = get_model_cascade("name_match", NAME_MATCH_CASCADE, NameMatchDecision)
+    response = cascade.invoke([
+        SystemMessage("Indica si el nombre de una solicitud de vacaciones corresponde al remitente de su correo, "
+                      "y tu confianza en la respuesta entre 0 y 1."),
+        HumanMessage(
+            f"Nombre en la solicitud: {applicant_name}\n"
+            f"Remitente del correo: {sender}\n"
+            f"Nombre del empleado con ese correo: {employee_name or 'desconocido'}"
+        ),
+    ])
+    return response.result.corresponde
+
+
+def applicant_matches_sender(applicant_name: Optional[str], sender: Optional[str]) -> bool:
+    """
+    Devuelve True si el nombre del PDF corresponde al remitente, solo los casos ambiguos se consultan al LLM
+
+    Args:
+        applicant_name: nombre del solicitante que está en el PDF
+        sender: encabezado From del correo
+    """
+    match = match_applicant(applicant_name, sender)
+    _record(match)
+    if match.result != "ambiguo":
+        return match.result == "coincide"
+    employee_name = get_employee_directory().get_name(parseaddr(sender or "")[1])
+    return _llm_name_match(applicant_name, sender, employee_name)
+
+
+_directory: Optional[EmployeeDirectory] = None
+_config: Optional[NameMatchConfig] = None
+_lock = threading.Lock()
+_stats: Dict = {"checked": 0, "by_result": {}, "by_source": {}, "llm_escalations": 0}
+
+
+def get_employee_directory() -> EmployeeDirectory:
+    """Devuelve el directorio de empleados del proceso (variable EMPLOYEE_DIRECTORY_PATH, vacio si no se configura)"""
+    global _directory
+    with _lock:
+        if _directory is None:
+            path = os.getenv("EMPLOYEE_DIRECTORY_PATH", "")
+            _directory = EmployeeDirectory.from_path(path) if path else EmployeeDirectory()
+        return _directory
+
+
+def get_name_match_config() -> NameMatchConfig:
+    """Devuelve los umbrales del proceso (se leen una vez de las variables de ambiente)"""
+    global _config
+    if _config is None:
+        _config = NameMatchConfig.from_env()
+    return _config
+
+
+def _record(match: NameMatch) -> None:
+    with _lock:
+        _stats["checked"] += 1
+        _stats["by_result"][match.result] = _stats["by_result"].get(match.result, 0) + 1
+        _stats["by_source"][match.source] = _stats["by_source"].get(match.source, 0) + 1
+        if match.result == "ambiguo":
+            _stats["llm_escalations"] += 1
+
+
+def get_name_match_stats() -> Dict:
+    """Devuelve cuantas comparaciones se resolvieron sin LLM y cuantas se enviaron al LLM por ser ambiguas"""
+    with _lock:
+        return {
+            "checked": _stats["checked"],
+            "by_result": dict(_stats["by_result"]),
+            "by_source": dict(_stats["by_source"]),
+            "llm_escalations": _stats["llm_escalations"],
+        }
@@ -5,7 +5,7 @@
 # (https://github.com/langchain-ai/langchain-community/blob/main/libs/community/langchain_community/tools/gmail/get_message.py)
 #=======================================================================================
 import email
-from typing import Dict, Optional, Type
+from typing import Dict, List, Optional, Type
 import base64
 
 from langchain_core.callbacks import CallbackManagerForToolRun
@@ -35,6 +35,8 @@ class GmailGetMessageWithAttachments(GmailBaseTool):  # type: ignore[override, o
     """
     Tool that gets a message and save attachments
     the attachments are saved in a root folder, within a subfolder with same name as ID
+    with lazy_attachments=True only the message structure is fetched and only the attachments
+    that match attachment_mime_types/attachment_extensions are downloaded (the rest are listed as skipped)
 
     Args:
         message_id: ID from GMail
@@ -50,6 +52,15 @@ class GmailGetMessageWithAttachments(GmailBaseTool):  # type: ignore[override, o
     )
     args_schema: Type[SearchArgsSchema] = SearchArgsSchema
 
+    # Lazy mode: fetch only the message structure (format="full") and download through the
+    # attachments endpoint only the attachments that match the filter (PDF by default)
+    lazy_attachments: bool = False
+    # The googleapiclient resource (httplib2) is not thread-safe: with per_thread_resource=True
+    # each thread uses its own api_resource (see recursos_gmail.py) so the tool can run concurrently
+    per_thread_resource: bool = False
+    attachment_mime_types: List[str] = ["application/pdf"]
+    attachment_extensions: List[str] = [".pdf"]
+
     def _run(
         self,
         message_id: str,
@@ -58,12 +69,32 @@ class GmailGetMessageWithAttachments(GmailBaseTool):  # type: ignore[override, o
         run_manager: Optional[CallbackManagerForToolRun] = None,
     ) -> Dict:
         """Run the tool."""
+        if self.lazy_attachments:
+            return self._run_lazy(message_id, must_save_attachments, attachments_root_path)
+
         query = (
-            self.api_resource.users()
+            self._get_api_resource().users()
             .messages()
             .get(userId="me", format="raw", id=message_id)
         )
         message_data = query.execute()
+        return self._parse_raw_message(message_id, message_data, must_save_attachments, attachments_root_path)
+
+    def _get_api_resource(self):
+        if self.per_thread_resource:
+            from recursos_gmail import get_thread_api_resource
+
+            return get_thread_api_resource()
+        return self.api_resource
+
+    def _parse_raw_message(
+        self,
+        message_id: str,
+        message_data: Dict,
+        must_save_attachments: bool,
+        attachments_root_path: str,
+    ) -> Dict:
+        """Parse a message fetched with format="raw" and save its attachments."""
         raw_message = base64.urlsafe_b64decode(message_data["raw"])
 
         email_msg = email.message_from_bytes(raw_message)
@@ -87,9 +118,9 @@ class GmailGetMessageWithAttachments(GmailBaseTool):  # type: ignore[override, o
                     if must_save_attachments:
                         self._save_file(attachments_root_path+"/"+message_id, file_name, part.get_payload())
                 elif not message_body and ctype == "text/plain" and "attachment" not in cdispo:
-                    message_body = part.get_payload(decode=True).decode(part.get_content_charset())  # type: ignore[union-attr]
+                    message_body = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8")  # type: ignore[union-attr]
         else:
-            message_body = email_msg.get_payload(decode=True).decode(part.get_content_charset())  # type: ignore[union-attr]
+            message_body = email_msg.get_payload(decode=True).decode(email_msg.get_content_charset() or "utf-8")  # type: ignore[union-attr]
 
         body = clean_email_body(message_body)
         
@@ -104,18 +135,281 @@ class GmailGetMessageWithAttachments(GmailBaseTool):  # type: ignore[override, o
             "attachments": attachments,
         }
         
+    def _run_lazy(
+        self,
+        message_id: str,
+        must_save_attachments: bool,
+        attachments_root_path: str,
+    ) -> Dict:
+        """Get the message structure and download only the attachments that match the filter."""
+        message_data = (
+            self._get_api_resource().users()
+            .messages()
+            .get(userId="me", format="full", id=message_id)
+            .execute()
+        )
+        result, downloads = self._parse_full_message(message_id, message_data)
+        if must_save_attachments:
+            for attachment_id, inline_data, file_name in downloads:
+                # Only matching attachments are downloaded, one request per attachment.
+                # attachments.get has no media download: the whole attachment comes base64url encoded in the JSON response
+                data = self._attachment_request(message_id, attachment_id).execute()["data"] if attachment_id else inline_data
+                self._save_urlsafe_file(attachments_root_path + "/" + message_id, file_name, data)
+        return result
+
+    def _attachment_request(self, message_id: str, attachment_id: str):
+        return (
+            self._get_api_resource().users()
+            .messages()
+            .attachments()
+            .get(userId="me", messageId=message_id, id=attachment_id)
+        )
+
+    def _parse_full_message(self, message_id: str, message_data: Dict):
+        """Parse a message fetched with format="full".
+
+        Returns the message dict and the list of (attachment_id, inline_data, file_name)
+        of the attachments that match the filter and must be downloaded.
+        """
+        payload = message_data.get("payload", {})
+        headers = _headers_to_dict(payload.get("headers", []))
+
+        from email.utils import parsedate_to_datetime
+
+        date = headers.get("date")
+        if date:
+            date = parsedate_to_datetime(date).strftime("%Y-%m-%d %H:%M:%S")
+
+        message_body = ""
+        attachments = []
+        skipped_attachments = []
+        downloads = []
+        for part in _walk_parts(payload):
+            file_name = part.get("filename")
+            content_type = part.get("mimeType", "")
+            part_body = part.get("body", {})
+            if file_name:
+                attachment = {"file_name": file_name, "content_type": content_type}
+                if not self._matches_attachment_filter(file_name, content_type):
+                    skipped_attachments.append(
+                        {**attachment, "size": part_body.get("size", 0), "reason": "filtered"}
+                    )
+                    continue
+                attachments.append(attachment)
+                downloads.append((part_body.get("attachmentId"), part_body.get("data", ""), file_name))
+            elif not message_body and content_type == "text/plain" and part_body.get("data"):
+                charset = _get_charset(_headers_to_dict(part.get("headers", [])))
+                message_body = _urlsafe_b64decode(part_body["data"]).decode(charset, errors="replace")
+
+        body = clean_email_body(message_body)
+
+        result = {
+            "id": message_id,
+            "threadId": message_data["threadId"],
+            "snippet": message_data["snippet"],
+            "body": body,
+            "subject": headers.get("subject"),
+            "sender": headers.get("from"),
+            "date": date,
+            "attachments": attachments,
+            "skipped_attachments": skipped_attachments,
+        }
+        return result, downloads
+
+    def _matches_attachment_filter(self, file_name: str, content_type: str) -> bool:
+        if content_type.lower() in [m.lower() for m in self.attachment_mime_types]:
+            return True
+        return any(file_name.lower().endswith(ext.lower()) for ext in self.attachment_extensions)
+
+    def _save_urlsafe_file(self, folder: str, file_name: str, urlsafe_content: str):
+        """Decode the base64url content in chunks and write it to disk.
+
+        The encoded content is already in memory (the API returns it in the JSON response),
+        decoding in chunks only avoids keeping a second, decoded copy of the whole attachment.
+        """
+        # Chunk size must be a multiple of 4 so each chunk decodes on its own
+        chunk_size = 4 * 64 * 1024
+        _atomic_write(
+            folder,
+            file_name,
+            (
+                _urlsafe_b64decode(urlsafe_content[start:start + chunk_size])
+                for start in range(0, len(urlsafe_content), chunk_size)
+            ),
+        )
+
     def _save_file(self, folder: str, file_name: str, base64_content: str):
-        import os
-        from pathlib import Path
+        # Convert the base64 content to bytes and save the file
+        _atomic_write(folder, file_name, [base64.b64decode(base64_content)])
+
+
+class BatchGetArgsSchema(BaseModel):
+    """Input for GmailBatchGetMessagesWithAttachments."""
+
+    message_ids: List[str] = Field(
+        ...,
+        description="The unique IDs of the email messages, retrieved from a search.",
+    )
+    must_save_attachments: bool = Field(
+        ...,
+        description="True for save attachments",
+    )
+    attachments_root_path: str = Field(
+        ...,
+        description="Root folder for save attachments(whitout message_id), None if not must save attachments",
+    )
+
+
+class GmailBatchGetMessagesWithAttachments(GmailGetMessageWithAttachments):  # type: ignore[override, override]
+    """
+    Tool that gets several messages in one call and save attachments
+    the messages (and in lazy mode the attachments) are fetched with Gmail batch HTTP requests,
+    batch_size requests per HTTP round trip (Gmail allows up to 100, 50 is recommended)
+
+    Args:
+        message_ids: IDs from GMail
+        must_save_attachments: True for save attachments
+        attachments_root_path: root folder for save attachments (whitout message_id)
+        run_manager: Optional, not send
+    """
+
+    name: str = "batch_get_gmail_messages_with_attachments"
+    description: str = (
+        """Use this tool to fetch several emails with attachments in a single call by their message IDs
+        Returns a list of messages (thread ID, snippet, body, subject, sender, date, attachments) and the errors by message ID."""
+    )
+    args_schema: Type[BatchGetArgsSchema] = BatchGetArgsSchema  # type: ignore[assignment]
+
+    batch_size: int = 50
+
+    def _run(  # type: ignore[override]
+        self,
+        message_ids: List[str],
+        must_save_attachments: bool = False,
+        attachments_root_path: str = "./attachments",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Dict:
+        """Run the tool."""
+        # Duplicated IDs are fetched once (the batch request_id must be unique)
+        message_ids = list(dict.fromkeys(message_ids))
+        message_format = "full" if self.lazy_attachments else "raw"
+        responses, fetch_errors = self._execute_batches(
+            [
+                (message_id, self._get_api_resource().users().messages().get(userId="me", format=message_format, id=message_id))
+                for message_id in message_ids
+            ]
+        )
+        # Every error of a message is kept (for example, several failed attachment downloads)
+        errors: Dict[str, List[str]] = {message_id: [error] for message_id, error in fetch_errors.items()}
+
+        messages = []
+        pending_downloads = []
+        for message_id in message_ids:
+            if message_id not in responses:
+                continue
+            try:
+                if self.lazy_attachments:
+                    result, downloads = self._parse_full_message(message_id, responses[message_id])
+                    pending_downloads.extend((message_id, *download) for download in downloads)
+                else:
+                    result = self._parse_raw_message(
+                        message_id, responses[message_id], must_save_attachments, attachments_root_path
+                    )
+                messages.append(result)
+            except Exception as e:
+                errors.setdefault(message_id, []).append(str(e))
+
+        if must_save_attachments and pending_downloads:
+            self._save_attachments_batch(pending_downloads, attachments_root_path, errors)
+
+        return {
+            "messages": messages,
+            "errors": [
+                {"id": message_id, "error": "; ".join(message_errors)} for message_id, message_errors in errors.items()
+            ],
+        }
+
+    def _execute_batches(self, requests):
+        """Execute (request_id, request) pairs in batches of batch_size, return responses and errors by request_id."""
+        responses: Dict = {}
+        errors: Dict = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = str(exception)
+            else:
+                responses[request_id] = response
+
+        for start in range(0, len(requests), self.batch_size):
+            batch = self._get_api_resource().new_batch_http_request(callback=callback)
+            for request_id, request in requests[start:start + self.batch_size]:
+                batch.add(request, request_id=request_id)
+            batch.execute()
+        return responses, errors
+
+    def _save_attachments_batch(self, pending_downloads, attachments_root_path: str, errors: Dict[str, List[str]]):
+        """Download the matching attachments of all messages with batch requests and save them."""
+        requests = []
+        files = {}
+        for index, (message_id, attachment_id, inline_data, file_name) in enumerate(pending_downloads):
+            folder = attachments_root_path + "/" + message_id
+            if attachment_id:
+                request_id = str(index)
+                requests.append((request_id, self._attachment_request(message_id, attachment_id)))
+                files[request_id] = (message_id, folder, file_name)
+            else:
+                self._save_urlsafe_file(folder, file_name, inline_data)
+
+        responses, download_errors = self._execute_batches(requests)
+        for request_id, (message_id, folder, file_name) in files.items():
+            if request_id in responses:
+                self._save_urlsafe_file(folder, file_name, responses[request_id]["data"])
+            else:
+                errors.setdefault(message_id, []).append(f"{file_name}: {download_errors.get(request_id)}")
+
+
+def _atomic_write(folder: str, file_name: str, chunks) -> None:
+    """Write the chunks to a temporary file in the same folder and rename it, so concurrent
+    workers (or a failed download) never leave a partial file with the final name."""
+    import os
+    import tempfile
+    from pathlib import Path
+
+    folder_path = Path(folder)
+    # exist_ok makes the folder creation safe when several workers create it at the same time
+    folder_path.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder_path, prefix=f".{file_name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, folder_path / file_name)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _urlsafe_b64decode(data: str) -> bytes:
+    """Decode base64url data, adding the padding that Gmail may omit."""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _headers_to_dict(headers: List[Dict]) -> Dict[str, str]:
+    """Convert the Gmail API header list to a dict with lowercase names."""
+    return {header["name"].lower(): header["value"] for header in headers}
+
+
+def _walk_parts(part: Dict):
+    """Walk the MIME part tree returned by the Gmail API (format="full")."""
+    yield part
+    for child in part.get("parts", []) or []:
+        yield from _walk_parts(child)
 
-        # Convert the base64 content to bytes
-        content_bytes = base64.b64decode(base64_content)
 
-        # Create the folder if it doesn't exist
-        folder_path = Path(folder)
-        folder_path.mkdir(parents=True, exist_ok=True)
+def _get_charset(headers: Dict[str, str]) -> str:
+    """Get the charset from the Content-Type header of a part, utf-8 by default."""
+    from email.message import Message
 
-        # Save the file
-        file_path = folder_path / file_name
-        with open(file_path, 'wb') as f:
-            f.write(content_bytes)
+    msg = Message()
+    msg["Content-Type"] = headers.get("content-type", "text/plain")
+    return msg.get_content_charset() or "utf-8"
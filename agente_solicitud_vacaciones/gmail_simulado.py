@@ -0,0 +1,402 @@
+#=======================================================================================
+# API de GMail simulado para el benchmark offline (benchmark_offline.py), sin credenciales ni conexión a internet.
+# Genera una bandeja con N correos sinteticos: solicitudes validas con su PDF, solicitudes sin firma, con el nombre
+# de otra persona y sin PDF, boletines y correos no relacionados, con asuntos, cuerpos, nombres de archivo y PDFs
+# en distintos charsets (utf-8, iso-8859-1, windows-1252, iso-8859-15).
+# El cliente HTTP simulado responde las peticiones del recurso de googleapiclient (messages.list, messages.get con
+# format raw y full, attachments.get, drafts.create y las peticiones batch), asi las herramientas de GMail y el
+# triaje se ejecutan sin cambios (recursos_gmail.set_http_factory).
+#=======================================================================================
+import base64
+import json
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.utils import format_datetime, parseaddr
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+#Tipos de correo de la bandeja sintetica
+KIND_VALID = "valida"
+KIND_UNSIGNED = "sin_firma"
+KIND_OTHER_NAME = "otro_nombre"
+KIND_NO_PDF = "sin_pdf"
+KIND_BULK = "boletin"
+KIND_NOT_RELATED = "no_relacionado"
+
+#Proporción de cada tipo en cada grupo de 20 correos (14 validas, 1 sin firma, 1 con otro nombre, 1 sin PDF,
+#2 boletines y 1 no relacionado), intercalados para que cualquier cantidad de correos tenga de todos los tipos
+KIND_CYCLE = [
+    KIND_VALID, KIND_VALID, KIND_BULK, KIND_VALID, KIND_UNSIGNED, KIND_VALID, KIND_VALID, KIND_NO_PDF, KIND_VALID,
+    KIND_VALID, KIND_NOT_RELATED, KIND_VALID, KIND_VALID, KIND_OTHER_NAME, KIND_VALID, KIND_BULK, KIND_VALID,
+    KIND_VALID, KIND_VALID, KIND_VALID,
+]
+
+#Tipos de correo que reciben un borrador de respuesta (los boletines y los no relacionados se descartan)
+REPLY_KINDS = {KIND_VALID, KIND_UNSIGNED, KIND_OTHER_NAME, KIND_NO_PDF}
+
+CHARSETS = ["utf-8", "iso-8859-1", "windows-1252", "iso-8859-15"]
+
+_FIRST_NAMES = ["José", "María", "Iñigo", "Begoña", "Raúl", "Sofía", "Andrés", "Lucía", "Ángel", "Mónica"]
+_LAST_NAMES = ["Pérez", "Núñez", "Muñoz", "Gómez", "Ibáñez", "Martínez", "Suárez", "López", "Hernández", "Castañeda"]
+
+#Limite de resultados por pagina de messages.list en el API de GMail
+MAX_LIST_RESULTS = 500
+
+
+def _person(index: int) -> Tuple[str, str]:
+    #Nombre y correo del remitente, el correo es unico para relacionar cada borrador con su solicitud
+    first = _FIRST_NAMES[index % len(_FIRST_NAMES)]
+    last = _LAST_NAMES[(index // len(_FIRST_NAMES)) % len(_LAST_NAMES)]
+    address = unicodedata.normalize("NFKD", f"{first[0]}{last}.{index}@empresa.com".lower())
+    return f"{first} {last}", address.encode("ascii", "ignore").decode()
+
+
+def _pdf_escape(text: str) -> bytes:
+    return text.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def build_pdf(lines: List[str]) -> bytes:
+    """
+    Crea un PDF de una página con las lineas de texto (Helvetica con WinAnsiEncoding, el texto se puede extraer)
+
+    Args:
+        lines: lineas de texto del documento
+    """
+    stream = b"BT /F1 11 Tf 14 TL 72 760 Td " + b" ".join(b"(" + _pdf_escape(line) + b") Tj T*" for line in lines) + b" ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += str(number).encode() + b" 0 obj\n" + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 " + str(len(objects) + 1).encode() + b"\n0000000000 65535 f \n"
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size " + str(len(objects) + 1).encode() + b" /Root 1 0 R >>\nstartxref\n" + str(xref).encode() + b"\n%%EOF\n"
+    return bytes(pdf)
+
+
+def build_request_pdf(applicant_name: str, reference: int, signed: bool = True, start: str = "2025-08-04",
+                      end: str = "2025-08-15") -> bytes:
+    """
+    Crea el PDF de una solicitud de vacaciones con el formato de la empresa
+
+    Args:
+        applicant_name: nombre del solicitante
+        reference: número de la solicitud, cada PDF es distinto (no se reutilizan validaciones de la cache)
+        signed: True si la solicitud tiene firma
+        start: fecha de inicio de las vacaciones
+        end: fecha de fin de las vacaciones
+    """
+    return build_pdf([
+        "SOLICITUD DE VACACIONES",
+        f"Solicitud nº {reference:06d}",
+        f"Nombre del trabajador: {applicant_name}",
+        f"Yo, {applicant_name}, trabajador de la empresa, solicito vacaciones desde la fecha {start} hasta la fecha {end}.",
+        "Responsable de vacaciones: Área de Gestión Humana",
+        "Atentamente,",
+        f"Firmado digitalmente por {applicant_name}" if signed else "Firma: ________________",
+    ])
+
+
+def build_request_pdfs(size: int) -> List[Tuple[str, bytes]]:
+    """
+    Crea los PDFs de size solicitudes de vacaciones (nombre de archivo y contenido), una de cada 20 sin firma
+
+    Args:
+        size: cantidad de PDFs
+    """
+    pdfs = []
+    for index in range(size):
+        name, _ = _person(index)
+        pdfs.append((f"solicitud_vacaciones_{index}_{name.split()[0]}.pdf",
+                     build_request_pdf(name, index, signed=KIND_CYCLE[index % len(KIND_CYCLE)] != KIND_UNSIGNED)))
+    return pdfs
+
+
+@dataclass
+class SyntheticEmail:
+    """
+    Correo de la bandeja sintetica
+
+    Args:
+        message_id: id del correo
+        kind: tipo de correo (KIND_*)
+        sender: remitente
+        address: correo del remitente
+        raw: correo completo (RFC 822)
+        payload: partes MIME con el formato de messages.get con format="full"
+        snippet: inicio del cuerpo del correo
+        attachments: contenido de cada adjunto por su attachmentId
+        label_ids: etiquetas del correo
+    """
+
+    message_id: str
+    kind: str
+    sender: str
+    address: str
+    raw: bytes
+    payload: Dict
+    snippet: str
+    attachments: Dict[str, bytes] = field(default_factory=dict)
+    label_ids: List[str] = field(default_factory=lambda: ["INBOX", "UNREAD"])
+
+
+def _email_content(index: int, kind: str) -> Tuple[str, str, Optional[Tuple[str, bytes]]]:
+    #Asunto, cuerpo y PDF adjunto (nombre y contenido) de cada tipo de correo
+    name, _ = _person(index)
+    other_name, _ = _person(index + 7)
+    if kind == KIND_BULK:
+        return (f"Boletín semanal nº {index}: novedades de la compañía",
+                "Estas son las novedades de la semana: capacitaciones, cumpleaños y más.", None)
+    if kind == KIND_NOT_RELATED:
+        return (f"Reunión de seguimiento del proyecto ({index})",
+                f"Hola, ¿podemos reunirnos el jueves para revisar el avance? Saludos, {name}", None)
+    subject = f"Solicitud de vacaciones - {name} ({index})"
+    body = f"Buenos días, adjunto mi solicitud de vacaciones para su revisión y aprobación.\nSaludos,\n{name}"
+    if kind == KIND_NO_PDF:
+        return subject, body.replace("adjunto mi", "envío mi"), None
+    applicant = other_name if kind == KIND_OTHER_NAME else name
+    pdf = build_request_pdf(applicant, index, signed=kind != KIND_UNSIGNED)
+    return subject, body, (f"solicitud_vacaciones_{index}_{name.split()[0]}.pdf", pdf)
+
+
+def _part_structure(part, message_id: str, attachments: Dict[str, bytes], part_id: str = "") -> Dict:
+    #Estructura de una parte MIME con el formato del API de GMail (los adjuntos solo con su attachmentId)
+    structure = {
+        "partId": part_id,
+        "mimeType": part.get_content_type(),
+        "filename": part.get_filename() or "",
+        "headers": [{"name": name, "value": str(value)} for name, value in part.items()],
+    }
+    if part.is_multipart():
+        structure["body"] = {"size": 0}
+        structure["parts"] = [
+            _part_structure(child, message_id, attachments, f"{part_id}.{i}" if part_id else str(i))
+            for i, child in enumerate(part.iter_parts())
+        ]
+        return structure
+    data = part.get_payload(decode=True) or b""
+    if structure["filename"]:
+        attachment_id = f"adj-{message_id}-{part_id or '0'}"
+        attachments[attachment_id] = data
+        structure["body"] = {"attachmentId": attachment_id, "size": len(data)}
+    else:
+        structure["body"] = {"size": len(data), "data": base64.urlsafe_b64encode(data).decode()}
+    return structure
+
+
+def build_email(index: int, received: Optional[datetime] = None) -> SyntheticEmail:
+    """
+    Crea el correo sintetico de la posición index de la bandeja
+
+    Args:
+        index: posición del correo, define su tipo (KIND_CYCLE), remitente y charset
+        received: fecha de recepción del correo
+    """
+    kind = KIND_CYCLE[index % len(KIND_CYCLE)]
+    charset = CHARSETS[index % len(CHARSETS)]
+    name, address = _person(index)
+    subject, body, pdf = _email_content(index, kind)
+    message_id = f"{index:016x}"
+
+    message = EmailMessage()
+    message["From"] = f"{name} <{address}>"
+    message["To"] = "vacaciones@empresa.com"
+    message["Subject"] = subject
+    message["Date"] = format_datetime(received or datetime.now(timezone.utc))
+    message["Message-ID"] = f"<{message_id}@empresa.com>"
+    if kind == KIND_BULK:
+        message["List-Unsubscribe"] = "<mailto:baja@boletines.empresa.com>"
+        message["Precedence"] = "bulk"
+    #Cada correo usa un charset distinto para el cuerpo (quoted-printable o base64), en texto y HTML como los clientes de
+    #correo (GmailSearch solo decodifica con el charset correcto los cuerpos de correos multipart)
+    message.set_content(body, charset=charset, cte="base64" if index % 2 else "quoted-printable")
+    message.add_alternative("<p>" + body.replace("\n", "<br>") + "</p>", subtype="html", charset=charset)
+    if pdf is not None:
+        message.add_attachment(pdf[1], maintype="application", subtype="pdf", filename=pdf[0])
+
+    attachments: Dict[str, bytes] = {}
+    return SyntheticEmail(
+        message_id=message_id,
+        kind=kind,
+        sender=message["From"],
+        address=address,
+        raw=message.as_bytes(),
+        payload=_part_structure(message, message_id, attachments),
+        snippet=body[:100],
+        attachments=attachments,
+    )
+
+
+class SyntheticMailbox:
+    """
+    Bandeja de correo sintetica que responde las peticiones del API de GMail simulado
+
+    Args:
+        size: cantidad de correos de la bandeja
+        latency_seconds: demora simulada de cada petición HTTP al API (una sola vez por petición batch)
+    """
+
+    def __init__(self, size: int, latency_seconds: float = 0.0):
+        received = datetime.now(timezone.utc) - timedelta(hours=1)
+        self.emails = [build_email(i, received - timedelta(minutes=i)) for i in range(size)]
+        self._by_id = {email.message_id: email for email in self.emails}
+        self._by_address = {email.address: email.message_id for email in self.emails}
+        self.latency_seconds = latency_seconds
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._drafts: List[Dict] = []
+        self._requests: Dict[str, int] = {}
+
+    def http(self) -> "FakeGmailHttp":
+        """Crea un cliente HTTP simulado de la bandeja (uno por cada recurso del API, como httplib2)"""
+        return FakeGmailHttp(self)
+
+    def expected_replies(self) -> List[str]:
+        """Ids de los correos que deben recibir un borrador de respuesta"""
+        return [email.message_id for email in self.emails if email.kind in REPLY_KINDS]
+
+    def reply_times(self) -> Dict[str, float]:
+        """Segundos desde started hasta el primer borrador de respuesta de cada correo"""
+        with self._lock:
+            times = {}
+            for draft in self._drafts:
+                if draft["message_id"] is not None:
+                    times.setdefault(draft["message_id"], draft["seconds"])
+            return times
+
+    def stats(self) -> Dict:
+        """Devuelve las peticiones recibidas por cada metodo del API y los borradores creados"""
+        with self._lock:
+            return {"requests": dict(self._requests), "drafts": len(self._drafts)}
+
+    def _count(self, method: str) -> None:
+        with self._lock:
+            self._requests[method] = self._requests.get(method, 0) + 1
+
+    def handle(self, method: str, uri: str, body=None) -> Tuple[int, Dict]:
+        """
+        Responde una petición al API de GMail, devuelve el estado HTTP y el JSON de la respuesta
+
+        Args:
+            method: metodo HTTP
+            uri: ruta y parametros de la petición
+            body: cuerpo de la petición (JSON)
+        """
+        url = urlsplit(uri)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = url.path.split("/gmail/v1/users/", 1)[-1].split("/")[1:]
+
+        if method == "GET" and path == ["messages"]:
+            self._count("messages.list")
+            start = int(params.get("pageToken", "0"))
+            end = start + min(int(params.get("maxResults", "100")), MAX_LIST_RESULTS)
+            response = {
+                "messages": [{"id": e.message_id, "threadId": e.message_id} for e in self.emails[start:end]],
+                "resultSizeEstimate": len(self.emails),
+            }
+            if end < len(self.emails):
+                response["nextPageToken"] = str(end)
+            return 200, response
+
+        if method == "GET" and len(path) == 2 and path[0] == "messages":
+            self._count("messages.get")
+            email = self._by_id.get(path[1])
+            if email is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            response = {"id": email.message_id, "threadId": email.message_id, "labelIds": email.label_ids,
+                        "snippet": email.snippet, "sizeEstimate": len(email.raw)}
+            if params.get("format") == "raw":
+                response["raw"] = base64.urlsafe_b64encode(email.raw).decode()
+            else:
+                response["payload"] = email.payload
+            return 200, response
+
+        if method == "GET" and len(path) == 4 and path[2] == "attachments":
+            self._count("attachments.get")
+            data = self._by_id[path[1]].attachments.get(path[3]) if path[1] in self._by_id else None
+            if data is None:
+                return 404, {"error": {"code": 404, "message": "Invalid attachment token"}}
+            return 200, {"size": len(data), "data": base64.urlsafe_b64encode(data).decode()}
+
+        if method == "POST" and path == ["drafts"]:
+            self._count("drafts.create")
+            return 200, self._create_draft(json.loads(body))
+
+        self._count("unsupported")
+        return 400, {"error": {"code": 400, "message": f"Metodo no soportado por el API simulado: {method} {url.path}"}}
+
+    def _create_draft(self, body: Dict) -> Dict:
+        from email import message_from_bytes, policy
+
+        message = message_from_bytes(base64.urlsafe_b64decode(body["message"]["raw"]), policy=policy.default)
+        address = parseaddr(str(message.get("To", "")))[1].lower()
+        with self._lock:
+            draft_id = f"r{len(self._drafts)}"
+            self._drafts.append({
+                "id": draft_id,
+                "message_id": self._by_address.get(address),
+                "seconds": time.perf_counter() - self.started,
+            })
+        return {"id": draft_id, "message": {"id": draft_id, "threadId": draft_id, "labelIds": ["DRAFT"]}}
+
+
+class FakeGmailHttp:
+    """
+    Cliente HTTP simulado (reemplaza a httplib2.Http en el recurso de googleapiclient)
+
+    Args:
+        mailbox: bandeja de correo que responde las peticiones
+    """
+
+    def __init__(self, mailbox: SyntheticMailbox):
+        self.mailbox = mailbox
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+
+        if self.mailbox.latency_seconds:
+            time.sleep(self.mailbox.latency_seconds)
+        if urlsplit(uri).path.startswith("/batch"):
+            content_type, content = self._batch(body, headers or {})
+            return httplib2.Response({"status": "200", "content-type": content_type}), content
+        status, response = self.mailbox.handle(method, uri, body)
+        return (
+            httplib2.Response({"status": str(status), "content-type": "application/json; charset=UTF-8"}),
+            json.dumps(response).encode("utf-8"),
+        )
+
+    def _batch(self, body, headers: Dict) -> Tuple[str, bytes]:
+        #Petición batch: cada parte es una petición HTTP y la respuesta tiene una parte por petición con su Content-ID
+        from email.parser import Parser
+
+        self.mailbox._count("batch")
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        content_type = next(value for name, value in headers.items() if name.lower() == "content-type")
+        request = Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}")
+        boundary = "batch_simulado"
+        parts = []
+        for part in request.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, uri, _ = request_line.split(" ", 2)
+            request_body = rest.split("\n\n", 1)[1] if "\n\n" in rest else None
+            status, response = self.mailbox.handle(method, uri, request_body or None)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(response)}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return f"multipart/mixed; boundary={boundary}", content.encode("utf-8")
@@ -0,0 +1,406 @@
+#=======================================================================================
+# Limite de uso de los proveedores de LLM (cuotas por minuto) compartido por todo el proceso.
+# En las capas gratuitas las ejecuciones fallaban con "límite de uso excedido" (HTTP 429) porque las llamadas
+# se enviaban sin control. Cada modelo creado por registro_modelos.py pasa por un limitador por proveedor y modelo:
+#   - token bucket de peticiones por minuto (RPM) y de tokens por minuto (TPM): se espera antes de enviar,
+#   - concurrencia adaptativa (AIMD): sube de a poco con cada respuesta y baja a la mitad con cada 429,
+#   - si el proveedor responde 429 se espera lo indicado en Retry-After (o un backoff exponencial) y se reintenta.
+# Asi se trabaja cerca del limite de la cuota sin que falle la ejecución.
+#=======================================================================================
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from langchain_core.language_models import BaseChatModel
+
+#Limites por defecto de cada proveedor o modelo (capa gratuita de Gemini y nivel 1 de OpenAI),
+#se pueden cambiar con la variable RATE_LIMITS (JSON con las mismas llaves)
+DEFAULT_LIMITS: Dict[str, Dict] = {
+    "google_genai": {"rpm": 15, "tpm": 1000000, "max_concurrency": 4},
+    "google_genai:gemini-2.0-flash-lite": {"rpm": 30, "tpm": 1000000, "max_concurrency": 4},
+    "google_genai:gemini-2.5-pro": {"rpm": 5, "tpm": 250000, "max_concurrency": 2},
+    "openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 16},
+}
+
+
+@dataclass
+class RateLimitConfig:
+    """
+    Limites de un proveedor o modelo
+
+    Args:
+        rpm: peticiones por minuto, 0 para no limitar
+        tpm: tokens (entrada + salida) por minuto, 0 para no limitar
+        max_concurrency: llamadas simultaneas máximas (la concurrencia adaptativa empieza aca)
+        max_retries: reintentos cuando el proveedor responde 429
+        backoff_seconds: espera del primer reintento si el proveedor no indica Retry-After (se duplica en cada reintento)
+        output_tokens_estimate: tokens de salida que se reservan por llamada (se corrige con el uso real)
+    """
+
+    rpm: int = 0
+    tpm: int = 0
+    max_concurrency: int = 8
+    max_retries: int = 5
+    backoff_seconds: float = 2.0
+    output_tokens_estimate: int = 500
+
+
+class TokenBucket:
+    """
+    Token bucket que se llena de forma continua hasta rate_per_minute
+
+    Args:
+        rate_per_minute: capacidad y velocidad de llenado por minuto
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self._available = float(rate_per_minute)
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Reserva amount y devuelve los segundos que se debe esperar para usarlo (puede quedar en deuda)"""
+        if not self.rate_per_minute:
+            return 0.0
+        now = time.monotonic()
+        self._available = min(self.rate_per_minute, self._available + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+        #Una reserva mayor a la capacidad se limita a la capacidad, si no nunca se podria enviar
+        self._available -= min(amount, self.rate_per_minute)
+        return max(0.0, -self._available * 60 / self.rate_per_minute)
+
+    def adjust(self, amount: float) -> None:
+        """Corrige una reserva con el uso real (positivo si se usó mas de lo reservado)"""
+        if self.rate_per_minute:
+            self._available -= amount
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True si el error es un 429 o límite de uso excedido del proveedor"""
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None)):
+        try:
+            if int(value) == 429:
+                return True
+        except (TypeError, ValueError):
+            continue
+    text = str(error).lower()
+    return "429" in text or "resource_exhausted" in text or "resource exhausted" in text or "rate limit" in text
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Segundos de espera que indica el proveedor (encabezado Retry-After o retry_delay de Gemini), None si no indica"""
+    value = getattr(error, "retry_after", None)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if value is None and headers is not None:
+        value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+    match = re.search(r"retry[-_ ]?(?:after|delay)\D{0,30}?(\d+(?:\.\d+)?)", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+class RateLimiter:
+    """
+    Limitador de un proveedor y modelo: token buckets de RPM y TPM, concurrencia adaptativa y espera por Retry-After
+
+    Args:
+        name: proveedor y modelo, por ejemplo "google_genai:gemini-2.0-flash"
+        config: limites del proveedor o modelo
+    """
+
+    def __init__(self, name: str, config: RateLimitConfig):
+        self.name = name
+        self.config = config
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+        self._requests = TokenBucket(config.rpm)
+        self._tokens = TokenBucket(config.tpm)
+        self._concurrency = float(config.max_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._stats = {
+            "calls": 0, "throttled": 0, "throttle_wait_seconds": 0.0, "rate_limited": 0, "retried": 0,
+            "failed": 0, "input_tokens": 0, "output_tokens": 0, "min_concurrency": config.max_concurrency,
+        }
+
+    def _try_acquire(self, estimated_tokens: int) -> Optional[float]:
+        #Devuelve None si no hay cupo de concurrencia, si no la espera por RPM, TPM y Retry-After
+        if self._in_flight >= int(self._concurrency):
+            return None
+        self._in_flight += 1
+        wait = max(
+            self._requests.reserve(1),
+            self._tokens.reserve(estimated_tokens),
+            self._blocked_until - time.monotonic(),
+        )
+        self._stats["calls"] += 1
+        if wait > 0:
+            self._stats["throttled"] += 1
+            self._stats["throttle_wait_seconds"] += wait
+        return max(0.0, wait)
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """Espera cupo de concurrencia y de cuota antes de enviar una llamada"""
+        with self._slot_released:
+            while (wait := self._try_acquire(estimated_tokens)) is None:
+                self._slot_released.wait()
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, estimated_tokens: int) -> None:
+        """Igual que acquire, sin bloquear el event loop"""
+        while True:
+            with self._lock:
+                wait = self._try_acquire(estimated_tokens)
+            if wait is not None:
+                break
+            await asyncio.sleep(0.05)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def release(self, estimated_tokens: int, usage: Optional[Dict] = None, error: Optional[Exception] = None) -> Optional[float]:
+        """
+        Libera el cupo de la llamada y ajusta la concurrencia, devuelve la espera antes de reintentar si fue un 429
+
+        Args:
+            estimated_tokens: tokens reservados al enviar la llamada
+            usage: usage_metadata de la respuesta (tokens reales)
+            error: error de la llamada, si lo hubo
+        """
+        with self._slot_released:
+            self._in_flight -= 1
+            self._slot_released.notify()
+            if usage:
+                used = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                self._tokens.adjust(used - estimated_tokens)
+                self._stats["input_tokens"] += usage.get("input_tokens", 0)
+                self._stats["output_tokens"] += usage.get("output_tokens", 0)
+            if error is None:
+                #Aumento aditivo: +1 de concurrencia por cada ventana completa de respuestas sin error
+                self._concurrency = min(self.config.max_concurrency, self._concurrency + 1 / self._concurrency)
+                return None
+            if not is_rate_limit_error(error):
+                return None
+            #Disminución multiplicativa y pausa de todas las llamadas del modelo hasta Retry-After
+            self._stats["rate_limited"] += 1
+            self._concurrency = max(1.0, self._concurrency / 2)
+            self._stats["min_concurrency"] = min(self._stats["min_concurrency"], int(self._concurrency))
+            wait = retry_after_seconds(error)
+            if wait is None:
+                wait = self.config.backoff_seconds * (1 + random.random())
+            self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+            return wait
+
+    def record_retry(self, failed: bool) -> None:
+        with self._lock:
+            self._stats["retried" if not failed else "failed"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 3)
+            stats["concurrency"] = round(self._concurrency, 2)
+            stats["in_flight"] = self._in_flight
+        return {"model": self.name, "rpm": self.config.rpm, "tpm": self.config.tpm, **stats}
+
+
+def _estimate_tokens(messages, config: RateLimitConfig) -> int:
+    from langchain_core.messages.utils import count_tokens_approximately
+    return count_tokens_approximately(messages) + config.output_tokens_estimate
+
+
+def _usage(result) -> Dict:
+    usage = {}
+    for generation in getattr(result, "generations", []):
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+    return usage
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Chat model que envuelve al modelo del proveedor y pasa cada llamada por el limitador de su proveedor y modelo.
+    El modelo envuelto no se modifica (sigue siendo el mismo objeto, con su cliente)
+
+    Args:
+        llm: chat model creado con init_chat_model
+        rate_limit_key: proveedor y modelo, por ejemplo "google_genai:gemini-2.0-flash"
+    """
+
+    llm: Any
+    rate_limit_key: str
+
+    @property
+    def _llm_type(self) -> str:
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict:
+        return self.llm._identifying_params
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        #Los metadatos de trazas y metricas (ls_provider, ls_model_name) son los del modelo envuelto
+        return self.llm._get_ls_params(stop=stop, **kwargs)
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs) -> bool:
+        #Se usa streaming solo si el modelo envuelto lo implementa
+        return self.llm._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        #El modelo envuelto da el formato de las herramientas, las llamadas pasan por este modelo
+        return self.bind(**self.llm.bind_tools(tools, **kwargs).kwargs)
+
+    def _should_retry(self, limiter: RateLimiter, estimated: int, error: Exception, attempt: int, started: bool = False) -> bool:
+        #Libera el cupo y decide si se reintenta: solo los 429, y en streaming solo si aun no llegó ninguna parte
+        wait = limiter.release(estimated, error=error)
+        if wait is None:
+            return False
+        retry = not started and attempt < limiter.config.max_retries
+        limiter.record_retry(failed=not retry)
+        return retry
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated = _estimate_tokens(messages, limiter.config)
+        for attempt in range(limiter.config.max_retries + 1):
+            limiter.acquire(estimated)
+            result, released = None, False
+            try:
+                result = self.llm._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                released = True
+                if not self._should_retry(limiter, estimated, e, attempt):
+                    raise
+                continue
+            finally:
+                #Tambien se libera el cupo si la llamada se cancela (CancelledError, KeyboardInterrupt)
+                if not released:
+                    limiter.release(estimated, usage=_usage(result))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated = _estimate_tokens(messages, limiter.config)
+        for attempt in range(limiter.config.max_retries + 1):
+            await limiter.aacquire(estimated)
+            result, released = None, False
+            try:
+                result = await self.llm._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                released = True
+                if not self._should_retry(limiter, estimated, e, attempt):
+                    raise
+                continue
+            finally:
+                #Tambien se libera el cupo si la llamada se cancela (CancelledError, KeyboardInterrupt)
+                if not released:
+                    limiter.release(estimated, usage=_usage(result))
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated = _estimate_tokens(messages, limiter.config)
+        for attempt in range(limiter.config.max_retries + 1):
+            limiter.acquire(estimated)
+            usage, started, released = {}, False, False
+            try:
+                for chunk in self.llm._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    usage = getattr(chunk.message, "usage_metadata", None) or usage
+                    yield chunk
+            except Exception as e:
+                released = True
+                if not self._should_retry(limiter, estimated, e, attempt, started):
+                    raise
+                continue
+            finally:
+                #Tambien se libera el cupo si el consumidor cierra el generador antes del final (GeneratorExit) o se cancela
+                if not released:
+                    limiter.release(estimated, usage=usage)
+            return
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        #Sin _astream propio el modelo envuelto usa su _stream en un thread
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated = _estimate_tokens(messages, limiter.config)
+        for attempt in range(limiter.config.max_retries + 1):
+            await limiter.aacquire(estimated)
+            usage, started, released = {}, False, False
+            try:
+                async for chunk in self.llm._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    usage = getattr(chunk.message, "usage_metadata", None) or usage
+                    yield chunk
+            except Exception as e:
+                released = True
+                if not self._should_retry(limiter, estimated, e, attempt, started):
+                    raise
+                continue
+            finally:
+                #Tambien se libera el cupo si el consumidor cierra el generador antes del final (GeneratorExit) o se cancela
+                if not released:
+                    limiter.release(estimated, usage=usage)
+            return
+
+_lock = threading.Lock()
+_limiters: Dict[str, RateLimiter] = {}
+_overrides: Optional[Dict[str, Dict]] = None
+
+
+def is_rate_limit_enabled() -> bool:
+    """El limitador se puede deshabilitar con RATE_LIMIT_ENABLED=0"""
+    return os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+
+
+def get_rate_limit_config(key: str) -> RateLimitConfig:
+    """
+    Limites de un modelo: los del modelo, si no los del proveedor (DEFAULT_LIMITS y la variable RATE_LIMITS)
+
+    Args:
+        key: proveedor y modelo, por ejemplo "google_genai:gemini-2.0-flash"
+    """
+    global _overrides
+    if _overrides is None:
+        _overrides = json.loads(os.getenv("RATE_LIMITS", "") or "{}")
+    provider = key.split(":", 1)[0]
+    values = {}
+    for name in (provider, key):
+        values.update(DEFAULT_LIMITS.get(name, {}))
+        values.update(_overrides.get(name, {}))
+    return RateLimitConfig(**values)
+
+
+def get_rate_limiter(key: str) -> RateLimiter:
+    """Devuelve el limitador compartido del proveedor y modelo"""
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(key, get_rate_limit_config(key))
+        return limiter
+
+
+def rate_limited(llm, key: str):
+    """
+    Envuelve el chat model para que cada llamada pase por el limitador de key, tambien con bind_tools y with_structured_output
+
+    Args:
+        llm: chat model creado con init_chat_model (no se modifica)
+        key: proveedor y modelo, por ejemplo "google_genai:gemini-2.0-flash"
+    """
+    return RateLimitedChatModel(llm=llm, rate_limit_key=key)
+
+
+def get_rate_limit_stats() -> Dict:
+    """Devuelve por modelo las llamadas, las esperas por cuota (throttled), los 429 y los reintentos"""
+    with _lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
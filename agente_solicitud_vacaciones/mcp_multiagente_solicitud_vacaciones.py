@@ -1,13 +1,34 @@
+import os
 from datetime import datetime
 from typing import Dict
-from agente_busca_solicitud import build_vacation_request_agent, make_system_prompt
+from agente_busca_solicitud import build_vacation_request_agent, make_system_prompt, search_instruction
 from langchain_core.tools import tool
 
 #Para poder manejar el cliente MCP, de funcion debe ser asincrona.
-#Esta función va a usar un agente IA para crear la tabla "solicitud_vacaciones" (si no existe)
+#Esta función registra la solicitud llamando directamente a la herramienta SQL del servidor MCP,
+#con una sesión MCP que se abre una sola vez y sin usar el LLM (ver registro_mcp.py)
+async def register_vacation_request(message_id: str, 
+                              nombre_solicitante: str, 
+                              fecha_solicitud:datetime
+                              )->Dict:
+    """Registra la solicitud de vacaciones y devuelve los datos principales de la solicitud, como su id
+
+    Args:
+        message_id (str): ID del correo con la solicitud de vacaciones
+        nombre_solicitante (str): Nombre del solicitante
+        fecha_solicitud (datetime): Fecha de envío de correo de solicitud
+
+    Returns:
+        Dict: id de solicitud y fecha de registro de solicitud
+    """
+    from registro_mcp import get_registration_backend
+    return await get_registration_backend().register(message_id, nombre_solicitante, fecha_solicitud)
+
+#Variante anterior (MCP_REGISTRATION_MODE=agent): esta función va a usar un agente IA para crear la tabla "solicitud_vacaciones" (si no existe)
 #y registrar la solicitud en dicha tabla, para esto se usará un servidor MCP para Postgress
 # https://github.com/crystaldba/postgres-mcp , se ejecutará con Docker (ver detalles en el repo)
-async def register_vacation_request(message_id: str, 
+#En cada llamada crea un cliente MCP, obtiene las herramientas y el LLM redacta el SQL
+async def register_vacation_request_with_agent(message_id: str, 
                               nombre_solicitante: str, 
                               fecha_solicitud:datetime
                               )->Dict:
@@ -22,7 +43,7 @@ async def register_vacation_request(message_id: str,
         Dict: id de solicitud y fecha de registro de solicitud
     """
     from langchain_mcp_adapters.client import MultiServerMCPClient
-    from langchain.chat_models import init_chat_model
+    from registro_modelos import get_chat_model
     from langgraph.prebuilt import create_react_agent
 
     #Se instancia el cliente del servidor MCP de Postgress que estoy ejecutando con Docker
@@ -42,8 +63,8 @@ async def register_vacation_request(message_id: str,
 
     #Se instancia las herramientas configuradas en el cliente MCP (pueden ser varias) 
     tools = await client.get_tools()
-    #Se crea el chat model a usar con buena capacidad agentica o Tool Calling
-    llm = init_chat_model("google_genai:gemini-2.5-flash", temperature=0)
+    #Se obtiene el chat model compartido (registro_modelos.py) con buena capacidad agentica o Tool Calling
+    llm = get_chat_model("google_genai:gemini-2.5-flash", temperature=0)
     #Se definen el aegente con su respecitvo LLM y herramientas (no necesita que se defina un prompt)
     agent = create_react_agent(llm, tools)
     #Se ejecuta el agente con las instrucciones necesarias para crear la tabla y el registro
@@ -66,23 +87,33 @@ async def register_vacation_request(message_id: str,
     #Se devuelve el contenido del ultimo mensaje que debe ser un JSON (tambien se puede definir una estructura de salida)
     return response["messages"][-1].content
     
-def build_vacation_process_agent():
-    from langchain_google_community import GmailToolkit
-    from langchain_google_community.gmail.create_draft import GmailCreateDraft
-    from langchain.chat_models import init_chat_model
+#Si se envia thread_id, el agente marca cada correo terminado (puntos_control.py) para no volver a procesarlo al continuar
+def build_vacation_process_agent(thread_id=None):
+    from recursos_gmail import get_gmail_toolkit
+    from registro_modelos import get_chat_model
     from langgraph.prebuilt import create_react_agent
+    from contexto_mensajes import HANDOFF_INSTRUCTIONS, make_pre_model_hook
     from langchain_core.tools import StructuredTool
 
-    llm = init_chat_model("google_genai:gemini-2.5-flash-lite", temperature=0)
+    llm = get_chat_model("google_genai:gemini-2.5-flash-lite", temperature=0)
 
-    toolkit = GmailToolkit()
+    toolkit = get_gmail_toolkit()
+    #Por defecto se registra sin LLM con la sesión MCP persistente, con MCP_REGISTRATION_MODE=agent se usa el agente IA
+    register_function = register_vacation_request
+    if os.getenv("MCP_REGISTRATION_MODE", "direct") == "agent":
+        register_function = register_vacation_request_with_agent
     #Se crea la lista de herramientas necesarias para cada agente
-    gmail_draft = GmailCreateDraft(api_resource=toolkit.api_resource)
+    from multiagente_solicitud_vacaciones import build_draft_tool, draft_instruction
     vacation_process_tools = [
-        gmail_draft,
-        StructuredTool.from_function(coroutine=register_vacation_request), #Esta Tool es asincrona y se debe usar StructuredTool
+        build_draft_tool(toolkit.api_resource),
+        #Esta Tool es asincrona y se debe usar StructuredTool
+        StructuredTool.from_function(coroutine=register_function, name="register_vacation_request"),
     ]
 
+    if thread_id is not None:
+        from puntos_control import make_mark_email_completed_tool
+        vacation_process_tools.append(make_mark_email_completed_tool(thread_id))
+
     #Se definen el aegente con su respecitvo LLM, Prompt y herramientas
     #Notese que en el Prompt tiene en su contexto todo el procedimiento pero se le indica un rol limitado
     vacation_process_agent = create_react_agent(
@@ -92,53 +123,135 @@ def build_vacation_process_agent():
             "Tu rol es solo procesar las solicitudes de vacaciones validas o invalidas,"
             "trabajas con otro agente que te entregará las solicitudes que tu debes procesar."
             "Asegurate de realizar la tareas indicadas el el procesamiento de solicitudes validas o invalidas."
+            "Cuando termines de procesar cada correo, marcalo como procesado si tienes la herramienta para hacerlo."
+            + draft_instruction()
+            + HANDOFF_INSTRUCTIONS
         ),
+        #Antes de cada llamada al LLM se compactan los mensajes (contexto_mensajes.py)
+        pre_model_hook=make_pre_model_hook(),
         name="vacation_process_agent"
     )
     return vacation_process_agent
 
-#Esta es la lógica principal del ejemplo y debe ser asincrona
-async def main(args=None):
-    from dotenv import load_dotenv
-    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
-    load_dotenv()
-
-    from langchain_core.messages import HumanMessage
+#Supervisor de los dos agentes, si se envia thread_id el agente de procesamiento marca cada correo terminado
+#(los agentes usan el checkpointer del supervisor)
+def build_vacation_supervisor(sync_state=None, thread_id=None, checkpointer=None):
     from langgraph_supervisor import create_supervisor
-    from langchain.chat_models import init_chat_model
+    from registro_modelos import get_chat_model
+    from contexto_mensajes import make_pre_model_hook
 
     #Creamos instancia de los agentes IA que van a trabajar con el supervisor
-    vacation_request_agent = build_vacation_request_agent()
-    vacation_process_agent = build_vacation_process_agent()
+    vacation_request_agent = build_vacation_request_agent(sync_state)
+    vacation_process_agent = build_vacation_process_agent(thread_id)
     
-    #Se crea el chat model a usar con buena capacidad agentica o Tool Calling
-    llm = init_chat_model("google_genai:gemini-2.5-pro", temperature=0)
+    #Se obtiene el chat model compartido (registro_modelos.py) con buena capacidad agentica o Tool Calling
+    llm = get_chat_model("google_genai:gemini-2.5-pro", temperature=0)
 
     #Se define el supervisor de los agentes, con su LLM, Prompt y lista de agentes
-    supervisor = create_supervisor(
+    return create_supervisor(
         agents=[vacation_request_agent, vacation_process_agent],
         model=llm,
         prompt=make_system_prompt(
             "Tu rol es coordinar con un agente encargado de identificar las solicitudes de vacaciones y "
             "un agente encargado de procesar las solicitudes de vacaciones. Asignales trabajo a ambos agentes sin pedir confirmaciones."
+            "Al asignar trabajo entrega solo los registros JSON de los correos, no el contenido de los correos."
         ),
+        #Los agentes solo devuelven su ultimo mensaje (el registro JSON) al supervisor, no todo su historial
+        output_mode="last_message",
+        pre_model_hook=make_pre_model_hook(),
         supervisor_name="vacation_supervisor"
-    ).compile()
-
-    #Se envia instrucciones al supervisor, que asignara el trabajo a cada agente hasta que este completada la tarea
-    #se ejecuta de forma asincrona con la funcion astream
-    response = supervisor.astream(
-        {"messages": [
-            HumanMessage("Procesar las posibles solicitudes de vacaciones de los ultimos 7 días.")
-        ]},
-        {"recursion_limit": 100},
-        stream_mode="values",
-    )
+    ).compile(checkpointer=checkpointer)
+
+#Esta es la lógica principal del ejemplo y debe ser asincrona
+async def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Multiagente que procesa las solicitudes de vacaciones")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo los correos nuevos desde la ultima ejecución (historyId de GMail)")
+    parser.add_argument("--resume", metavar="THREAD_ID", default=None,
+                        help="Continuar una ejecución interrumpida desde su ultimo checkpoint (SQLite)")
+    options = parser.parse_args(args)
+
+    from dotenv import load_dotenv
+    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
+    load_dotenv()
+
+    #Metricas de cada modelo, herramienta y nodo de los grafos (metricas.py), el resumen se muestra al terminar
+    import json
+    from metricas import enable_metrics, get_metrics_summary
+    enable_metrics()
+
+    from langchain_core.messages import HumanMessage
+
+    #En modo incremental se usa el estado guardado de la ultima ejecución
+    sync_state = None
+    if options.incremental:
+        from sincronizacion_bandeja import get_inbox_sync_state
+        sync_state = get_inbox_sync_state()
+
+    #La sesión MCP se abre al iniciar (y se crea la tabla si no existe), asi cada registro es solo una llamada SQL
+    registration_backend = None
+    if os.getenv("MCP_REGISTRATION_MODE", "direct") != "agent":
+        from registro_mcp import get_registration_backend
+        registration_backend = get_registration_backend()
+        await registration_backend.start()
+
+    #Cada ejecución tiene un thread_id, con el que se guardan sus checkpoints y se puede continuar si se interrumpe
+    from puntos_control import aresume_input, new_thread_id, open_async_checkpointer, run_config
+    from contexto_mensajes import TokenBudgetCallback
+    thread_id = options.resume or new_thread_id()
+    #El callback cuenta los tokens de cada llamada al LLM (supervisor y agentes) y detiene la ejecución si se agota RUN_TOKEN_BUDGET
+    token_budget = TokenBudgetCallback.from_env()
+    config = {**run_config(thread_id), "callbacks": [token_budget]}
+    if sync_state is not None:
+        #Registra los correos cuyas herramientas fallaron, para no marcarlos como procesados al confirmar
+        from sincronizacion_bandeja import InboxSyncCallback
+        sync_callback = InboxSyncCallback(sync_state)
+        config["callbacks"].append(sync_callback)
+    print(f"thread_id de la ejecución: {thread_id} (para continuarla si se interrumpe: --resume {thread_id})")
+
+    async with open_async_checkpointer() as checkpointer:
+        #El checkpointer guarda el estado en SQLite despues de cada paso
+        supervisor = build_vacation_supervisor(sync_state, thread_id, checkpointer)
+
+        #Al continuar, si quedaron pasos pendientes se retoma desde el ultimo checkpoint (entrada None),
+        #si la ejecución habia terminado se indica que siga con los correos pendientes
+        if options.resume:
+            supervisor_input = await aresume_input(supervisor, config, "Procesar", thread_id)
+        else:
+            supervisor_input = {"messages": [HumanMessage(search_instruction("Procesar", options.incremental) + ".")]}
+
+        #Se envia instrucciones al supervisor, que asignara el trabajo a cada agente hasta que este completada la tarea
+        #se ejecuta de forma asincrona con la funcion astream
+        response = supervisor.astream(
+            supervisor_input,
+            config,
+            stream_mode="values",
+        )
+
+        #Se va mostrando en la consola cada interacción o mensaje del supervisor
+        #Para ver el detalle de lo que hace cada agente se debe revisar la traza en LangSmith (incluyendo las llamadas a las herrameintas)
+        try:
+            async for mensaje in response:
+                mensaje["messages"][-1].pretty_print()
+        except Exception:
+            print(f"Ejecución interrumpida, para continuarla: --resume {thread_id}")
+            raise
+        finally:
+            print("Tokens de la ejecución:", token_budget.report())
+            print("Metricas de la ejecución:", json.dumps(get_metrics_summary(), ensure_ascii=False, indent=2))
+
+    #Se muestra la latencia de cada registro y se cierra la sesión MCP
+    if registration_backend is not None:
+        print(registration_backend.stats())
+        await registration_backend.close()
 
-    #Se va mostrando en la consola cada interacción o mensaje del supervisor
-    #Para ver el detalle de lo que hace cada agente se debe revisar la traza en LangSmith (incluyendo las llamadas a las herrameintas)
-    async for mensaje in response:
-        mensaje["messages"][-1].pretty_print()
+    #Si la ejecución termino bien, se guarda el historyId y los correos procesados,
+    #los correos que fallaron o que no se marcaron como terminados se vuelven a procesar en la siguiente ejecución
+    if sync_state is not None:
+        from puntos_control import get_completion_log
+        sync_callback.mark_unfinished(get_completion_log().completed_ids(thread_id))
+        print(sync_state.commit())
 
 #Solo se llamará al método principal si se ejecuta este modulo directamente
 if __name__ == "__main__":
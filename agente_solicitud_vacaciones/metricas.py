@@ -0,0 +1,327 @@
+#=======================================================================================
+# Metricas de cada modelo, herramienta y nodo de los grafos, para encontrar el cuello de botella por correo.
+# Antes solo se veian los mensajes en la consola (pretty_print) y las trazas de LangSmith, que no funcionan offline
+# ni entregan totales. Ahora un callback de LangChain se agrega a todas las ejecuciones del proceso (hook de configuración,
+# sin pasarlo en cada config): supervisor, agentes, validate_pdf, herramientas de GMail y registro por MCP.
+# Por cada modelo, herramienta, nodo y endpoint del API se registran las llamadas, los errores, un histograma de la latencia
+# y los tokens de entrada y salida de los modelos. Se consultan en formato Prometheus en GET /metrics del API
+# y como resumen JSON al terminar las ejecuciones por consola.
+#=======================================================================================
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+#Limites (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+#Tipos de ejecución que se miden
+KIND_MODEL = "model"
+KIND_TOOL = "tool"
+KIND_NODE = "node"
+KIND_ENDPOINT = "endpoint"
+
+_lock = threading.Lock()
+_metrics: Dict[Tuple[str, str], Dict] = {}
+#Ejecuciones en curso por run_id (tipo, nombre e inicio), compartidas por todas las instancias del callback
+_runs: Dict = {}
+_hook: Dict[str, bool] = {}
+_metrics_var: ContextVar[Optional[BaseCallbackHandler]] = ContextVar("vacation_metrics_callback", default=None)
+
+
+def _new_metric() -> Dict:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "seconds": 0.0,
+        "max_seconds": 0.0,
+        "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "error_types": {},
+    }
+
+
+def _record(kind: str, name: str, seconds: float, error: Optional[BaseException] = None, usage: Optional[Dict] = None) -> None:
+    import bisect
+
+    with _lock:
+        metric = _metrics.get((kind, name))
+        if metric is None:
+            metric = _metrics[(kind, name)] = _new_metric()
+        metric["calls"] += 1
+        metric["seconds"] += seconds
+        metric["max_seconds"] = max(metric["max_seconds"], seconds)
+        metric["buckets"][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        if error is not None:
+            metric["errors"] += 1
+            error_type = type(error).__name__
+            metric["error_types"][error_type] = metric["error_types"].get(error_type, 0) + 1
+        if usage:
+            metric["input_tokens"] += usage.get("input_tokens", 0)
+            metric["output_tokens"] += usage.get("output_tokens", 0)
+
+
+def _is_control_flow(error: BaseException) -> bool:
+    """Las interrupciones y los traspasos entre agentes (Command al grafo padre) se lanzan como excepciones, no son errores"""
+    try:
+        from langgraph.errors import GraphBubbleUp
+    except ImportError:
+        return False
+    return isinstance(error, GraphBubbleUp)
+
+
+def _model_name(metadata: Dict, serialized: Optional[Dict]) -> str:
+    #Mismo formato que registro_modelos.py: "proveedor:modelo"
+    provider = metadata.get("ls_provider")
+    model = metadata.get("ls_model_name")
+    if model:
+        return model if ":" in model or not provider else f"{provider}:{model}"
+    return (serialized or {}).get("name") or "desconocido"
+
+
+def _node_name(metadata: Dict) -> str:
+    #El namespace del checkpoint tiene un segmento "nodo:task_id" por cada nivel (por ejemplo el agente dentro del supervisor)
+    namespace = metadata.get("langgraph_checkpoint_ns") or metadata.get("checkpoint_ns") or ""
+    names = [segment.split(":", 1)[0] for segment in namespace.split("|") if segment]
+    return "/".join(names) or metadata["langgraph_node"]
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """
+    Callback que registra las llamadas, errores, latencia y tokens de cada modelo, herramienta y nodo de los grafos.
+    No guarda estado propio (todo queda en el registro del modulo), el hook de configuración crea una instancia
+    por cada ejecución raiz y sus ejecuciones hijas la heredan
+    """
+
+    #Solo actualiza contadores en memoria, en las ejecuciones async se llama directamente (sin pasar a un hilo)
+    run_inline = True
+
+    def _start(self, run_id, kind: str, name: str) -> None:
+        with _lock:
+            _runs[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, error: Optional[BaseException] = None, usage: Optional[Dict] = None) -> None:
+        with _lock:
+            run = _runs.pop(run_id, None)
+        if run is None:
+            return
+        kind, name, start = run
+        if error is not None and _is_control_flow(error):
+            error = None
+        _record(kind, name, time.perf_counter() - start, error, usage)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        self._start(run_id, KIND_MODEL, _model_name(metadata or {}, serialized))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        self._start(run_id, KIND_MODEL, _model_name(metadata or {}, serialized))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        self._end(run_id, usage=usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "desconocida"
+        self._start(run_id, KIND_TOOL, name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        #Solo se miden los nodos de los grafos, no los runnables internos de cada nodo
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if node is None or kwargs.get("name") != node:
+            return
+        name = _node_name(metadata)
+        with _lock:
+            #Un subgrafo usado como nodo genera dos ejecuciones con el mismo nombre (el nodo y el grafo), se mide una
+            parent = _runs.get(parent_run_id)
+            if parent is not None and parent[:2] == (KIND_NODE, name):
+                return
+            _runs[run_id] = (KIND_NODE, name, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+
+def is_metrics_enabled() -> bool:
+    """Las metricas se pueden deshabilitar con METRICS_ENABLED=0"""
+    return os.getenv("METRICS_ENABLED", "1") not in ("", "0", "false", "False")
+
+
+def enable_metrics() -> bool:
+    """
+    Agrega el callback de metricas a todas las ejecuciones de LangChain y LangGraph del proceso
+    (tambien en los hilos y procesos que crea), salvo que METRICS_ENABLED=0. Devuelve si quedaron habilitadas
+    """
+    from langchain_core.tracers.context import register_configure_hook
+
+    if not is_metrics_enabled():
+        return False
+    #El hook crea el callback en cada ejecución raiz cuando la variable de ambiente esta activa
+    os.environ["METRICS_ENABLED"] = "1"
+    with _lock:
+        if not _hook:
+            register_configure_hook(_metrics_var, True, MetricsCallback, "METRICS_ENABLED")
+            _hook["registered"] = True
+    return True
+
+
+def record_call(kind: str, name: str, seconds: float, error: Optional[BaseException] = None) -> None:
+    """
+    Registra una llamada que no es una ejecución de LangChain (por ejemplo la herramienta SQL del servidor MCP),
+    solo si las metricas estan habilitadas
+
+    Args:
+        kind: tipo de ejecución (KIND_MODEL, KIND_TOOL, KIND_NODE o KIND_ENDPOINT)
+        name: nombre del modelo, herramienta, nodo o endpoint
+        seconds: duración de la llamada
+        error: excepción si la llamada falló
+    """
+    if _hook:
+        _record(kind, name, seconds, error)
+
+
+@contextmanager
+def measure(kind: str, name: str):
+    """
+    Mide el bloque con record_call (tambien con await dentro del bloque)
+
+    Args:
+        kind: tipo de ejecución (KIND_TOOL, KIND_ENDPOINT, etc)
+        name: nombre de la herramienta o endpoint
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_call(kind, name, time.perf_counter() - start, e)
+        raise
+    record_call(kind, name, time.perf_counter() - start)
+
+
+def reset_metrics() -> None:
+    """Borra las metricas registradas"""
+    with _lock:
+        _metrics.clear()
+
+
+def _quantile(buckets: List[int], count: int, q: float, max_seconds: float) -> float:
+    """Estima el cuantil q con el histograma (interpolación lineal dentro del bucket, como histogram_quantile de Prometheus)"""
+    rank = q * count
+    cumulative = 0
+    lower = 0.0
+    for index, bucket_count in enumerate(buckets):
+        upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else max_seconds
+        if bucket_count and cumulative + bucket_count >= rank:
+            return min(max_seconds, lower + (upper - lower) * (rank - cumulative) / bucket_count)
+        cumulative += bucket_count
+        lower = upper
+    return max_seconds
+
+
+def get_metrics_summary(emails: Optional[int] = None) -> Dict:
+    """
+    Devuelve por tipo (model, tool, node, endpoint) y nombre las llamadas, errores, latencia (promedio, p50 y p95 estimados
+    con el histograma, maximo), segundos totales y tokens, ordenados por segundos totales (el cuello de botella primero)
+
+    Args:
+        emails: cantidad de correos procesados, si se indica se agregan las llamadas y segundos por correo
+    """
+    with _lock:
+        metrics = {key: {**metric, "buckets": list(metric["buckets"]), "error_types": dict(metric["error_types"])}
+                   for key, metric in _metrics.items()}
+
+    summary = {KIND_MODEL: [], KIND_TOOL: [], KIND_NODE: [], KIND_ENDPOINT: []}
+    for (kind, name), metric in sorted(metrics.items(), key=lambda item: -item[1]["seconds"]):
+        calls = metric["calls"]
+        entry = {
+            "name": name,
+            "calls": calls,
+            "errors": metric["errors"],
+            "seconds": round(metric["seconds"], 3),
+            "latency_seconds": {
+                "avg": round(metric["seconds"] / calls, 3),
+                "p50": round(_quantile(metric["buckets"], calls, 0.5, metric["max_seconds"]), 3),
+                "p95": round(_quantile(metric["buckets"], calls, 0.95, metric["max_seconds"]), 3),
+                "max": round(metric["max_seconds"], 3),
+            },
+        }
+        if metric["error_types"]:
+            entry["error_types"] = metric["error_types"]
+        if kind == KIND_MODEL:
+            entry["input_tokens"] = metric["input_tokens"]
+            entry["output_tokens"] = metric["output_tokens"]
+        if emails:
+            entry["calls_per_email"] = round(calls / emails, 3)
+            entry["seconds_per_email"] = round(metric["seconds"] / emails, 4)
+        summary[kind].append(entry)
+    return summary
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(prefix: str = "vacaciones") -> str:
+    """
+    Devuelve las metricas en el formato de texto de Prometheus (contadores de llamadas, errores y tokens
+    e histograma de latencia), con las etiquetas kind (model, tool, node, endpoint) y name
+
+    Args:
+        prefix: prefijo del nombre de las metricas
+    """
+    with _lock:
+        metrics = sorted((key, {**metric, "buckets": list(metric["buckets"])}) for key, metric in _metrics.items())
+
+    lines = [
+        f"# HELP {prefix}_calls_total Llamadas a cada modelo, herramienta y nodo",
+        f"# TYPE {prefix}_calls_total counter",
+    ]
+    lines += [f'{prefix}_calls_total{{kind="{kind}",name="{_label(name)}"}} {metric["calls"]}' for (kind, name), metric in metrics]
+    lines += [
+        f"# HELP {prefix}_errors_total Llamadas que terminaron con error",
+        f"# TYPE {prefix}_errors_total counter",
+    ]
+    lines += [f'{prefix}_errors_total{{kind="{kind}",name="{_label(name)}"}} {metric["errors"]}' for (kind, name), metric in metrics]
+    lines += [
+        f"# HELP {prefix}_tokens_total Tokens de entrada y salida de cada modelo",
+        f"# TYPE {prefix}_tokens_total counter",
+    ]
+    for (kind, name), metric in metrics:
+        if kind == KIND_MODEL:
+            for token_type in ("input", "output"):
+                lines.append(
+                    f'{prefix}_tokens_total{{kind="{kind}",name="{_label(name)}",type="{token_type}"}} {metric[token_type + "_tokens"]}'
+                )
+    lines += [
+        f"# HELP {prefix}_latency_seconds Latencia de cada modelo, herramienta y nodo",
+        f"# TYPE {prefix}_latency_seconds histogram",
+    ]
+    for (kind, name), metric in metrics:
+        labels = f'kind="{kind}",name="{_label(name)}"'
+        cumulative = 0
+        for upper, bucket_count in zip(list(LATENCY_BUCKETS) + ["+Inf"], metric["buckets"]):
+            cumulative += bucket_count
+            lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+        lines.append(f"{prefix}_latency_seconds_sum{{{labels}}} {round(metric['seconds'], 6)}")
+        lines.append(f"{prefix}_latency_seconds_count{{{labels}}} {metric['calls']}")
+    return "\n".join(lines) + "\n"
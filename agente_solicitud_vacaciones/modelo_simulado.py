@@ -0,0 +1,490 @@
+#=======================================================================================
+# Chat model simulado para el benchmark offline (benchmark_offline.py), sin llamar a Gemini ni a OpenAI.
+# Cada llamada espera la latencia configurada e informa los tokens configurados (o los aproximados de los mensajes),
+# y responde como lo haría el LLM en cada rol según las herramientas que recibe:
+#   - respuestas estructuradas (with_structured_output): lee el texto del PDF enviado y devuelve sus datos,
+#   - agente de solicitudes: busca, hace el triaje, lee los correos candidatos, los valida y entrega la lista JSON,
+#   - agente de procesamiento: registra las solicitudes validas, crea los borradores y marca los correos terminados,
+#   - supervisor: asigna el trabajo a cada agente en orden y termina,
+#   - texto libre: validación de validate_pdf o el mismo texto recibido (pulir borradores).
+# Los datos que el LLM necesita en el siguiente paso se guardan en el contenido de su mensaje (los resultados de las
+# herramientas antiguos se recortan antes de cada llamada, contexto_mensajes.py).
+# Con rate_limit_rate una fracción de las llamadas responde 429 (con status_code y retry_after, como los proveedores),
+# para probar el limitador de uso (limite_uso.py): esperas por Retry-After, reintentos y concurrencia adaptativa.
+# Se usa con registro_modelos.set_chat_model_factory(make_model_factory(...)).
+#=======================================================================================
+import asyncio
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_PDF_TEXT = re.compile(rb"\(((?:[^()\\]|\\.)*)\)\s*Tj")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+_SEARCH_QUERY = "vacaciones newer_than:7d"
+
+
+class SimulatedRateLimitError(Exception):
+    """
+    Error 429 (límite de uso excedido) del proveedor simulado, con los mismos atributos que leen
+    is_rate_limit_error y retry_after_seconds de limite_uso.py
+
+    Args:
+        model: modelo que respondió 429
+        retry_after: segundos de espera indicados (Retry-After), None si no se indican
+    """
+
+    status_code = 429
+
+    def __init__(self, model: str, retry_after: Optional[float] = None):
+        super().__init__(f"429 Resource exhausted: límite de uso excedido del modelo simulado {model}")
+        self.retry_after = retry_after
+
+
+def _call(name: str, args: Dict) -> Dict:
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:16]}", "type": "tool_call"}
+
+
+def _parse(content):
+    #Resultado de una herramienta: JSON o la representación de Python de un dict o lista
+    import ast
+
+    if not isinstance(content, str):
+        return content
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            return loader(content)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            pass
+    return None
+
+
+def _field(content, key: str):
+    #Valor de un campo de un resultado recortado (sin el JSON completo)
+    data = _parse(content)
+    if isinstance(data, dict):
+        return data.get(key)
+    match = re.search(rf"""['"]{key}['"]:\s*(True|False|true|false|None|null|'[^']*'|"[^"]*"|-?[\d.]+)""", str(content))
+    if match is None:
+        return None
+    value = match.group(1)
+    if value in ("True", "true", "False", "false"):
+        return value in ("True", "true")
+    if value in ("None", "null"):
+        return None
+    return value[1:-1] if value[0] in "'\"" else value
+
+
+def _pdf_text(messages) -> Optional[str]:
+    #Texto de los PDFs enviados en los mensajes (bloques "file" en base64)
+    for message in messages:
+        if not isinstance(message.content, list):
+            continue
+        for block in message.content:
+            if isinstance(block, dict) and block.get("type") == "file" and block.get("data"):
+                data = base64.b64decode(block["data"])
+                lines = [re.sub(rb"\\(.)", rb"\1", line).decode("cp1252") for line in _PDF_TEXT.findall(data)]
+                return "\n".join(lines)
+    return None
+
+
+def read_pdf_validation(text: str) -> Dict:
+    """
+    Datos de la solicitud de vacaciones que el LLM obtendría del texto del PDF (campos de VacationRequestValidation)
+
+    Args:
+        text: texto del PDF
+    """
+    name = re.search(r"Nombre del trabajador: (.+)", text)
+    dates = _DATE.findall(text)
+    return {
+        "es_solicitud_vacaciones": "solicitud de vacaciones" in text.lower(),
+        "nombre_solicitante": name.group(1).strip() if name else None,
+        "tiene_firma": "firmado digitalmente" in text.lower(),
+        "fecha_inicio": dates[0] if dates else None,
+        "fecha_fin": dates[1] if len(dates) > 1 else None,
+        "confianza": 0.95,
+    }
+
+
+def _own_turn(messages, names):
+    #Ultimo mensaje del LLM con llamadas a las herramientas del rol y los resultados de esas llamadas
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, AIMessage) and message.tool_calls and all(c["name"] in names for c in message.tool_calls):
+            results = {m.tool_call_id: m.content for m in messages[i + 1:] if isinstance(m, ToolMessage)}
+            return message, results
+    return None, {}
+
+
+def _record(message: Dict) -> Dict:
+    #Registro de la entrega entre agentes (HANDOFF_INSTRUCTIONS de contexto_mensajes.py)
+    return {
+        "message_id": message["id"], "remitente": message.get("sender"), "fecha_recepcion": message.get("date"),
+        "es_valida": None, "nombre_solicitante": None, "motivo_rechazo": None, "solicitud_vacacion_id": None,
+    }
+
+
+def _final(records: List[Dict]) -> AIMessage:
+    return AIMessage(content=json.dumps(records, ensure_ascii=False))
+
+
+def _structured_answer(messages, function: Dict) -> AIMessage:
+    properties = function.get("parameters", {}).get("properties", {})
+    if "es_solicitud_vacaciones" in properties:
+        args = read_pdf_validation(_pdf_text(messages) or "")
+    elif "corresponde" in properties:
+        args = {"corresponde": True, "confianza": 0.9}
+    else:
+        args = {}
+    return AIMessage(content="", tool_calls=[_call(function["name"], args)])
+
+
+def _request_agent_step(messages, tools: List[Dict], search_max_results: int, attachments_path: str) -> AIMessage:
+    from reglas_solicitud import REASON_NO_PDF
+
+    names = [tool["function"]["name"] for tool in tools]
+    turn, results = _own_turn(messages, set(names))
+    called = {call["name"] for call in turn.tool_calls} if turn is not None else set()
+    search = next(name for name in names if name.startswith("search_"))
+
+    if turn is None:
+        #La busqueda incremental solo recibe max_results
+        parameters = next(t["function"] for t in tools if t["function"]["name"] == search).get("parameters", {})
+        search_args = {"query": _SEARCH_QUERY, "max_results": search_max_results}
+        search_args = {key: value for key, value in search_args.items() if key in parameters.get("properties", {})}
+        return AIMessage(content="", tool_calls=[_call(search, search_args)])
+
+    if search in called:
+        found = _parse(next(iter(results.values()), None))
+        if isinstance(found, dict):
+            message_ids = found.get("message_ids") or [m["id"] for m in found.get("messages", [])]
+        else:
+            message_ids = [m["id"] for m in found or []]
+        if not message_ids:
+            return _final([])
+        name = "triage_gmail_messages" if "triage_gmail_messages" in names else "batch_get_gmail_messages_with_attachments"
+        return AIMessage(content="", tool_calls=[_call(name, {"message_ids": message_ids})])
+
+    if "triage_gmail_messages" in called:
+        triage = _parse(next(iter(results.values()), None)) or {}
+        records = [
+            {**_record(message), "es_valida": False, "motivo_rechazo": REASON_NO_PDF}
+            for message in triage.get("without_pdf", [])
+        ]
+        if not triage.get("candidates"):
+            return _final(records)
+        fetch_args = {"message_ids": triage["candidates"], "must_save_attachments": True,
+                      "attachments_root_path": attachments_path}
+        return AIMessage(content=json.dumps(records, ensure_ascii=False),
+                         tool_calls=[_call("batch_get_gmail_messages_with_attachments", fetch_args)])
+
+    if "batch_get_gmail_messages_with_attachments" in called:
+        records = _parse(turn.content) or []
+        fetched = _parse(next(iter(results.values()), None)) or {}
+        calls = []
+        for message in fetched.get("messages", []):
+            record = _record(message)
+            folder = f"{attachments_path}/{message['id']}"
+            pdfs = [a["file_name"] for a in message.get("attachments", []) if a["file_name"].lower().endswith(".pdf")]
+            if "validate_vacation_request" in names:
+                calls.append(_call("validate_vacation_request", {
+                    "folder": folder, "file_names": pdfs, "sender": message.get("sender") or "",
+                    "subject": message.get("subject") or "", "body": (message.get("body") or "")[:300],
+                }))
+            elif pdfs:
+                calls.append(_call("validate_pdf", {"folder": folder, "file_name": pdfs[0]}))
+            else:
+                record.update(es_valida=False, motivo_rechazo=REASON_NO_PDF)
+            records.append(record)
+        if not calls:
+            return _final(records)
+        return AIMessage(content=json.dumps(records, ensure_ascii=False), tool_calls=calls)
+
+    #Resultado de las validaciones: se completa el registro de cada correo
+    records = {record["message_id"]: record for record in _parse(turn.content) or []}
+    for call in turn.tool_calls:
+        record = records.get(call["args"]["folder"].rstrip("/").rsplit("/", 1)[-1])
+        result = results.get(call["id"], "")
+        if record is None:
+            continue
+        if call["name"] == "validate_vacation_request":
+            record.update(
+                es_valida=bool(_field(result, "es_valida")),
+                motivo_rechazo=_field(result, "motivo_rechazo"),
+                nombre_solicitante=_field(result, "nombre_solicitante"),
+            )
+        else:
+            name = re.search(r"Nombre del solicitante: ([^.]+)", str(result))
+            record.update(
+                es_valida="Firma: sí" in str(result),
+                nombre_solicitante=name.group(1) if name else None,
+                motivo_rechazo=None if "Firma: sí" in str(result) else "el documento no tiene una firma",
+            )
+    return _final(list(records.values()))
+
+
+def _handoff_records(messages) -> List[Dict]:
+    #Lista JSON entregada por el agente de solicitudes (el ultimo mensaje del LLM con registros de correos)
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and not message.tool_calls:
+            data = _parse(message.content)
+            if isinstance(data, list) and all(isinstance(item, dict) and "message_id" in item for item in data):
+                return data
+    return []
+
+
+def _draft_calls(records: List[Dict], names: List[str]) -> List[Dict]:
+    from email.utils import parseaddr
+
+    calls = []
+    for record in records:
+        valid = bool(record.get("es_valida"))
+        if "create_vacation_reply_draft" in names:
+            request_id = record.get("solicitud_vacacion_id")
+            calls.append(_call("create_vacation_reply_draft", {
+                "remitente": record.get("remitente") or "", "asunto": "Solicitud de vacaciones",
+                "fecha_recepcion": record.get("fecha_recepcion") or "", "es_valida": valid,
+                "nombre_solicitante": record.get("nombre_solicitante"), "motivo_rechazo": record.get("motivo_rechazo"),
+                "solicitud_vacacion_id": None if request_id is None else str(request_id),
+                "fecha_registro_solicitud": record.get("fecha_registro_solicitud"),
+            }))
+        else:
+            text = (f"¡Hola {record.get('nombre_solicitante')}! Tu solicitud de vacaciones fue aceptada "
+                    f"con el id {record.get('solicitud_vacacion_id')}." if valid else
+                    f"Estimado(a): su solicitud de vacaciones fue rechazada porque {record.get('motivo_rechazo')}.")
+            calls.append(_call("create_gmail_draft", {
+                "message": text, "to": [parseaddr(record.get("remitente") or "")[1]],
+                "subject": "Re: Solicitud de vacaciones",
+            }))
+    return calls
+
+
+def _process_agent_step(messages, names: List[str]) -> AIMessage:
+    turn, results = _own_turn(messages, set(names))
+    called = {call["name"] for call in turn.tool_calls} if turn is not None else set()
+
+    if turn is None:
+        records = _handoff_records(messages)
+        if not records:
+            return _final([])
+        valid = [record for record in records if record.get("es_valida")]
+        registrations = [
+            {"message_id": r["message_id"], "nombre_solicitante": r.get("nombre_solicitante") or "",
+             "fecha_solicitud": r.get("fecha_recepcion") or ""}
+            for r in valid
+        ]
+        if registrations and "register_vacation_requests" in names:
+            calls = [_call("register_vacation_requests", {"solicitudes": registrations})]
+        else:
+            calls = [_call("register_vacation_request", registration) for registration in registrations]
+        return AIMessage(content=json.dumps(records, ensure_ascii=False), tool_calls=calls or _draft_calls(records, names))
+
+    records = _parse(turn.content) or []
+    by_id = {record["message_id"]: record for record in records}
+    if called & {"register_vacation_request", "register_vacation_requests"}:
+        for call in turn.tool_calls:
+            result = _parse(results.get(call["id"]))
+            if call["name"] == "register_vacation_requests":
+                pairs = zip(call["args"]["solicitudes"], result if isinstance(result, list) else [])
+            else:
+                pairs = [(call["args"], result if isinstance(result, dict) else {})]
+            for registration, registered in pairs:
+                if registration["message_id"] in by_id and isinstance(registered, dict):
+                    by_id[registration["message_id"]].update(
+                        solicitud_vacacion_id=registered.get("solicitud_vacacion_id"),
+                        fecha_registro_solicitud=registered.get("fecha_registro_solicitud"),
+                    )
+        return AIMessage(content=json.dumps(records, ensure_ascii=False), tool_calls=_draft_calls(records, names))
+
+    if "mark_email_completed" in names and "mark_email_completed" not in called:
+        calls = [
+            _call("mark_email_completed", {
+                "message_id": r["message_id"],
+                "resultado": f"válida, registrada con id {r.get('solicitud_vacacion_id')}" if r.get("es_valida")
+                else f"inválida, {r.get('motivo_rechazo')}",
+            })
+            for r in records
+        ]
+        return AIMessage(content=json.dumps(records, ensure_ascii=False), tool_calls=calls)
+    return _final([{key: value for key, value in r.items() if key != "fecha_registro_solicitud"} for r in records])
+
+
+def _supervisor_step(messages, names: List[str]) -> AIMessage:
+    #Primero el agente que identifica las solicitudes y luego el que las procesa
+    agents = sorted((name[len("transfer_to_"):] for name in names if name.startswith("transfer_to_")),
+                    key=lambda agent: "process" in agent)
+    answered = [m.name for m in messages if isinstance(m, AIMessage) and m.name in agents]
+    position = agents.index(answered[-1]) + 1 if answered else 0
+    if position >= len(agents):
+        return AIMessage(content="Se procesaron todas las solicitudes de vacaciones.")
+    return AIMessage(content="", tool_calls=[_call(f"transfer_to_{agents[position]}", {})])
+
+
+def _text_answer(messages) -> AIMessage:
+    text = _pdf_text(messages)
+    if text is not None:
+        data = read_pdf_validation(text)
+        if not data["es_solicitud_vacaciones"]:
+            return AIMessage(content="El documento no es una solicitud de vacaciones.")
+        return AIMessage(content=(
+            f"Sí, el documento es una solicitud de vacaciones. Nombre del solicitante: {data['nombre_solicitante']}. "
+            f"Firma: {'sí' if data['tiene_firma'] else 'no'}."
+        ))
+    #Pulir o redactar un borrador: se devuelve el ultimo texto recibido
+    last = messages[-1].content if messages else ""
+    return AIMessage(content=last if isinstance(last, str) else str(last))
+
+
+def respond(messages, tools: Optional[List[Dict]] = None, tool_choice=None, search_max_results: int = 500,
+            attachments_path: str = "./adjuntos") -> AIMessage:
+    """
+    Respuesta del LLM simulado según su rol, que se reconoce por las herramientas recibidas
+
+    Args:
+        messages: mensajes de la llamada
+        tools: herramientas en formato de OpenAI (bind_tools)
+        tool_choice: "any" u otra herramienta obligatoria en las respuestas estructuradas
+        search_max_results: cantidad de correos que pide el agente de solicitudes en la busqueda
+        attachments_path: carpeta donde el agente de solicitudes guarda los adjuntos
+    """
+    tools = tools or []
+    names = [tool["function"]["name"] for tool in tools]
+    if len(tools) == 1 and tool_choice not in (None, "auto", "none"):
+        return _structured_answer(messages, tools[0]["function"])
+    if any(name.startswith("transfer_to_") for name in names):
+        return _supervisor_step(messages, names)
+    if "validate_vacation_request" in names or "validate_pdf" in names:
+        return _request_agent_step(messages, tools, search_max_results, attachments_path)
+    if "register_vacation_request" in names:
+        return _process_agent_step(messages, names)
+    return _text_answer(messages)
+
+
+class SimulatedChatModel(BaseChatModel):
+    """
+    Chat model simulado con latencia y tokens configurables
+
+    Args:
+        model: nombre del modelo que reemplaza, por ejemplo "google_genai:gemini-2.0-flash"
+        latency_seconds: demora de cada llamada
+        input_tokens: tokens de entrada de cada llamada, None para aproximarlos con los mensajes
+        output_tokens: tokens de salida de cada llamada, None para aproximarlos con la respuesta
+        search_max_results: cantidad de correos que pide el agente de solicitudes en la busqueda
+        attachments_path: carpeta donde el agente de solicitudes guarda los adjuntos
+        rate_limit_rate: fracción de las llamadas (0 a 1) que responden 429
+        retry_after_seconds: Retry-After de los 429, None para no indicarlo (el limitador usa su backoff)
+    """
+
+    model: str = "simulado"
+    latency_seconds: float = 0.0
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    search_max_results: int = 500
+    attachments_path: str = "./adjuntos"
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulado"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _result(self, messages, kwargs: Dict, seconds: float) -> ChatResult:
+        from langchain_core.messages.utils import count_tokens_approximately
+
+        message = respond(messages, kwargs.get("tools"), kwargs.get("tool_choice"),
+                          self.search_max_results, self.attachments_path)
+        input_tokens = self.input_tokens if self.input_tokens is not None else count_tokens_approximately(messages)
+        output_tokens = self.output_tokens if self.output_tokens is not None else count_tokens_approximately([message])
+        message.usage_metadata = {
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+        }
+        _count(self.model, input_tokens, output_tokens, seconds)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _check_rate_limit(self) -> None:
+        #El 429 se responde antes de procesar la llamada, como los proveedores
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            _count_rate_limited(self.model)
+            raise SimulatedRateLimitError(self.model, self.retry_after_seconds)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_rate_limit()
+        start = time.perf_counter()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._result(messages, kwargs, time.perf_counter() - start)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._check_rate_limit()
+        start = time.perf_counter()
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._result(messages, kwargs, time.perf_counter() - start)
+
+
+def make_model_factory(latency_seconds: float = 0.0, input_tokens: Optional[int] = None,
+                       output_tokens: Optional[int] = None, **kwargs):
+    """
+    Crea la función que reemplaza a init_chat_model (registro_modelos.set_chat_model_factory), todos los modelos
+    se reemplazan por SimulatedChatModel
+
+    Args:
+        latency_seconds: demora de cada llamada
+        input_tokens: tokens de entrada de cada llamada, None para aproximarlos con los mensajes
+        output_tokens: tokens de salida de cada llamada, None para aproximarlos con la respuesta
+        kwargs: otros campos de SimulatedChatModel (search_max_results, attachments_path, rate_limit_rate,
+            retry_after_seconds)
+    """
+    def factory(model: str, model_provider: Optional[str] = None, **params):
+        #Los parametros del modelo real (temperature, clientes HTTP) no se usan
+        return SimulatedChatModel(
+            model=f"{model_provider}:{model}" if model_provider else model,
+            latency_seconds=latency_seconds, input_tokens=input_tokens, output_tokens=output_tokens, **kwargs,
+        )
+
+    return factory
+
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict] = {}
+
+
+def _model_stats(model: str) -> Dict:
+    return _stats.setdefault(
+        model, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0, "rate_limited": 0}
+    )
+
+
+def _count(model: str, input_tokens: int, output_tokens: int, seconds: float) -> None:
+    with _lock:
+        stats = _model_stats(model)
+        stats["calls"] += 1
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["seconds"] += seconds
+
+
+def _count_rate_limited(model: str) -> None:
+    with _lock:
+        _model_stats(model)["rate_limited"] += 1
+
+
+def get_simulated_model_stats() -> Dict:
+    """Devuelve las llamadas, los tokens, los segundos de espera y los 429 respondidos de cada modelo simulado"""
+    with _lock:
+        return {model: {**stats, "seconds": round(stats["seconds"], 3)} for model, stats in _stats.items()}
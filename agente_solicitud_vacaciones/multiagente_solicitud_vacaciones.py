@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Dict
-from agente_busca_solicitud import build_vacation_request_agent, make_system_prompt
+from typing import Dict, List
+from pydantic import BaseModel, Field
+from agente_busca_solicitud import build_vacation_request_agent, make_system_prompt, search_instruction
 
 def register_vacation_request(message_id: str, 
                               nombre_solicitante: str, 
@@ -16,29 +17,72 @@ def register_vacation_request(message_id: str,
     Returns:
         Dict: id de solicitud y fecha de registro de solicitud
     """
-    #Acá deberiamos llamar a nuestro servicio que registra la solicitud de vacaciones
-    #y hacemos que devuelva el número de solicitud registrado, por ahora es un Mock
-    return {
-        "solicitud_vacacion_id": "12345",
-        "fecha_registro_solicitud": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-
-def build_vacation_process_agent():
-    from langchain_google_community import GmailToolkit
+    #Se registra en el registro local (registro_solicitudes.py), si el correo ya fue registrado
+    #en una ejecución anterior se devuelve el registro existente sin volver a escribir
+    from registro_solicitudes import get_request_store
+    return get_request_store().register(message_id, nombre_solicitante, fecha_solicitud)
+
+class VacationRequestInput(BaseModel):
+    """Datos de una solicitud de vacaciones a registrar"""
+
+    message_id: str = Field(description="ID del correo con la solicitud de vacaciones")
+    nombre_solicitante: str = Field(description="Nombre del solicitante")
+    fecha_solicitud: str = Field(description="Fecha de envío de correo de solicitud")
+
+def register_vacation_requests(solicitudes: List[VacationRequestInput])->List[Dict]:
+    """Registra varias solicitudes de vacaciones en una sola operación y devuelve los datos principales de cada solicitud, como su id
+
+    Args:
+        solicitudes (List[VacationRequestInput]): solicitudes con el ID del correo, nombre del solicitante y fecha de envío del correo
+
+    Returns:
+        List[Dict]: por cada solicitud, id de solicitud y fecha de registro de solicitud
+    """
+    from registro_solicitudes import get_request_store
+    return get_request_store().register_many([
+        solicitud.model_dump() if isinstance(solicitud, BaseModel) else dict(solicitud) for solicitud in solicitudes
+    ])
+
+#Herramienta de los borradores de respuesta: con DRAFT_MODE=template (por defecto) el texto se arma con plantillas
+#(borradores_respuesta.py) y el agente solo entrega los datos, con DRAFT_MODE=llm el agente redacta el texto
+def build_draft_tool(api_resource):
+    from borradores_respuesta import get_draft_mode, make_reply_draft_tool
     from langchain_google_community.gmail.create_draft import GmailCreateDraft
-    from langchain.chat_models import init_chat_model
+
+    if get_draft_mode() == "llm":
+        return GmailCreateDraft(api_resource=api_resource)
+    return make_reply_draft_tool(api_resource)
+
+def draft_instruction() -> str:
+    from borradores_respuesta import get_draft_mode
+
+    if get_draft_mode() == "llm":
+        return ""
+    return ("Crea cada borrador de respuesta con la herramienta create_vacation_reply_draft, que ya redacta el texto: "
+            "solo entrega los datos de la solicitud, sin redactar el contenido del correo.")
+
+#Si se envia thread_id, el agente marca cada correo terminado (puntos_control.py) para no volver a procesarlo al continuar
+def build_vacation_process_agent(thread_id=None):
+    from recursos_gmail import get_gmail_toolkit
+    from registro_modelos import get_chat_model
     from langgraph.prebuilt import create_react_agent
+    from contexto_mensajes import HANDOFF_INSTRUCTIONS, make_pre_model_hook
 
-    #Se crea el chat model a usar con buena capacidad agentica o Tool Calling
-    llm = init_chat_model("google_genai:gemini-2.5-flash-lite", temperature=0)
+    #Se obtiene el chat model compartido (registro_modelos.py) con buena capacidad agentica o Tool Calling
+    llm = get_chat_model("google_genai:gemini-2.5-flash-lite", temperature=0)
 
-    toolkit = GmailToolkit()
+    toolkit = get_gmail_toolkit()
     #Se crea la lista de herramientas necesarias para cada agente
     vacation_process_tools = [
-        GmailCreateDraft(api_resource=toolkit.api_resource),
+        build_draft_tool(toolkit.api_resource),
         register_vacation_request,
+        register_vacation_requests, #Registra todas las solicitudes validas en una sola llamada
     ]
 
+    if thread_id is not None:
+        from puntos_control import make_mark_email_completed_tool
+        vacation_process_tools.append(make_mark_email_completed_tool(thread_id))
+
     #Se definen el aegente con su respecitvo LLM, Prompt y herramientas
     #Notese que en el Prompt tiene en su contexto todo el procedimiento pero se le indica un rol limitado
     vacation_process_agent = create_react_agent(
@@ -48,51 +92,122 @@ def build_vacation_process_agent():
             "Tu rol es solo procesar las solicitudes de vacaciones validas o invalidas,"
             "trabajas con otro agente que te entregará las solicitudes que tu debes procesar."
             "Asegurate de realizar la tareas indicadas el el procesamiento de solicitudes validas o invalidas."
+            "Cuando termines de procesar cada correo, marcalo como procesado si tienes la herramienta para hacerlo."
+            "Si hay varias solicitudes validas, registralas todas en una sola llamada a la herramienta que registra varias solicitudes."
+            + draft_instruction()
+            + HANDOFF_INSTRUCTIONS
         ),
+        #Antes de cada llamada al LLM se compactan los mensajes (contexto_mensajes.py)
+        pre_model_hook=make_pre_model_hook(),
         name="vacation_process_agent"
     )
     return vacation_process_agent
 
-#Esta es la lógica principal del ejemplo
-def main(args=None):
-    from dotenv import load_dotenv
-    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
-    load_dotenv()
-
-    from langchain_core.messages import HumanMessage
+#Supervisor de los dos agentes, si se envia thread_id el agente de procesamiento marca cada correo terminado
+#(los agentes usan el checkpointer del supervisor)
+def build_vacation_supervisor(sync_state=None, thread_id=None, checkpointer=None):
     from langgraph_supervisor import create_supervisor
-    from langchain.chat_models import init_chat_model
+    from registro_modelos import get_chat_model
+    from contexto_mensajes import make_pre_model_hook
 
     #Creamos instancia de los agentes IA que van a trabajar con el supervisor
-    vacation_request_agent = build_vacation_request_agent()
-    vacation_process_agent = build_vacation_process_agent()
+    vacation_request_agent = build_vacation_request_agent(sync_state)
+    vacation_process_agent = build_vacation_process_agent(thread_id)
     
-    #Se crea el chat model a usar con buena capacidad agentica o Tool Calling
-    llm = init_chat_model("google_genai:gemini-2.0-flash-lite", temperature=0)
+    #Se obtiene el chat model compartido (registro_modelos.py) con buena capacidad agentica o Tool Calling
+    llm = get_chat_model("google_genai:gemini-2.0-flash-lite", temperature=0)
 
     #Se define el supervisor de los agentes, con su LLM, Prompt y lista de agentes
-    supervisor = create_supervisor(
+    return create_supervisor(
         agents=[vacation_request_agent, vacation_process_agent],
         model=llm,
         prompt=make_system_prompt(
             "Tu rol es coordinar con un agente encargado de identificar las solicitudes de vacaciones y "
             "un agente encargado de procesar las solicitudes de vacaciones. Asignales trabajo a ambos agentes sin pedir confirmaciones."
+            "Al asignar trabajo entrega solo los registros JSON de los correos, no el contenido de los correos."
         ),
-    ).compile()
-
-    #Se envia instrucciones al supervisor, que asignara el trabajo a cada agente hasta que este completada la tarea
-    events = supervisor.stream(
-        {"messages": [
-            HumanMessage("Procesar las posibles solicitudes de vacaciones de los ultimos 7 días.")
-        ]},
-        {"recursion_limit": 100},
-        stream_mode="values",
-    )
+        #Los agentes solo devuelven su ultimo mensaje (el registro JSON) al supervisor, no todo su historial
+        output_mode="last_message",
+        pre_model_hook=make_pre_model_hook(),
+    ).compile(checkpointer=checkpointer)
+
+#Esta es la lógica principal del ejemplo
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Multiagente que procesa las solicitudes de vacaciones")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo los correos nuevos desde la ultima ejecución (historyId de GMail)")
+    parser.add_argument("--resume", metavar="THREAD_ID", default=None,
+                        help="Continuar una ejecución interrumpida desde su ultimo checkpoint (SQLite)")
+    options = parser.parse_args(args)
+
+    from dotenv import load_dotenv
+    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
+    load_dotenv()
+
+    #Metricas de cada modelo, herramienta y nodo de los grafos (metricas.py), el resumen se muestra al terminar
+    import json
+    from metricas import enable_metrics, get_metrics_summary
+    enable_metrics()
+
+    from langchain_core.messages import HumanMessage
+
+    #En modo incremental se usa el estado guardado de la ultima ejecución
+    sync_state = None
+    if options.incremental:
+        from sincronizacion_bandeja import get_inbox_sync_state
+        sync_state = get_inbox_sync_state()
+
+    #Cada ejecución tiene un thread_id, con el que se guardan sus checkpoints y se puede continuar si se interrumpe
+    from puntos_control import new_thread_id, open_checkpointer, resume_input, run_config
+    from contexto_mensajes import TokenBudgetCallback
+    thread_id = options.resume or new_thread_id()
+    #El callback cuenta los tokens de cada llamada al LLM (supervisor y agentes) y detiene la ejecución si se agota RUN_TOKEN_BUDGET
+    token_budget = TokenBudgetCallback.from_env()
+    config = {**run_config(thread_id), "callbacks": [token_budget]}
+    if sync_state is not None:
+        #Registra los correos cuyas herramientas fallaron, para no marcarlos como procesados al confirmar
+        from sincronizacion_bandeja import InboxSyncCallback
+        sync_callback = InboxSyncCallback(sync_state)
+        config["callbacks"].append(sync_callback)
+    print(f"thread_id de la ejecución: {thread_id} (para continuarla si se interrumpe: --resume {thread_id})")
+
+    with open_checkpointer() as checkpointer:
+        #El checkpointer guarda el estado en SQLite despues de cada paso
+        supervisor = build_vacation_supervisor(sync_state, thread_id, checkpointer)
+
+        #Al continuar, si quedaron pasos pendientes se retoma desde el ultimo checkpoint (entrada None),
+        #si la ejecución habia terminado se indica que siga con los correos pendientes
+        if options.resume:
+            supervisor_input = resume_input(supervisor, config, "Procesar", thread_id)
+        else:
+            supervisor_input = {"messages": [HumanMessage(search_instruction("Procesar", options.incremental) + ".")]}
+
+        #Se envia instrucciones al supervisor, que asignara el trabajo a cada agente hasta que este completada la tarea
+        events = supervisor.stream(
+            supervisor_input,
+            config,
+            stream_mode="values",
+        )
+
+        #Se va mostrando en la consola cada interacción o mensaje del supervisor
+        #Para ver el detalle de lo que hace cada agente se debe revisar la traza en LangSmith (incluyendo las llamadas a las herrameintas)
+        try:
+            for event in events:
+                event["messages"][-1].pretty_print()
+        except Exception:
+            print(f"Ejecución interrumpida, para continuarla: --resume {thread_id}")
+            raise
+        finally:
+            print("Tokens de la ejecución:", token_budget.report())
+            print("Metricas de la ejecución:", json.dumps(get_metrics_summary(), ensure_ascii=False, indent=2))
 
-    #Se va mostrando en la consola cada interacción o mensaje del supervisor
-    #Para ver el detalle de lo que hace cada agente se debe revisar la traza en LangSmith (incluyendo las llamadas a las herrameintas)
-    for event in events:
-        event["messages"][-1].pretty_print()
+    #Si la ejecución termino bien, se guarda el historyId y los correos procesados,
+    #los correos que fallaron o que no se marcaron como terminados se vuelven a procesar en la siguiente ejecución
+    if sync_state is not None:
+        from puntos_control import get_completion_log
+        sync_callback.mark_unfinished(get_completion_log().completed_ids(thread_id))
+        print(sync_state.commit())
 
 #Solo se llamará al método principal si se ejecuta este modulo directamente
 if __name__ == "__main__":
@@ -0,0 +1,614 @@
+#=======================================================================================
+# Pipeline determinístico (LangGraph StateGraph) para el procesamiento de solicitudes de vacaciones.
+# En el multiagente, el supervisor (LLM) decide cada traspaso y los agentes ReAct deciden cada llamada a herramientas,
+# eso cuesta varias llamadas al LLM por correo solo para el flujo de control.
+# Aca el flujo es fijo y lo decide el código: buscar -> leer -> validar -> registrar -> borrador,
+# el LLM solo se usa donde se necesita criterio: la validación del PDF y la redacción del borrador.
+# Se usan las mismas herramientas que el multiagente para poder comparar ambos modos.
+# Con concurrencia mayor a 1 cada correo se procesa en paralelo (LangGraph Send), cada hilo con su propio
+# recurso del API de GMail (recursos_gmail.py), hasta el limite configurado con PIPELINE_CONCURRENCY o --concurrency.
+#=======================================================================================
+import operator
+import os
+import time
+from typing import Annotated, Dict, List, Optional, Tuple, TypedDict
+
+#Busqueda por defecto, igual que en el multiagente: correos de los ultimos 7 días de la bandeja de entrada
+DEFAULT_SEARCH_QUERY = "in:inbox newer_than:7d"
+#Carpeta donde se guardan los adjuntos, en una subcarpeta con el id del correo
+ATTACHMENTS_ROOT_PATH = "./adjuntos"
+#Modelo usado para redactar los borradores (la validez de cada solicitud se decide en código, reglas_solicitud.py)
+DRAFT_MODEL = "google_genai:gemini-2.5-flash-lite"
+
+
+def _add_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    #Se suman los segundos de cada paso (en paralelo es la suma de todos los correos, no el tiempo total)
+    timings = dict(left or {})
+    for step, seconds in (right or {}).items():
+        timings[step] = timings.get(step, 0.0) + seconds
+    return timings
+
+
+class VacationPipelineState(TypedDict, total=False):
+    """Estado del pipeline, cada nodo devuelve solo las llaves que actualiza"""
+
+    message_ids: List[str]
+    #Solicitudes invalidas por no tener PDF, decididas en el triaje sin leer el correo
+    triaged: List[Dict]
+    emails: List[Dict]
+    #Un elemento por correo relacionado a vacaciones, con el resultado de cada paso
+    requests: List[Dict]
+    errors: Annotated[List[Dict], operator.add]
+    llm_calls: Annotated[int, operator.add]
+    timings: Annotated[Dict[str, float], _add_timings]
+
+
+class VacationFanOutState(TypedDict, total=False):
+    """Estado del pipeline en paralelo, cada correo agrega su resultado a requests"""
+
+    message_ids: List[str]
+    triaged: List[Dict]
+    requests: Annotated[List[Dict], operator.add]
+    errors: Annotated[List[Dict], operator.add]
+    llm_calls: Annotated[int, operator.add]
+    timings: Annotated[Dict[str, float], _add_timings]
+
+
+def _draft_prompt(request: Dict) -> str:
+    if request["valid"]:
+        registration = request["registration"]
+        return (
+            "Redacta el contenido de un borrador de correo de respuesta con un estilo informal, dirigido al solicitante, "
+            f"indicando que su solicitud recibida el {request['date']} fue aceptada, "
+            f"con el id de solicitud {registration['solicitud_vacacion_id']} "
+            f"y la fecha de registro {registration['fecha_registro_solicitud']}. "
+            f"El nombre del solicitante es {request['applicant_name']}."
+        )
+    return (
+        "Redacta el contenido de un borrador de correo de respuesta con un estilo formal, dirigido al solicitante "
+        f"({request['sender']}), indicando que su solicitud recibida el {request['date']} fue rechazada "
+        f"por el siguiente motivo: {request['reason']}."
+    )
+
+
+def _search_message_ids(api_resource, sync_state, search_query: str, max_results: int) -> List[str]:
+    """Devuelve los ids de los correos a procesar (busqueda completa o solo los nuevos en modo incremental)"""
+    if sync_state is None:
+        from sincronizacion_bandeja import list_query_message_ids
+        return list_query_message_ids(api_resource, search_query, max_results)
+
+    from sincronizacion_bandeja import list_new_message_ids
+    result = list_new_message_ids(api_resource, sync_state)
+    message_ids = result["message_ids"][:max_results]
+    #Si quedan correos pendientes no se avanza el historyId (ver GmailSearchNewMessages)
+    truncated = len(result["message_ids"]) > len(message_ids)
+    sync_state.set_pending(None if truncated else result["history_id"], message_ids)
+    return message_ids
+
+
+def _skip_completed(message_ids: List[str], thread_id: Optional[str]) -> List[str]:
+    #Al continuar una ejecución se omiten los correos que ya se terminaron de procesar
+    if thread_id is None:
+        return message_ids
+    from puntos_control import get_completion_log
+    completed = set(get_completion_log().completed_ids(thread_id))
+    return [message_id for message_id in message_ids if message_id not in completed]
+
+
+def _mark_completed(thread_id: Optional[str], message_id: str, request: Optional[Dict]) -> None:
+    if thread_id is None:
+        return
+    from puntos_control import get_completion_log
+    if request is None:
+        result = "no relacionado a vacaciones"
+    else:
+        result = "válida" if request["valid"] else f"inválida: {request['reason']}"
+    get_completion_log().mark_completed(thread_id, message_id, result)
+
+
+def _triage(api_resource, message_ids: List[str], sync_state) -> Tuple[List[str], List[Dict]]:
+    """
+    Triaje con los metadatos de los correos (triaje_correos.py), devuelve los ids que se deben leer
+    y las solicitudes invalidas por no tener PDF (sin leer el correo ni llamar al LLM)
+    """
+    from reglas_solicitud import evaluate_request
+    from triaje_correos import get_processed_ids, is_triage_enabled, triage_messages
+
+    if not is_triage_enabled() or not message_ids:
+        return message_ids, []
+    result = triage_messages(api_resource, message_ids, get_processed_ids(message_ids, sync_state))
+    requests = []
+    for message in result["without_pdf"]:
+        verdict = evaluate_request(message["subject"], message["snippet"], message["sender"], [])
+        requests.append({
+            "message_id": message["id"],
+            "sender": message["sender"],
+            "subject": message["subject"],
+            "date": message["date"],
+            "valid": verdict.es_valida,
+            "applicant_name": None,
+            "reason": verdict.motivo_rechazo,
+            "verdict": verdict.model_dump(),
+        })
+    return [message["id"] for message in result["candidates"]], requests
+
+
+def _validate_email(email_data: Dict) -> Tuple[Optional[Dict], int]:
+    """
+    Valida un correo y devuelve la solicitud (None si el correo no es de vacaciones) y las llamadas al LLM realizadas
+
+    Args:
+        email_data: correo obtenido con GmailGetMessageWithAttachments (con los adjuntos guardados)
+    """
+    from reglas_solicitud import evaluate_request, is_vacation_related
+    from validar_solicitud import extract_pdf_validation
+
+    #Los correos que no estan relacionados a vacaciones no se responden
+    if not is_vacation_related(email_data.get("subject"), email_data.get("body")):
+        return None, 0
+    llm_calls = 0
+    folder = f"{ATTACHMENTS_ROOT_PATH}/{email_data['id']}"
+
+    def validations():
+        nonlocal llm_calls
+        for attachment in email_data.get("attachments", []):
+            if not attachment["file_name"].lower().endswith(".pdf"):
+                continue
+            #El LLM solo entrega los datos del PDF (una llamada, ninguna si estaba en la cache o lo descartó el prefiltro,
+            #y al menos dos si la cascada escaló a un modelo mas capaz)
+            validation, source = extract_pdf_validation(folder, attachment["file_name"])
+            if source == "llm":
+                llm_calls += 1
+            elif source == "escalado":
+                llm_calls += 2
+            yield validation
+
+    #Las condiciones del procedimiento se revisan en código, los PDFs se validan solo hasta encontrar uno válido
+    verdict = evaluate_request(email_data.get("subject"), email_data.get("body"), email_data.get("sender"), validations())
+    return {
+        "message_id": email_data["id"],
+        "sender": email_data.get("sender"),
+        "subject": email_data.get("subject"),
+        "date": email_data.get("date"),
+        "valid": verdict.es_valida,
+        "applicant_name": verdict.nombre_solicitante,
+        "reason": verdict.motivo_rechazo,
+        "verdict": verdict.model_dump(),
+    }, llm_calls
+
+
+def _register_request(request: Dict) -> Dict:
+    """Registra la solicitud si es válida"""
+    from multiagente_solicitud_vacaciones import register_vacation_request
+
+    if not request["valid"]:
+        return request
+    return {
+        **request,
+        "registration": register_vacation_request(request["message_id"], request["applicant_name"], request["date"]),
+    }
+
+
+def _draft_llm_calls() -> int:
+    """Llamadas al LLM por borrador: ninguna con plantillas, una si el LLM redacta o pule el texto"""
+    from borradores_respuesta import get_draft_mode, is_polish_enabled
+    return 1 if get_draft_mode() == "llm" or is_polish_enabled() else 0
+
+
+def _draft_request(request: Dict, draft_tool) -> Tuple[Dict, Optional[Dict]]:
+    """Arma el borrador de respuesta (plantilla o LLM según DRAFT_MODE) y lo crea en GMail, devuelve la solicitud y el error si lo hubo"""
+    from borradores_respuesta import create_reply_draft, get_draft_mode
+
+    registration = request.get("registration") or {}
+    try:
+        if get_draft_mode() == "llm":
+            draft_result = _draft_request_with_llm(request, draft_tool)
+        else:
+            #El texto se arma con la plantilla del resultado, sin LLM
+            draft_result = create_reply_draft(
+                draft_tool, sender=request["sender"], subject=request["subject"], date=request["date"],
+                valid=request["valid"], applicant_name=request["applicant_name"], reason=request["reason"],
+                request_id=registration.get("solicitud_vacacion_id"),
+                registration_date=registration.get("fecha_registro_solicitud"),
+            )
+    except Exception as e:
+        return request, {"step": "draft", "id": request["message_id"], "error": str(e)}
+    return {**request, "draft": draft_result}, None
+
+
+def _draft_request_with_llm(request: Dict, draft_tool) -> str:
+    """Redacta el borrador de respuesta con el LLM (DRAFT_MODE=llm) y lo crea en GMail"""
+    from email.utils import parseaddr
+    from langchain_core.messages import HumanMessage
+    from agente_busca_solicitud import make_system_prompt
+    from registro_modelos import get_chat_model
+
+    llm = get_chat_model(DRAFT_MODEL, temperature=0)
+    system_prompt = make_system_prompt(
+        "Tu rol es solo redactar el contenido de los borradores de respuesta, "
+        "responde solo con el texto del correo, sin asunto y sin comentarios adicionales."
+    )
+    body = llm.invoke([system_prompt, HumanMessage(_draft_prompt(request))]).content
+    return draft_tool.invoke({
+        "message": body,
+        "to": [parseaddr(request["sender"] or "")[1]],
+        "subject": f"Re: {request['subject'] or ''}",
+    })
+
+
+def build_vacation_pipeline(
+    sync_state=None,
+    search_query: str = DEFAULT_SEARCH_QUERY,
+    max_results: int = 100,
+    checkpointer=None,
+    thread_id: Optional[str] = None,
+):
+    """
+    Crea el pipeline determinístico de solicitudes de vacaciones, los correos se procesan uno tras otro
+
+    Args:
+        sync_state: estado de la sincronización incremental (sincronizacion_bandeja.py), None para usar search_query
+        search_query: busqueda de GMail cuando no se usa la sincronización incremental
+        max_results: cantidad máxima de correos a procesar
+        checkpointer: checkpointer para guardar el estado despues de cada paso (puntos_control.py)
+        thread_id: identificador de la ejecución, los correos terminados se marcan y se omiten al continuar
+    """
+    from recursos_gmail import get_gmail_toolkit
+    from langchain_google_community.gmail.create_draft import GmailCreateDraft
+    from langgraph.graph import END, START, StateGraph
+    from gmail_get_message_with_attachments import GmailBatchGetMessagesWithAttachments
+
+    #Se instancia el Toolkit para GMail una sola vez, todas las herramientas comparten el recurso del API
+    toolkit = get_gmail_toolkit()
+    fetch_tool = GmailBatchGetMessagesWithAttachments(api_resource=toolkit.api_resource, lazy_attachments=True)
+    draft_tool = GmailCreateDraft(api_resource=toolkit.api_resource)
+
+    def search(state: VacationPipelineState) -> Dict:
+        start = time.perf_counter()
+        message_ids = _search_message_ids(toolkit.api_resource, sync_state, search_query, max_results)
+        message_ids = _skip_completed(message_ids, thread_id)
+        return {"message_ids": message_ids, "timings": {"search": time.perf_counter() - start}}
+
+    def triage(state: VacationPipelineState) -> Dict:
+        start = time.perf_counter()
+        #Solo se leen completos los correos que pasan las reglas del triaje (encabezados, etiquetas y adjuntos)
+        message_ids, triaged = _triage(toolkit.api_resource, state["message_ids"], sync_state)
+        return {"message_ids": message_ids, "triaged": triaged, "timings": {"triage": time.perf_counter() - start}}
+
+    def fetch(state: VacationPipelineState) -> Dict:
+        start = time.perf_counter()
+        #Se leen todos los correos (y se descargan sus PDFs) con peticiones batch del API de GMail
+        result = fetch_tool.invoke({
+            "message_ids": state["message_ids"],
+            "must_save_attachments": True,
+            "attachments_root_path": ATTACHMENTS_ROOT_PATH,
+        })
+        return {
+            "emails": result["messages"],
+            "errors": [{"step": "fetch", **error} for error in result["errors"]],
+            "timings": {"fetch": time.perf_counter() - start},
+        }
+
+    def validate(state: VacationPipelineState) -> Dict:
+        start = time.perf_counter()
+        requests = list(state.get("triaged", []))
+        llm_calls = 0
+        errors = []
+        for email_data in state.get("emails", []):
+            #Un error en un correo no detiene la validación de los demas
+            try:
+                request, calls = _validate_email(email_data)
+            except Exception as e:
+                errors.append({"step": "validate", "id": email_data["id"], "error": str(e)})
+                continue
+            llm_calls += calls
+            if request is not None:
+                requests.append(request)
+            else:
+                _mark_completed(thread_id, email_data["id"], None)
+        return {
+            "requests": requests,
+            "errors": errors,
+            "llm_calls": llm_calls,
+            "timings": {"validate": time.perf_counter() - start},
+        }
+
+    def register(state: VacationPipelineState) -> Dict:
+        from registro_solicitudes import get_request_store
+
+        start = time.perf_counter()
+        #Todas las solicitudes validas se registran en una sola transacción (las ya registradas no se vuelven a escribir)
+        registrations = get_request_store().register_many([
+            {
+                "message_id": request["message_id"],
+                "nombre_solicitante": request["applicant_name"],
+                "fecha_solicitud": request["date"],
+            }
+            for request in state["requests"] if request["valid"]
+        ])
+        by_message_id = {registration["message_id"]: registration for registration in registrations}
+        requests = [
+            {**request, "registration": by_message_id[request["message_id"]]} if request["valid"] else request
+            for request in state["requests"]
+        ]
+        return {"requests": requests, "timings": {"register": time.perf_counter() - start}}
+
+    def draft(state: VacationPipelineState) -> Dict:
+        start = time.perf_counter()
+        requests = []
+        errors = []
+        for request in state["requests"]:
+            request, error = _draft_request(request, draft_tool)
+            requests.append(request)
+            if error is not None:
+                errors.append(error)
+            else:
+                _mark_completed(thread_id, request["message_id"], request)
+        return {
+            "requests": requests,
+            "errors": errors,
+            "llm_calls": len(state["requests"]) * _draft_llm_calls(),
+            "timings": {"draft": time.perf_counter() - start},
+        }
+
+    #Las decisiones de ruteo las toma el código, no el LLM
+    def route_after_search(state: VacationPipelineState) -> str:
+        return "triage" if state["message_ids"] else END
+
+    def route_after_triage(state: VacationPipelineState) -> str:
+        if state["message_ids"]:
+            return "fetch"
+        return "validate" if state.get("triaged") else END
+
+    def route_after_validate(state: VacationPipelineState) -> str:
+        if not state["requests"]:
+            return END
+        return "register" if any(request["valid"] for request in state["requests"]) else "draft"
+
+    graph = StateGraph(VacationPipelineState)
+    graph.add_node("search", search)
+    graph.add_node("triage", triage)
+    graph.add_node("fetch", fetch)
+    graph.add_node("validate", validate)
+    graph.add_node("register", register)
+    graph.add_node("draft", draft)
+    graph.add_edge(START, "search")
+    graph.add_conditional_edges("search", route_after_search, ["triage", END])
+    graph.add_conditional_edges("triage", route_after_triage, ["fetch", "validate", END])
+    graph.add_edge("fetch", "validate")
+    graph.add_conditional_edges("validate", route_after_validate, ["register", "draft", END])
+    graph.add_edge("register", "draft")
+    graph.add_edge("draft", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def build_vacation_fanout_pipeline(
+    sync_state=None,
+    search_query: str = DEFAULT_SEARCH_QUERY,
+    max_results: int = 100,
+    checkpointer=None,
+    thread_id: Optional[str] = None,
+):
+    """
+    Crea el pipeline que procesa cada correo en paralelo (un Send de LangGraph por correo),
+    la cantidad de correos en paralelo se limita con max_concurrency en la configuración de la ejecución
+
+    Args:
+        sync_state: estado de la sincronización incremental (sincronizacion_bandeja.py), None para usar search_query
+        search_query: busqueda de GMail cuando no se usa la sincronización incremental
+        max_results: cantidad máxima de correos a procesar
+        checkpointer: checkpointer para guardar el estado despues de cada paso (puntos_control.py)
+        thread_id: identificador de la ejecución, los correos terminados se marcan y se omiten al continuar
+    """
+    from langchain_google_community.gmail.create_draft import GmailCreateDraft
+    from langgraph.graph import END, START, StateGraph
+    from langgraph.types import Send
+    from gmail_get_message_with_attachments import GmailGetMessageWithAttachments
+    from recursos_gmail import get_thread_api_resource
+
+    def search(state: VacationFanOutState) -> Dict:
+        start = time.perf_counter()
+        api_resource = get_thread_api_resource()
+        message_ids = _search_message_ids(api_resource, sync_state, search_query, max_results)
+        message_ids = _skip_completed(message_ids, thread_id)
+        timings = {"search": time.perf_counter() - start}
+        #El triaje se hace con peticiones batch para todos los correos, antes de repartirlos
+        start = time.perf_counter()
+        message_ids, triaged = _triage(api_resource, message_ids, sync_state)
+        timings["triage"] = time.perf_counter() - start
+        return {"message_ids": message_ids, "triaged": triaged, "timings": timings}
+
+    def process_email(task: Dict) -> Dict:
+        #Cada hilo usa su propio recurso del API de GMail, las herramientas se crean por correo (son livianas)
+        api_resource = get_thread_api_resource()
+        fetch_tool = GmailGetMessageWithAttachments(api_resource=api_resource, lazy_attachments=True)
+        draft_tool = GmailCreateDraft(api_resource=api_resource)
+        message_id = task["message_id"]
+        timings = {}
+
+        #Las solicitudes sin PDF se decidieron en el triaje, solo falta su borrador de respuesta
+        if "request" in task:
+            start = time.perf_counter()
+            request, error = _draft_request(task["request"], draft_tool)
+            timings["draft"] = time.perf_counter() - start
+            if error is None:
+                _mark_completed(thread_id, message_id, request)
+            return {
+                "requests": [request],
+                "errors": [error] if error is not None else [],
+                "llm_calls": _draft_llm_calls(),
+                "timings": timings,
+            }
+
+        start = time.perf_counter()
+        try:
+            email_data = fetch_tool.invoke({
+                "message_id": message_id,
+                "must_save_attachments": True,
+                "attachments_root_path": ATTACHMENTS_ROOT_PATH,
+            })
+        except Exception as e:
+            return {"errors": [{"step": "fetch", "id": message_id, "error": str(e)}]}
+        timings["fetch"] = time.perf_counter() - start
+
+        #Un error del LLM (o de la cascada, o del limitador de uso despues de los reintentos) solo afecta a este correo,
+        #que no se marca como terminado y se vuelve a procesar al continuar la ejecución
+        start = time.perf_counter()
+        try:
+            request, llm_calls = _validate_email(email_data)
+        except Exception as e:
+            return {"errors": [{"step": "validate", "id": message_id, "error": str(e)}], "timings": timings}
+        timings["validate"] = time.perf_counter() - start
+        if request is None:
+            _mark_completed(thread_id, message_id, None)
+            return {"llm_calls": llm_calls, "timings": timings}
+
+        start = time.perf_counter()
+        try:
+            request = _register_request(request)
+        except Exception as e:
+            return {
+                "errors": [{"step": "register", "id": message_id, "error": str(e)}],
+                "llm_calls": llm_calls,
+                "timings": timings,
+            }
+        timings["register"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        request, error = _draft_request(request, draft_tool)
+        timings["draft"] = time.perf_counter() - start
+        if error is None:
+            _mark_completed(thread_id, message_id, request)
+        return {
+            "requests": [request],
+            "errors": [error] if error is not None else [],
+            "llm_calls": llm_calls + _draft_llm_calls(),
+            "timings": timings,
+        }
+
+    #Un Send por correo, LangGraph los ejecuta en paralelo hasta el limite max_concurrency
+    def route_after_search(state: VacationFanOutState):
+        sends = [Send("process_email", {"message_id": message_id}) for message_id in state["message_ids"]]
+        sends += [
+            Send("process_email", {"message_id": request["message_id"], "request": request})
+            for request in state.get("triaged", [])
+        ]
+        return sends or END
+
+    graph = StateGraph(VacationFanOutState)
+    graph.add_node("search", search)
+    graph.add_node("process_email", process_email)
+    graph.add_edge(START, "search")
+    graph.add_conditional_edges("search", route_after_search, ["process_email", END])
+    graph.add_edge("process_email", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def get_pipeline_concurrency() -> int:
+    """Cantidad de correos que se procesan en paralelo, se configura con PIPELINE_CONCURRENCY (1 = uno tras otro)"""
+    return max(1, int(os.getenv("PIPELINE_CONCURRENCY", "4")))
+
+
+def summarize(state: Dict, elapsed: float) -> Dict:
+    """Resumen de la ejecución para comparar con el modo supervisor"""
+    requests = state.get("requests", [])
+    emails = len(state.get("message_ids", []))
+    return {
+        "emails": emails,
+        "vacation_requests": len(requests),
+        "valid": sum(1 for request in requests if request["valid"]),
+        "invalid": sum(1 for request in requests if not request["valid"]),
+        "drafts": sum(1 for request in requests if "draft" in request),
+        "errors": len(state.get("errors", [])),
+        "llm_calls": state.get("llm_calls", 0),
+        "seconds": round(elapsed, 3),
+        "emails_per_minute": round(emails * 60 / elapsed, 2) if elapsed else 0,
+        "timings": {step: round(seconds, 3) for step, seconds in state.get("timings", {}).items()},
+    }
+
+
+#Esta es la lógica principal del ejemplo
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Pipeline determinístico que procesa las solicitudes de vacaciones")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo los correos nuevos desde la ultima ejecución (historyId de GMail)")
+    parser.add_argument("--query", default=DEFAULT_SEARCH_QUERY, help="Busqueda de GMail de los correos a procesar")
+    parser.add_argument("--max-results", type=int, default=100, help="Cantidad máxima de correos a procesar")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Correos que se procesan en paralelo (por defecto PIPELINE_CONCURRENCY, 1 = uno tras otro)")
+    parser.add_argument("--resume", metavar="THREAD_ID", default=None,
+                        help="Continuar una ejecución interrumpida desde su ultimo checkpoint (SQLite)")
+    options = parser.parse_args(args)
+
+    from dotenv import load_dotenv
+    # Cargar las variables de entorno desde el archivo .env (aca debe ir el API Key del Proveedor del LLM)
+    load_dotenv()
+    concurrency = options.concurrency or get_pipeline_concurrency()
+
+    import json
+
+    #Metricas de cada modelo, herramienta y nodo de los grafos (metricas.py), el resumen se muestra al terminar
+    from metricas import enable_metrics, get_metrics_summary
+    enable_metrics()
+
+    #En modo incremental se usa el estado guardado de la ultima ejecución
+    sync_state = None
+    if options.incremental:
+        from sincronizacion_bandeja import get_inbox_sync_state
+        sync_state = get_inbox_sync_state()
+
+    #Cada ejecución tiene un thread_id, con el que se guardan sus checkpoints y se puede continuar si se interrumpe
+    from puntos_control import new_thread_id, open_checkpointer, run_config
+    from contexto_mensajes import TokenBudgetCallback
+    thread_id = options.resume or new_thread_id()
+    #El callback cuenta los tokens de cada llamada al LLM y detiene la ejecución si se agota RUN_TOKEN_BUDGET
+    token_budget = TokenBudgetCallback.from_env()
+    config = {**run_config(thread_id), "max_concurrency": concurrency, "callbacks": [token_budget]}
+    print(f"thread_id de la ejecución: {thread_id} (para continuarla si se interrumpe: --resume {thread_id})")
+
+    with open_checkpointer() as checkpointer:
+        #Con concurrencia 1 se usa el pipeline secuencial (lectura de correos con peticiones batch)
+        build = build_vacation_fanout_pipeline if concurrency > 1 else build_vacation_pipeline
+        pipeline = build(sync_state, options.query, options.max_results, checkpointer, thread_id)
+
+        #Al continuar, si quedaron pasos pendientes se retoma desde el ultimo checkpoint (entrada None),
+        #si no, se hace una ejecución nueva que omite los correos ya terminados
+        pipeline_input = {"requests": [], "errors": [], "llm_calls": 0, "timings": {}}
+        if options.resume and checkpointer is not None and pipeline.get_state(config).next:
+            pipeline_input = None
+
+        start = time.perf_counter()
+        try:
+            state = pipeline.invoke(pipeline_input, config)
+        except Exception:
+            print(f"Ejecución interrumpida, para continuarla: --resume {thread_id}")
+            print("Tokens de la ejecución:", token_budget.report())
+            print("Metricas de la ejecución:", json.dumps(get_metrics_summary(), ensure_ascii=False, indent=2))
+            raise
+        elapsed = time.perf_counter() - start
+
+    #Se muestra el resultado de cada solicitud y el resumen de la ejecución
+    for request in state.get("requests", []):
+        print(json.dumps(request, ensure_ascii=False, indent=2, default=str))
+    for error in state.get("errors", []):
+        print("Error:", error)
+    from borradores_respuesta import get_draft_stats
+    from cascada_modelos import get_cascade_stats
+    from triaje_correos import get_triage_stats
+    print(json.dumps(
+        {"concurrency": concurrency, **summarize(state, elapsed), "tokens": token_budget.report(),
+         "triage": get_triage_stats(), "cascade": get_cascade_stats(), "drafts": get_draft_stats(),
+         "metrics": get_metrics_summary(len(state.get("requests", [])) or None)},
+        ensure_ascii=False, indent=2,
+    ))
+
+    #Si la ejecución termino bien, se guarda el historyId y los correos procesados,
+    #los correos con errores se vuelven a procesar en la siguiente ejecución
+    if sync_state is not None:
+        sync_state.mark_failed(error["id"] for error in state.get("errors", []) if error.get("id"))
+        print(sync_state.commit())
+
+#Solo se llamará al método principal si se ejecuta este modulo directamente
+if __name__ == "__main__":
+    main()
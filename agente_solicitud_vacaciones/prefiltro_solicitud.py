@@ -0,0 +1,214 @@
+#=======================================================================================
+# Prefiltro local (sin LLM y sin conexión a internet) que se ejecuta antes de validate_pdf.
+# Revisa la firma del archivo (%PDF-), la cantidad de páginas y el texto extraido de las primeras páginas,
+# y calcula un puntaje con palabras clave y con las frases de la plantilla del formato de solicitud de vacaciones.
+# Solo se descartan los documentos que claramente no son solicitudes (tienen texto y no coinciden),
+# los PDFs escaneados (sin texto) o que no se pueden leer se envian al LLM para no perder solicitudes.
+#=======================================================================================
+import os
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+#Palabras clave y su peso para el puntaje (se comparan sin tildes, sin mayusculas y sin espacios)
+DEFAULT_KEYWORDS: Dict[str, float] = {
+    "vacaciones": 2.0,
+    "solicitud": 1.0,
+    "solicito": 1.0,
+    "descanso vacacional": 2.0,
+    "desde la fecha": 0.5,
+    "hasta la fecha": 0.5,
+    "trabajador": 0.5,
+    "firma": 0.5,
+    "atentamente": 0.5,
+}
+
+#Frases del formato de solicitud de vacaciones de la empresa (huella de la plantilla)
+DEFAULT_TEMPLATE_PHRASES: List[str] = [
+    "solicitud de vacaciones",
+    "responsable de vacaciones",
+    "solicito vacaciones desde la fecha",
+    "hasta la fecha",
+    "atentamente",
+    "trabajador",
+]
+
+
+@dataclass
+class PrefilterConfig:
+    """
+    Configuración del prefiltro
+
+    Args:
+        enabled: False para enviar todos los PDFs al LLM
+        min_score: puntaje mínimo de palabras clave para considerar el PDF como posible solicitud
+        template_min_ratio: porcentaje de frases de la plantilla encontradas para aceptar el PDF sin importar el puntaje
+        max_pages: los PDFs con mas páginas se descartan si no coinciden con la plantilla
+        text_pages: cantidad de páginas iniciales de las que se extrae el texto
+        min_text_chars: si se extrae menos texto se asume que es un escaneo y se envia al LLM
+    """
+
+    enabled: bool = True
+    min_score: float = 3.0
+    template_min_ratio: float = 0.5
+    max_pages: int = 10
+    text_pages: int = 3
+    min_text_chars: int = 80
+    keywords: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_KEYWORDS))
+    template_phrases: List[str] = field(default_factory=lambda: list(DEFAULT_TEMPLATE_PHRASES))
+
+    @classmethod
+    def from_env(cls) -> "PrefilterConfig":
+        """Crea la configuración desde las variables de ambiente PREFILTER_*"""
+        return cls(
+            enabled=os.getenv("PREFILTER_ENABLED", "true").lower() in ("1", "true", "yes", "si"),
+            min_score=float(os.getenv("PREFILTER_MIN_SCORE", "3.0")),
+            template_min_ratio=float(os.getenv("PREFILTER_TEMPLATE_MIN_RATIO", "0.5")),
+            max_pages=int(os.getenv("PREFILTER_MAX_PAGES", "10")),
+            text_pages=int(os.getenv("PREFILTER_TEXT_PAGES", "3")),
+            min_text_chars=int(os.getenv("PREFILTER_MIN_TEXT_CHARS", "80")),
+        )
+
+
+@dataclass
+class PrefilterResult:
+    """Resultado del prefiltro, is_candidate indica si el PDF se debe enviar al LLM"""
+
+    is_candidate: bool
+    reason: str
+    pages: int = 0
+    text_chars: int = 0
+    score: float = 0.0
+    template_ratio: float = 0.0
+
+
+def _normalize(text: str) -> str:
+    #Se quitan tildes, mayusculas y espacios (la extracción de texto a veces separa letras: "V ACACIONES")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return "".join(text.lower().split())
+
+
+def score_text(text: str, config: PrefilterConfig) -> tuple:
+    """Devuelve el puntaje de palabras clave y el porcentaje de frases de la plantilla encontradas en el texto"""
+    normalized = _normalize(text)
+    score = sum(weight for keyword, weight in config.keywords.items() if _normalize(keyword) in normalized)
+    phrases = [_normalize(phrase) for phrase in config.template_phrases]
+    template_ratio = sum(1 for phrase in phrases if phrase in normalized) / len(phrases) if phrases else 0.0
+    return score, template_ratio
+
+
+def prefilter_pdf(source, config: Optional[PrefilterConfig] = None) -> PrefilterResult:
+    """
+    Clasifica localmente un PDF como posible solicitud de vacaciones (se envia al LLM) o no (se descarta)
+
+    Args:
+        source: ruta del archivo o archivo abierto en modo binario
+        config: configuración del prefiltro, por defecto se toma de las variables de ambiente
+    """
+    config = config or get_prefilter_config()
+    if not config.enabled:
+        return PrefilterResult(True, "prefiltro deshabilitado")
+
+    #Se revisa la firma del archivo antes de intentar leerlo como PDF
+    if hasattr(source, "read"):
+        source.seek(0)
+        header = source.read(5)
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            header = f.read(5)
+    if header != b"%PDF-":
+        return PrefilterResult(False, "el archivo no tiene el formato PDF")
+
+    try:
+        from pypdf import PdfReader
+
+        reader = PdfReader(source)
+        pages = len(reader.pages)
+        text = "\n".join((page.extract_text() or "") for page in reader.pages[:config.text_pages])
+    except Exception as e:
+        #Si no se puede leer (cifrado, dañado, etc.) se deja la decisión al LLM
+        return PrefilterResult(True, f"no se pudo leer el PDF localmente ({type(e).__name__})")
+
+    text_chars = len(text.strip())
+    if text_chars < config.min_text_chars:
+        return PrefilterResult(True, "el PDF no tiene texto suficiente (posible escaneo)", pages, text_chars)
+
+    score, template_ratio = score_text(text, config)
+    result = PrefilterResult(False, "", pages, text_chars, score, round(template_ratio, 4))
+    if template_ratio >= config.template_min_ratio:
+        result.is_candidate, result.reason = True, "coincide con la plantilla de solicitud de vacaciones"
+    elif pages > config.max_pages:
+        result.reason = f"tiene mas de {config.max_pages} páginas y no coincide con la plantilla de solicitud de vacaciones"
+    elif score >= config.min_score:
+        result.is_candidate, result.reason = True, "contiene palabras clave de solicitud de vacaciones"
+    else:
+        result.reason = "no contiene palabras clave de solicitud de vacaciones"
+    return result
+
+
+_config: Optional[PrefilterConfig] = None
+_stats_lock = threading.Lock()
+_stats: Dict = {"checked": 0, "forwarded": 0, "rejected": 0, "rejected_by_reason": {}}
+
+
+def get_prefilter_config() -> PrefilterConfig:
+    """Devuelve la configuración del prefiltro del proceso (se lee una vez de las variables de ambiente)"""
+    global _config
+    if _config is None:
+        _config = PrefilterConfig.from_env()
+    return _config
+
+
+def set_prefilter_config(config: PrefilterConfig) -> None:
+    """Reemplaza la configuración del prefiltro del proceso"""
+    global _config
+    _config = config
+
+
+def record_prefilter_result(result: PrefilterResult) -> None:
+    """Registra el resultado en los contadores, cada PDF descartado es una llamada al LLM ahorrada"""
+    with _stats_lock:
+        _stats["checked"] += 1
+        if result.is_candidate:
+            _stats["forwarded"] += 1
+        else:
+            _stats["rejected"] += 1
+            by_reason = _stats["rejected_by_reason"]
+            by_reason[result.reason] = by_reason.get(result.reason, 0) + 1
+
+
+def get_prefilter_stats() -> Dict:
+    """Devuelve cuantos PDFs se revisaron, cuantos se enviaron al LLM y cuantas llamadas al LLM se ahorraron"""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["rejected_by_reason"] = dict(_stats["rejected_by_reason"])
+    stats["llm_calls_saved"] = stats["rejected"]
+    return stats
+
+
+_REJECTION_PREFIX = "El archivo PDF no es una solicitud de vacaciones ("
+
+
+def rejection_message(result: PrefilterResult) -> str:
+    """Texto que devuelve validate_pdf cuando el prefiltro descarta el PDF"""
+    return f"{_REJECTION_PREFIX}{result.reason})"
+
+
+def is_rejection_message(text: str) -> bool:
+    """True si el texto devuelto por validate_pdf es un rechazo del prefiltro (no lo redactó el LLM)"""
+    return isinstance(text, str) and text.startswith(_REJECTION_PREFIX)
+
+
+def check_pdf(source) -> Optional[str]:
+    """
+    Ejecuta el prefiltro y registra el resultado, devuelve el texto de rechazo o None si el PDF se debe enviar al LLM
+
+    Args:
+        source: ruta del archivo o archivo abierto en modo binario
+    """
+    result = prefilter_pdf(source)
+    record_prefilter_result(result)
+    return None if result.is_candidate else rejection_message(result)
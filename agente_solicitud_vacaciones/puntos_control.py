@@ -0,0 +1,183 @@
+#=======================================================================================
+# Checkpoints persistentes (SQLite) para continuar una ejecución interrumpida en lugar de empezar de nuevo.
+# Si una ejecución larga falla (error, cuota del proveedor o recursion_limit), el estado del grafo ya está guardado
+# y con --resume <thread_id> se continúa desde el ultimo paso, sin volver a pagar las llamadas al LLM ya hechas.
+# Además se guarda una marca por cada correo terminado, para que al continuar no se vuelvan a procesar.
+#=======================================================================================
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def get_checkpoint_path() -> str:
+    """Ruta del archivo SQLite de checkpoints (variable CHECKPOINT_DB_PATH, vacia para no guardar checkpoints)"""
+    return os.getenv("CHECKPOINT_DB_PATH", "./cache/checkpoints.sqlite")
+
+
+@contextmanager
+def open_checkpointer(db_path: Optional[str] = None):
+    """
+    Abre el checkpointer SQLite para los grafos sincronos (invoke/stream), devuelve None si esta deshabilitado
+
+    Args:
+        db_path: ruta del archivo SQLite, por defecto CHECKPOINT_DB_PATH
+    """
+    db_path = get_checkpoint_path() if db_path is None else db_path
+    if not db_path:
+        yield None
+        return
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    #Los nodos en paralelo de LangGraph guardan desde otros hilos, SqliteSaver usa su propio lock
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        yield SqliteSaver(conn)
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def open_async_checkpointer(db_path: Optional[str] = None):
+    """
+    Abre el checkpointer SQLite para los grafos asincronos (ainvoke/astream), devuelve None si esta deshabilitado
+
+    Args:
+        db_path: ruta del archivo SQLite, por defecto CHECKPOINT_DB_PATH
+    """
+    db_path = get_checkpoint_path() if db_path is None else db_path
+    if not db_path:
+        yield None
+        return
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(db_path) as saver:
+        yield saver
+
+
+def new_thread_id() -> str:
+    """Identificador de una ejecución nueva, se usa con --resume para continuarla"""
+    return uuid.uuid4().hex
+
+
+def run_config(thread_id: str, recursion_limit: int = 100) -> Dict:
+    """Configuración de la ejecución del grafo con el thread_id del checkpoint"""
+    return {"configurable": {"thread_id": thread_id}, "recursion_limit": recursion_limit}
+
+
+class EmailCompletionLog:
+    """
+    Marcas de los correos terminados en cada ejecución (thread_id), para no volver a procesarlos al continuar
+
+    Args:
+        db_path: ruta del archivo SQLite
+    """
+
+    def __init__(self, db_path: str = "./cache/checkpoints.sqlite"):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS email_completion (
+                thread_id TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                result TEXT,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, message_id)
+            )"""
+        )
+        self._conn.commit()
+
+    def mark_completed(self, thread_id: str, message_id: str, result: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO email_completion (thread_id, message_id, result, completed_at) VALUES (?, ?, ?, ?)",
+                (thread_id, message_id, result, time.time()),
+            )
+            self._conn.commit()
+
+    def completed_ids(self, thread_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id FROM email_completion WHERE thread_id = ? ORDER BY completed_at", (thread_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+_completion_log: Optional[EmailCompletionLog] = None
+_completion_lock = threading.Lock()
+
+
+def get_completion_log() -> EmailCompletionLog:
+    """Devuelve las marcas de correos terminados del proceso (en el mismo archivo que los checkpoints)"""
+    global _completion_log
+    with _completion_lock:
+        if _completion_log is None:
+            _completion_log = EmailCompletionLog(get_checkpoint_path() or ":memory:")
+        return _completion_log
+
+
+def make_mark_email_completed_tool(thread_id: str):
+    """Crea la herramienta con la que el agente marca cada correo como terminado en la ejecución thread_id"""
+    from langchain_core.tools import tool
+
+    @tool
+    def mark_email_completed(message_id: str, resultado: str) -> str:
+        """Marca un correo como procesado por completo (despues de registrar la solicitud y crear el borrador de respuesta)
+
+        Args:
+            message_id: ID del correo procesado
+            resultado: resumen corto del resultado, por ejemplo "válida, registrada con id 3" o "inválida, sin PDF"
+        """
+        get_completion_log().mark_completed(thread_id, message_id, resultado)
+        return f"Correo {message_id} marcado como procesado"
+
+    return mark_email_completed
+
+
+def resume_instruction(action: str, completed_ids: List[str]) -> str:
+    """Instrucción para continuar una ejecución terminada o que no se puede retomar desde el ultimo paso"""
+    instruction = f"{action} las posibles solicitudes de vacaciones que quedaron pendientes en la ejecución anterior."
+    if completed_ids:
+        instruction += " Estos correos ya fueron procesados, no volver a procesarlos: " + ", ".join(completed_ids)
+    return instruction
+
+
+def resume_input(graph, config: Dict, action: str, thread_id: str):
+    """
+    Devuelve la entrada para continuar la ejecución thread_id: None si el grafo tiene pasos pendientes
+    (continúa desde el checkpoint), o un mensaje nuevo con los correos ya terminados si la ejecución habia finalizado
+
+    Args:
+        graph: grafo compilado con checkpointer
+        config: configuración de la ejecución (run_config)
+        action: verbo de la instrucción ("Buscar" o "Procesar")
+        thread_id: identificador de la ejecución a continuar
+    """
+    from langchain_core.messages import HumanMessage
+
+    if graph.checkpointer is None:
+        raise ValueError("No se puede continuar la ejecución sin checkpoints, revisar la variable CHECKPOINT_DB_PATH")
+    if graph.get_state(config).next:
+        return None
+    completed_ids = get_completion_log().completed_ids(thread_id)
+    return {"messages": [HumanMessage(resume_instruction(action, completed_ids))]}
+
+
+async def aresume_input(graph, config: Dict, action: str, thread_id: str):
+    """Igual que resume_input, para los grafos con checkpointer asincrono"""
+    from langchain_core.messages import HumanMessage
+
+    if graph.checkpointer is None:
+        raise ValueError("No se puede continuar la ejecución sin checkpoints, revisar la variable CHECKPOINT_DB_PATH")
+    if (await graph.aget_state(config)).next:
+        return None
+    completed_ids = get_completion_log().completed_ids(thread_id)
+    return {"messages": [HumanMessage(resume_instruction(action, completed_ids))]}
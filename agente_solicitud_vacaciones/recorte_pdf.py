@@ -0,0 +1,244 @@
+#=======================================================================================
+# Reducción del PDF antes de enviarlo al LLM.
+# El formato de solicitud de vacaciones es de una página, pero a veces se adjuntan escaneos o documentos largos,
+# aca se arma un PDF nuevo (en memoria) solo con las páginas que coinciden con el formato (o las primeras N páginas)
+# y opcionalmente se reduce la resolución de las imagenes, asi el costo en tokens depende del formato y no del adjunto.
+# El archivo original no se modifica.
+#=======================================================================================
+import hashlib
+import io
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class TrimConfig:
+    """
+    Configuración de la reducción de PDFs
+
+    Args:
+        enabled: False para enviar el PDF completo al LLM
+        max_pages: cantidad máxima de páginas que se envian al LLM
+        only_matching_pages: True para enviar solo las páginas que coinciden con el formato de solicitud
+            (si ninguna coincide, por ejemplo en un escaneo, se envian las primeras páginas)
+        scan_pages: cantidad de páginas iniciales en las que se busca el formato
+        downsample_images: True para reducir la resolución de las imagenes (necesita Pillow)
+        image_max_side: tamaño máximo en pixeles del lado mayor de cada imagen
+        image_quality: calidad JPEG de las imagenes reducidas
+    """
+
+    enabled: bool = True
+    max_pages: int = 2
+    only_matching_pages: bool = True
+    scan_pages: int = 10
+    downsample_images: bool = False
+    image_max_side: int = 1600
+    image_quality: int = 75
+
+    @classmethod
+    def from_env(cls) -> "TrimConfig":
+        """Crea la configuración desde las variables de ambiente PDF_TRIM_*"""
+        def as_bool(value: str) -> bool:
+            return value.lower() in ("1", "true", "yes", "si")
+
+        return cls(
+            enabled=as_bool(os.getenv("PDF_TRIM_ENABLED", "true")),
+            max_pages=int(os.getenv("PDF_TRIM_MAX_PAGES", "2")),
+            only_matching_pages=as_bool(os.getenv("PDF_TRIM_ONLY_MATCHING_PAGES", "true")),
+            scan_pages=int(os.getenv("PDF_TRIM_SCAN_PAGES", "10")),
+            downsample_images=as_bool(os.getenv("PDF_TRIM_DOWNSAMPLE_IMAGES", "false")),
+            image_max_side=int(os.getenv("PDF_TRIM_IMAGE_MAX_SIDE", "1600")),
+            image_quality=int(os.getenv("PDF_TRIM_IMAGE_QUALITY", "75")),
+        )
+
+
+@dataclass
+class TrimResult:
+    """Resultado de la reducción, data es None si se debe enviar el PDF original"""
+
+    data: Optional[bytes]
+    reason: str
+    original_bytes: int = 0
+    trimmed_bytes: int = 0
+    original_pages: int = 0
+    trimmed_pages: int = 0
+    kept_pages: Optional[List[int]] = None
+
+
+def _source_size(source) -> int:
+    if hasattr(source, "read"):
+        size = source.seek(0, io.SEEK_END)
+        source.seek(0)
+        return size
+    return os.path.getsize(source)
+
+
+def _select_pages(reader, config: TrimConfig) -> List[int]:
+    """Devuelve los indices de las páginas que se envian al LLM"""
+    total_pages = len(reader.pages)
+    if config.only_matching_pages:
+        from prefiltro_solicitud import get_prefilter_config, score_text
+
+        prefilter_config = get_prefilter_config()
+        matching = []
+        for index in range(min(total_pages, config.scan_pages)):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception:
+                text = ""
+            score, template_ratio = score_text(text, prefilter_config)
+            if template_ratio >= prefilter_config.template_min_ratio or score >= prefilter_config.min_score:
+                matching.append(index)
+            if len(matching) >= config.max_pages:
+                break
+        if matching:
+            return matching
+    return list(range(min(total_pages, config.max_pages)))
+
+
+def _downsample_images(writer, config: TrimConfig) -> None:
+    for page in writer.pages:
+        for image in page.images:
+            pil_image = image.image
+            if max(pil_image.size) <= config.image_max_side:
+                continue
+            pil_image.thumbnail((config.image_max_side, config.image_max_side))
+            if pil_image.mode not in ("RGB", "L"):
+                pil_image = pil_image.convert("RGB")
+            image.replace(pil_image, quality=config.image_quality)
+
+
+def trim_pdf(source, config: Optional[TrimConfig] = None) -> TrimResult:
+    """
+    Arma un PDF reducido con las páginas del formato de solicitud de vacaciones, sin modificar el original
+
+    Args:
+        source: ruta del archivo o archivo abierto en modo binario
+        config: configuración de la reducción, por defecto se toma de las variables de ambiente
+    """
+    config = config or get_trim_config()
+    original_bytes = _source_size(source)
+    if not config.enabled:
+        return _record(TrimResult(None, "reducción deshabilitada", original_bytes, original_bytes))
+
+    try:
+        from pypdf import PdfReader, PdfWriter
+
+        reader = PdfReader(source)
+        original_pages = len(reader.pages)
+        if original_pages <= config.max_pages and not config.downsample_images:
+            return _record(TrimResult(None, "el PDF no supera la cantidad máxima de páginas",
+                                      original_bytes, original_bytes, original_pages, original_pages))
+
+        kept_pages = _select_pages(reader, config)
+        writer = PdfWriter()
+        for index in kept_pages:
+            writer.add_page(reader.pages[index])
+
+        reason = f"se enviaran {len(kept_pages)} de {original_pages} páginas"
+        if config.downsample_images:
+            try:
+                _downsample_images(writer, config)
+                reason += ", con imagenes reducidas"
+            except ImportError:
+                #Pillow es opcional, sin Pillow solo se recortan las páginas
+                reason += ", sin reducir imagenes (falta instalar Pillow)"
+
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        output = io.BytesIO()
+        writer.write(output)
+        data = output.getvalue()
+    except Exception as e:
+        #Si no se puede reducir se envia el PDF original
+        return _record(TrimResult(None, f"no se pudo reducir el PDF ({type(e).__name__})", original_bytes, original_bytes))
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+    if len(data) >= original_bytes and len(kept_pages) == original_pages:
+        return _record(TrimResult(None, "el PDF reducido no es mas pequeño que el original",
+                                  original_bytes, original_bytes, original_pages, original_pages))
+    return _record(TrimResult(data, reason, original_bytes, len(data), original_pages, len(kept_pages), kept_pages))
+
+
+_config: Optional[TrimConfig] = None
+_stats_lock = threading.Lock()
+_stats: Dict = {
+    "documents": 0,
+    "trimmed": 0,
+    "original_bytes": 0,
+    "sent_bytes": 0,
+    "original_pages": 0,
+    "sent_pages": 0,
+    "last": None,
+}
+
+
+def get_trim_config() -> TrimConfig:
+    """Devuelve la configuración de la reducción del proceso (se lee una vez de las variables de ambiente)"""
+    global _config
+    if _config is None:
+        _config = TrimConfig.from_env()
+    return _config
+
+
+def get_trim_cache_tag(config: Optional[TrimConfig] = None) -> str:
+    """
+    Devuelve una etiqueta corta de la configuración de la reducción para la llave de la cache de validaciones,
+    con otra configuración el LLM recibe otro PDF y no se debe usar el resultado guardado
+
+    Args:
+        config: configuración de la reducción, por defecto la del proceso
+    """
+    config = config or get_trim_config()
+    if not config.enabled:
+        return "sin_recorte"
+    settings = asdict(config)
+    if config.only_matching_pages:
+        #Las páginas del formato se eligen con los puntajes del prefiltro
+        from prefiltro_solicitud import get_prefilter_config
+        prefilter_config = get_prefilter_config()
+        settings["prefilter"] = {
+            "min_score": prefilter_config.min_score,
+            "template_min_ratio": prefilter_config.template_min_ratio,
+            "keywords": prefilter_config.keywords,
+            "template_phrases": prefilter_config.template_phrases,
+        }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def set_trim_config(config: TrimConfig) -> None:
+    """Reemplaza la configuración de la reducción del proceso"""
+    global _config
+    _config = config
+
+
+def _record(result: TrimResult) -> TrimResult:
+    #Se acumulan los bytes y páginas antes y despues de reducir
+    with _stats_lock:
+        _stats["documents"] += 1
+        _stats["trimmed"] += 1 if result.data is not None else 0
+        _stats["original_bytes"] += result.original_bytes
+        _stats["sent_bytes"] += result.trimmed_bytes
+        _stats["original_pages"] += result.original_pages
+        _stats["sent_pages"] += result.trimmed_pages
+        _stats["last"] = {
+            "reason": result.reason,
+            "original_bytes": result.original_bytes,
+            "trimmed_bytes": result.trimmed_bytes,
+            "original_pages": result.original_pages,
+            "trimmed_pages": result.trimmed_pages,
+            "kept_pages": result.kept_pages,
+        }
+    return result
+
+
+def get_trim_stats() -> Dict:
+    """Devuelve los bytes y páginas de los PDFs antes y despues de reducirlos"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["saved_bytes"] = stats["original_bytes"] - stats["sent_bytes"]
+    return stats
@@ -0,0 +1,158 @@
+#=======================================================================================
+# Recursos del API de GMail por hilo.
+# El recurso de googleapiclient usa httplib2, que no es thread-safe: si varios hilos lo usan a la vez
+# las respuestas se pueden mezclar o fallar. Para procesar correos en paralelo cada hilo (worker)
+# obtiene su propio recurso y cliente HTTP, todos con las mismas credenciales.
+# Los agentes, el supervisor y el pipeline secuencial comparten un solo recurso del proceso (get_gmail_toolkit),
+# antes cada agente creaba su GmailToolkit y volvia a cargar las credenciales. Ese recurso envia cada petición
+# con el cliente HTTP del hilo que la hace, asi los agentes pueden llamar a varias herramientas en paralelo.
+# Los recursos se crean desde el documento de discovery de GMail leido una sola vez (el incluido en
+# googleapiclient o el archivo de GMAIL_DISCOVERY_DOC_PATH), sin consultar el servicio de discovery.
+#=======================================================================================
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+_local = threading.local()
+_lock = threading.Lock()
+_http_factory: Dict[str, Callable] = {}
+_credentials: Dict = {}
+_discovery: Dict = {}
+_shared: Dict = {}
+_stats = {"resources": 0, "discovery": None}
+
+
+def _get_credentials():
+    #Las credenciales (token.json) se leen una sola vez y se comparten entre los hilos
+    with _lock:
+        if "credentials" not in _credentials:
+            from langchain_google_community.gmail.utils import get_gmail_credentials
+            _credentials["credentials"] = get_gmail_credentials()
+        return _credentials["credentials"]
+
+
+def _get_discovery_document() -> Optional[Dict]:
+    #El documento de discovery se lee y se convierte una sola vez, luego cada recurso se crea desde el mismo diccionario
+    with _lock:
+        if "document" not in _discovery:
+            import json
+            path = os.getenv("GMAIL_DISCOVERY_DOC_PATH", "")
+            if path:
+                with open(path, encoding="utf-8") as f:
+                    _discovery["document"], _stats["discovery"] = json.load(f), "file"
+            else:
+                from googleapiclient.discovery_cache import get_static_doc
+                document = get_static_doc("gmail", "v1")
+                #Si la versión de googleapiclient no incluye el documento, se usa el discovery normal
+                _discovery["document"] = json.loads(document) if document else None
+                _stats["discovery"] = "static" if document else "service"
+        return _discovery["document"]
+
+
+def _build_http():
+    http_factory = _http_factory.get("factory")
+    if http_factory is not None:
+        #Cliente HTTP reemplazado (API de GMail simulado del benchmark offline), no se usan credenciales
+        return http_factory()
+    import google_auth_httplib2
+    from googleapiclient.http import build_http
+    return google_auth_httplib2.AuthorizedHttp(_get_credentials(), http=build_http())
+
+
+class _ThreadLocalHttp:
+    """Cliente HTTP que envia cada petición con un cliente propio del hilo que la hace (httplib2 no es thread-safe)"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = _build_http()
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    @property
+    def credentials(self):
+        #googleapiclient lee las credenciales del cliente HTTP para autorizar cada petición de un batch
+        return getattr(self._http(), "credentials", None)
+
+    def close(self):
+        http = getattr(self._local, "http", None)
+        if http is not None and hasattr(http, "close"):
+            http.close()
+
+
+def build_api_resource(thread_safe: bool = False):
+    """
+    Crea un recurso nuevo del API de GMail con su propio cliente HTTP
+
+    Args:
+        thread_safe: True para que cada hilo que use el recurso envie sus peticiones con su propio cliente HTTP
+    """
+    document = _get_discovery_document()
+    http = _ThreadLocalHttp() if thread_safe else _build_http()
+    if document is not None:
+        from googleapiclient.discovery import build_from_document
+        resource = build_from_document(document, http=http)
+    else:
+        from googleapiclient.discovery import build
+        resource = build("gmail", "v1", http=http)
+    with _lock:
+        _stats["resources"] += 1
+    return resource
+
+
+def set_http_factory(factory: Optional[Callable] = None) -> None:
+    """
+    Reemplaza el cliente HTTP de los recursos del API de GMail, por ejemplo por el API simulado del benchmark offline
+    (gmail_simulado.py). Se descartan el recurso y el toolkit compartidos ya creados
+
+    Args:
+        factory: función sin argumentos que crea el cliente HTTP de cada recurso (con el metodo request de httplib2),
+            None para volver a usar las credenciales
+    """
+    with _lock:
+        _shared.clear()
+        if factory is None:
+            _http_factory.pop("factory", None)
+        else:
+            _http_factory["factory"] = factory
+
+
+def get_api_resource():
+    """Devuelve el recurso del API de GMail compartido por los agentes del proceso (se puede usar desde varios hilos)"""
+    resource = _shared.get("api_resource")
+    if resource is None:
+        resource = build_api_resource(thread_safe=True)
+        with _lock:
+            resource = _shared.setdefault("api_resource", resource)
+    return resource
+
+
+def get_gmail_toolkit():
+    """Devuelve el GmailToolkit compartido del proceso, creado con el recurso de get_api_resource"""
+    toolkit = _shared.get("toolkit")
+    if toolkit is None:
+        from langchain_google_community import GmailToolkit
+        toolkit = GmailToolkit(api_resource=get_api_resource())
+        with _lock:
+            toolkit = _shared.setdefault("toolkit", toolkit)
+    return toolkit
+
+
+def get_thread_api_resource():
+    """Devuelve el recurso del API de GMail del hilo actual, creandolo la primera vez que se usa en el hilo"""
+    resource = getattr(_local, "api_resource", None)
+    if resource is None:
+        resource = build_api_resource()
+        _local.api_resource = resource
+    return resource
+
+
+def get_api_resource_stats() -> Dict:
+    """Devuelve la cantidad de recursos del API de GMail creados (uno compartido y uno por hilo que los usó) y el origen del discovery"""
+    with _lock:
+        return dict(_stats)
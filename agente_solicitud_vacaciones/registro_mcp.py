@@ -0,0 +1,267 @@
+#=======================================================================================
+# Registro de solicitudes de vacaciones por MCP sin LLM.
+# Antes, en cada registro se creaba un cliente MCP nuevo, se volvian a obtener las herramientas,
+# se creaba un agente ReAct y el LLM tenia que crear la tabla (si no existia) y redactar el INSERT.
+# Aca se abre una sola sesión MCP al iniciar, se crea la tabla una sola vez y cada registro
+# llama directamente a la herramienta SQL del servidor con un INSERT parametrizado.
+# Se puede probar con el servidor MCP local respaldado por SQLite (servidor_mcp_sqlite.py).
+#=======================================================================================
+import ast
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+#Creación de la tabla según el motor de base de datos del servidor MCP
+SCHEMA_SQL = {
+    "postgres": """CREATE TABLE IF NOT EXISTS solicitud_vacaciones (
+        solicitud_vacacion_id SERIAL PRIMARY KEY,
+        fecha_registro_solicitud TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        message_id VARCHAR(36) NOT NULL,
+        nombre_solicitante VARCHAR(100),
+        fecha_solicitud TIMESTAMP
+    )""",
+    "sqlite": """CREATE TABLE IF NOT EXISTS solicitud_vacaciones (
+        solicitud_vacacion_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_registro_solicitud TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        message_id VARCHAR(36) NOT NULL,
+        nombre_solicitante VARCHAR(100),
+        fecha_solicitud TEXT
+    )""",
+}
+
+#message_id es único: si el correo ya fue registrado no se inserta y se obtiene el registro existente
+UNIQUE_INDEX_SQL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS solicitud_vacaciones_message_id ON solicitud_vacaciones (message_id)"
+)
+
+#Las tablas creadas por versiones anteriores (sin el indice) pueden tener correos registrados mas de una vez,
+#en ese caso el indice no se puede crear y antes hay que dejar un solo registro por message_id
+DUPLICATES_SQL = (
+    "SELECT message_id, COUNT(*) AS registros FROM solicitud_vacaciones "
+    "GROUP BY message_id HAVING COUNT(*) > 1 LIMIT 5"
+)
+
+#Migración sugerida: conserva el primer registro de cada correo (funciona en postgres y en sqlite)
+DEDUPLICATE_SQL = (
+    "DELETE FROM solicitud_vacaciones WHERE solicitud_vacacion_id NOT IN "
+    "(SELECT MIN(solicitud_vacacion_id) FROM solicitud_vacaciones GROUP BY message_id)"
+)
+
+INSERT_SQL = (
+    "INSERT INTO solicitud_vacaciones (message_id, nombre_solicitante, fecha_solicitud) VALUES ({0}, {1}, {2}) "
+    "ON CONFLICT (message_id) DO NOTHING RETURNING solicitud_vacacion_id, fecha_registro_solicitud"
+)
+
+SELECT_SQL = (
+    "SELECT solicitud_vacacion_id, fecha_registro_solicitud FROM solicitud_vacaciones WHERE message_id = {0}"
+)
+
+#Marcadores de parametros según el motor de base de datos
+PLACEHOLDERS = {"postgres": ("%s", "%s", "%s"), "sqlite": ("?", "?", "?")}
+
+
+def get_mcp_sql_connection() -> Dict:
+    """Configuración de la conexión al servidor MCP de base de datos (variables MCP_SQL_*)"""
+    if os.getenv("MCP_SQL_TRANSPORT") == "stdio":
+        import sys
+        #El servidor MCP local (servidor_mcp_sqlite.py) se ejecuta como subproceso
+        return {
+            "command": sys.executable,
+            "args": [os.getenv("MCP_SQL_SERVER_SCRIPT", "servidor_mcp_sqlite.py"), "--transport", "stdio"],
+            "transport": "stdio",
+            #El subproceso solo recibe las variables de configuración del servidor local
+            "env": {k: v for k, v in os.environ.items() if k.startswith("MCP_SQLITE_")},
+        }
+    return {
+        "url": os.getenv("MCP_SQL_SERVER_URL", "http://localhost:8000/sse/"),
+        "transport": os.getenv("MCP_SQL_TRANSPORT", "sse"),
+        #Puedes enviar encabezados, por ejemplo en caso tenga autorización
+        "headers": {
+            "Authorization": f"Bearer {os.getenv('MCP_SQL_TOKEN', 'TU_TOKEN')}",
+        },
+    }
+
+
+def _sql_literal(value) -> str:
+    #Solo se usa si la herramienta del servidor no acepta parametros (ejemplo: postgres-mcp)
+    if value is None:
+        return "NULL"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _decode_tool_result(result):
+    #Devuelve el resultado de la herramienta SQL (JSON o representación de Python) y su texto
+    text = "".join(getattr(content, "text", "") for content in result.content)
+    if result.isError:
+        raise RuntimeError(f"Error del servidor MCP: {text}")
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            return parse(text), text
+        except (ValueError, SyntaxError):
+            continue
+    return None, text
+
+
+def _parse_tool_result(result) -> Optional[Dict]:
+    """Obtiene el registro del resultado de la herramienta SQL (JSON o representación de Python), None si no hay filas"""
+    data, text = _decode_tool_result(result)
+    if isinstance(data, list):
+        if not data:
+            return None
+        data = data[0]
+    if not isinstance(data, dict):
+        raise RuntimeError(f"Respuesta inesperada del servidor MCP: {text}")
+    return {
+        "solicitud_vacacion_id": str(data["solicitud_vacacion_id"]),
+        "fecha_registro_solicitud": str(data["fecha_registro_solicitud"]),
+    }
+
+
+class MCPRegistrationBackend:
+    """
+    Registro de solicitudes de vacaciones con una sesión MCP persistente y llamadas directas a la herramienta SQL
+
+    Args:
+        connection: conexión al servidor MCP (formato de MultiServerMCPClient), por defecto las variables MCP_SQL_*
+        tool_name: nombre de la herramienta que ejecuta SQL en el servidor
+        dialect: motor de base de datos del servidor ("postgres" o "sqlite")
+    """
+
+    def __init__(self, connection: Optional[Dict] = None, tool_name: Optional[str] = None, dialect: Optional[str] = None):
+        self.connection = connection or get_mcp_sql_connection()
+        self.tool_name = tool_name or os.getenv("MCP_SQL_TOOL", "execute_sql")
+        self.dialect = dialect or os.getenv("MCP_SQL_DIALECT", "postgres")
+        self._session_task: Optional[asyncio.Task] = None
+        self._session = None
+        self._accepts_params = False
+        self._lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        self._latencies: List[float] = []
+        self._stats: Dict = {"connect_seconds": None, "schema_seconds": None, "registrations": 0, "errors": 0}
+
+    async def start(self) -> None:
+        """Abre la sesión MCP y crea la tabla solicitud_vacaciones si no existe (una sola vez)"""
+        async with self._start_lock:
+            if self._session is None:
+                await self._start()
+
+    async def _start(self) -> None:
+        start = time.perf_counter()
+        #La sesión MCP se mantiene abierta en una tarea propia (anyio exige que se cierre en la misma tarea que la abrió)
+        self._started = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._session_task = asyncio.create_task(self._run_session())
+        self._session = await self._started
+
+        #Se revisa una sola vez si la herramienta SQL acepta parametros
+        tools = await self._session.list_tools()
+        tool = next((t for t in tools.tools if t.name == self.tool_name), None)
+        if tool is None:
+            await self.close()
+            raise RuntimeError(f"El servidor MCP no tiene la herramienta {self.tool_name}")
+        self._accepts_params = "params" in (tool.inputSchema or {}).get("properties", {})
+        self._stats["connect_seconds"] = round(time.perf_counter() - start, 4)
+
+        start = time.perf_counter()
+        await self._call_sql(SCHEMA_SQL[self.dialect])
+        await self._check_duplicates()
+        await self._call_sql(UNIQUE_INDEX_SQL)
+        self._stats["schema_seconds"] = round(time.perf_counter() - start, 4)
+
+    async def _check_duplicates(self) -> None:
+        #Sin esta revisión, en una tabla con correos repetidos la creación del indice falla sin explicar la causa
+        data, _ = _decode_tool_result(await self._call_sql(DUPLICATES_SQL))
+        #Sin filas postgres-mcp responde un texto ("No results") en lugar de una lista
+        duplicates = data if isinstance(data, list) else []
+        if duplicates:
+            await self.close()
+            examples = ", ".join(f"{row['message_id']} ({row['registros']} registros)" for row in duplicates)
+            raise RuntimeError(
+                "No se puede crear el indice único de message_id: la tabla solicitud_vacaciones tiene correos "
+                f"registrados mas de una vez, por ejemplo {examples}. Deje un solo registro por correo antes de "
+                f"volver a ejecutar, por ejemplo con: {DEDUPLICATE_SQL}"
+            )
+
+    async def _run_session(self) -> None:
+        from langchain_mcp_adapters.client import MultiServerMCPClient
+
+        client = MultiServerMCPClient({"sql": self.connection})
+        try:
+            async with client.session("sql") as session:
+                self._started.set_result(session)
+                await self._closing.wait()
+        except BaseException as e:
+            if not self._started.done():
+                self._started.set_exception(e)
+            else:
+                raise
+
+    async def close(self) -> None:
+        """Cierra la sesión MCP"""
+        if self._session_task is not None:
+            self._closing.set()
+            await self._session_task
+        self._session_task = None
+        self._session = None
+
+    async def _call_sql(self, sql: str, params: Optional[List] = None):
+        arguments = {"sql": sql}
+        if params is not None:
+            arguments["params"] = params
+        from metricas import KIND_TOOL, measure
+
+        #La sesión MCP se comparte, las llamadas se envian una a la vez (la metrica incluye la espera del lock)
+        with measure(KIND_TOOL, f"mcp:{self.tool_name}"):
+            async with self._lock:
+                return await self._session.call_tool(self.tool_name, arguments)
+
+    async def _execute(self, sql_template: str, values: List):
+        #Con parametros si la herramienta los acepta, si no con los valores escapados en el texto SQL
+        if self._accepts_params:
+            return await self._call_sql(sql_template.format(*PLACEHOLDERS[self.dialect][:len(values)]), values)
+        return await self._call_sql(sql_template.format(*(_sql_literal(v) for v in values)))
+
+    async def register(self, message_id: str, nombre_solicitante: str, fecha_solicitud) -> Dict:
+        """Inserta la solicitud (si el correo no fue registrado antes) y devuelve solicitud_vacacion_id y fecha_registro_solicitud"""
+        await self.start()
+        values = [message_id, nombre_solicitante, str(fecha_solicitud) if fecha_solicitud is not None else None]
+        start = time.perf_counter()
+        try:
+            registration = _parse_tool_result(await self._execute(INSERT_SQL, values))
+            already_registered = registration is None
+            if already_registered:
+                registration = _parse_tool_result(await self._execute(SELECT_SQL, values[:1]))
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        latency = time.perf_counter() - start
+        self._latencies.append(latency)
+        self._stats["registrations"] += 1
+        return {**registration, "registrado_previamente": already_registered, "latency_ms": round(latency * 1000, 2)}
+
+    def stats(self) -> Dict:
+        """Devuelve la latencia de cada registro (promedio, p50, p95, máximo) y el tiempo de conexión y de creación de la tabla"""
+        latencies = sorted(self._latencies)
+        stats = dict(self._stats)
+        if latencies:
+            stats["latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2),
+                "last": round(self._latencies[-1] * 1000, 2),
+            }
+        return stats
+
+
+_backend: Optional[MCPRegistrationBackend] = None
+
+
+def get_registration_backend() -> MCPRegistrationBackend:
+    """Devuelve el backend de registro del proceso (la sesión MCP se abre con el primer registro o con start())"""
+    global _backend
+    if _backend is None:
+        _backend = MCPRegistrationBackend()
+    return _backend
@@ -0,0 +1,163 @@
+#=======================================================================================
+# Registro de chat models compartidos por todo el proceso.
+# init_chat_model crea un cliente nuevo (credenciales, cliente HTTP, conexiones) en cada llamada,
+# con este registro cada combinación de proveedor + modelo + parámetros se crea una sola vez y se reutiliza
+# en validate_pdf, en los agentes, en el supervisor y en el registro por MCP.
+# Los modelos de OpenAI comparten un pool de conexiones HTTP keep-alive (httpx),
+# los de Gemini reutilizan el cliente (y su canal) creado con la instancia del modelo.
+# Cada modelo pasa sus llamadas por el limitador de uso de su proveedor y modelo (limite_uso.py).
+#=======================================================================================
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+_lock = threading.Lock()
+_factory: Dict[str, Callable] = {}
+_models: Dict[Tuple, object] = {}
+_model_stats: Dict[Tuple, Dict] = {}
+_http_clients: Dict[str, object] = {}
+_http_requests = {"count": 0}
+_http_requests_lock = threading.Lock()
+
+
+def _split_model(model: str, model_provider: Optional[str]) -> Tuple[str, str]:
+    #Se usa el mismo formato que init_chat_model: "proveedor:modelo" o el parametro model_provider
+    if model_provider:
+        return model_provider, model
+    if ":" in model:
+        provider, model_name = model.split(":", 1)
+        return provider, model_name
+    return "", model
+
+
+def _make_key(provider: str, model_name: str, params: Dict) -> Tuple:
+    #Los parametros se ordenan para que el orden de los argumentos no genere instancias distintas
+    return (provider, model_name, tuple(sorted((k, repr(v)) for k, v in params.items())))
+
+
+def _count_request(request) -> None:
+    #Los clientes se usan desde varios hilos (sync) y desde el event loop (async)
+    with _http_requests_lock:
+        _http_requests["count"] += 1
+
+
+async def _acount_request(request) -> None:
+    _count_request(request)
+
+
+def _get_http_clients() -> Tuple[object, object]:
+    """Devuelve los clientes httpx (sync y async) con pool de conexiones keep-alive compartidos"""
+    import httpx
+
+    if "sync" not in _http_clients:
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "50")),
+            max_keepalive_connections=int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY", "60")),
+        )
+        timeout = httpx.Timeout(float(os.getenv("MODEL_HTTP_TIMEOUT", "120")))
+        _http_clients["sync"] = httpx.Client(limits=limits, timeout=timeout, event_hooks={"request": [_count_request]})
+        _http_clients["async"] = httpx.AsyncClient(limits=limits, timeout=timeout, event_hooks={"request": [_acount_request]})
+        _http_clients["limits"] = limits
+    return _http_clients["sync"], _http_clients["async"]
+
+
+def get_chat_model(model: str, model_provider: Optional[str] = None, **kwargs):
+    """
+    Devuelve un chat model compartido, creandolo con init_chat_model solo la primera vez
+
+    Args:
+        model: nombre del modelo, con o sin proveedor (ejemplo: "google_genai:gemini-2.0-flash")
+        model_provider: proveedor del modelo si no esta incluido en el nombre
+        kwargs: parametros del modelo (temperature, etc), forman parte de la llave del registro
+    """
+    provider, model_name = _split_model(model, model_provider)
+    key = _make_key(provider, model_name, kwargs)
+    with _lock:
+        llm = _models.get(key)
+        if llm is not None:
+            _model_stats[key]["reused"] += 1
+            return llm
+
+        init_chat_model = _factory.get("factory")
+        if init_chat_model is None:
+            from langchain.chat_models import init_chat_model
+
+        params = dict(kwargs)
+        if provider == "openai":
+            #Los modelos de OpenAI usan el pool de conexiones compartido
+            http_client, http_async_client = _get_http_clients()
+            params.setdefault("http_client", http_client)
+            params.setdefault("http_async_client", http_async_client)
+
+        start = time.perf_counter()
+        llm = init_chat_model(model_name, model_provider=provider or None, **params)
+        from limite_uso import is_rate_limit_enabled, rate_limited
+        if is_rate_limit_enabled():
+            llm = rate_limited(llm, f"{provider or llm._llm_type}:{model_name}")
+        _models[key] = llm
+        _model_stats[key] = {
+            "provider": provider,
+            "model": model_name,
+            "params": dict(kwargs),
+            "created_at": time.time(),
+            "init_seconds": round(time.perf_counter() - start, 4),
+            "reused": 0,
+        }
+        return llm
+
+
+def set_chat_model_factory(factory: Optional[Callable] = None) -> None:
+    """
+    Reemplaza init_chat_model al crear los modelos, por ejemplo por los modelos simulados del benchmark offline
+    (modelo_simulado.py). Se descartan los modelos ya creados
+
+    Args:
+        factory: función con los mismos argumentos que init_chat_model (modelo, model_provider y parametros),
+            None para volver a usar init_chat_model
+    """
+    with _lock:
+        _models.clear()
+        _model_stats.clear()
+        if factory is None:
+            _factory.pop("factory", None)
+        else:
+            _factory["factory"] = factory
+
+
+def warm_up_models(specs) -> None:
+    """
+    Crea por adelantado los modelos indicados, para que la primera llamada no pague la creación del cliente
+
+    Args:
+        specs: lista de tuplas (modelo, parametros), ejemplo: [("google_genai:gemini-2.0-flash", {"temperature": 0})]
+    """
+    for model, params in specs:
+        get_chat_model(model, **params)
+
+
+def get_model_registry_stats() -> Dict:
+    """Devuelve la cantidad de modelos creados, cuantas veces se reutilizo cada uno, el estado del pool HTTP y del limitador de uso"""
+    with _lock:
+        models = [dict(stats) for stats in _model_stats.values()]
+        http_pool = {}
+        if "sync" in _http_clients:
+            limits = _http_clients["limits"]
+            #El pool interno de httpx no es publico, se consulta con getattr por si cambia entre versiones
+            pool = getattr(getattr(_http_clients["sync"], "_transport", None), "_pool", None)
+            http_pool = {
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                "keepalive_expiry": limits.keepalive_expiry,
+                "open_connections": len(getattr(pool, "connections", [])),
+                "requests": _http_requests["count"],
+            }
+    from limite_uso import get_rate_limit_stats
+    return {
+        "created": len(models),
+        "reused": sum(m["reused"] for m in models),
+        "models": models,
+        "http_pool": http_pool,
+        "rate_limits": get_rate_limit_stats(),
+    }
@@ -0,0 +1,136 @@
+#=======================================================================================
+# Registro local de solicitudes de vacaciones (SQLite), reemplaza al Mock que siempre devolvia "12345".
+# Como las ejecuciones se pueden solapar y se vuelven a revisar los correos de los ultimos 7 días,
+# el mismo correo (message_id) puede llegar varias veces: message_id es único y si ya fue registrado
+# se devuelve el registro existente sin volver a escribir.
+# Varias solicitudes se registran en una sola transacción con register_many.
+#=======================================================================================
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+#SQLite permite hasta 999 parametros por consulta en versiones antiguas
+_MAX_QUERY_PARAMS = 500
+
+
+class VacationRequestStore:
+    """
+    Registro de solicitudes de vacaciones en SQLite, idempotente por message_id
+
+    Args:
+        db_path: ruta del archivo SQLite
+    """
+
+    def __init__(self, db_path: str = "./cache/solicitudes_vacaciones.sqlite"):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS solicitud_vacaciones (
+                solicitud_vacacion_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha_registro_solicitud TEXT NOT NULL,
+                message_id TEXT NOT NULL UNIQUE,
+                nombre_solicitante TEXT,
+                fecha_solicitud TEXT
+            )"""
+        )
+        self._conn.commit()
+        self._stats = {"transactions": 0, "created": 0, "already_registered": 0}
+
+    def _select(self, message_ids: List[str]) -> Dict[str, tuple]:
+        rows = {}
+        for start in range(0, len(message_ids), _MAX_QUERY_PARAMS):
+            chunk = message_ids[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._conn.execute(
+                "SELECT message_id, solicitud_vacacion_id, fecha_registro_solicitud FROM solicitud_vacaciones "
+                f"WHERE message_id IN ({placeholders})",
+                chunk,
+            ):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def register_many(self, requests: List[Dict]) -> List[Dict]:
+        """
+        Registra varias solicitudes en una sola transacción, las que ya estaban registradas no se escriben
+
+        Args:
+            requests: lista de solicitudes con message_id, nombre_solicitante y fecha_solicitud
+
+        Returns:
+            List[Dict]: por cada solicitud (en el mismo orden) message_id, solicitud_vacacion_id,
+            fecha_registro_solicitud y registrado_previamente
+        """
+        message_ids = list(dict.fromkeys(request["message_id"] for request in requests))
+        if not message_ids:
+            return []
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            with self._conn:
+                existing = self._select(message_ids)
+                new_rows = {}
+                for request in requests:
+                    message_id = request["message_id"]
+                    if message_id in existing or message_id in new_rows:
+                        continue
+                    fecha_solicitud = request.get("fecha_solicitud")
+                    new_rows[message_id] = (
+                        now,
+                        message_id,
+                        request.get("nombre_solicitante"),
+                        str(fecha_solicitud) if fecha_solicitud is not None else None,
+                    )
+                #ON CONFLICT por si otro proceso registró el mismo correo al mismo tiempo
+                self._conn.executemany(
+                    "INSERT INTO solicitud_vacaciones (fecha_registro_solicitud, message_id, nombre_solicitante, fecha_solicitud) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(message_id) DO NOTHING",
+                    list(new_rows.values()),
+                )
+                registered = self._select(message_ids)
+            self._stats["transactions"] += 1
+            self._stats["created"] += len(new_rows)
+            self._stats["already_registered"] += len(message_ids) - len(new_rows)
+
+        return [
+            {
+                "message_id": request["message_id"],
+                "solicitud_vacacion_id": str(registered[request["message_id"]][0]),
+                "fecha_registro_solicitud": registered[request["message_id"]][1],
+                "registrado_previamente": request["message_id"] in existing,
+            }
+            for request in requests
+        ]
+
+    def register(self, message_id: str, nombre_solicitante: str, fecha_solicitud) -> Dict:
+        """Registra una solicitud (o devuelve la existente si el correo ya fue registrado)"""
+        return self.register_many([
+            {"message_id": message_id, "nombre_solicitante": nombre_solicitante, "fecha_solicitud": fecha_solicitud}
+        ])[0]
+
+    def registered_ids(self, message_ids: List[str]) -> List[str]:
+        """Devuelve los correos de message_ids que ya tienen una solicitud registrada"""
+        with self._lock:
+            return list(self._select(list(message_ids)))
+
+    def stats(self) -> Dict:
+        """Devuelve la cantidad de transacciones, solicitudes registradas y solicitudes que ya estaban registradas"""
+        with self._lock:
+            return dict(self._stats)
+
+
+_store: Optional[VacationRequestStore] = None
+_store_lock = threading.Lock()
+
+
+def get_request_store() -> VacationRequestStore:
+    """Devuelve el registro de solicitudes del proceso, la ruta se configura con VACATION_REQUESTS_DB_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VacationRequestStore(os.getenv("VACATION_REQUESTS_DB_PATH", "./cache/solicitudes_vacaciones.sqlite"))
+        return _store
@@ -0,0 +1,107 @@
+#=======================================================================================
+# Reglas del procedimiento de solicitudes de vacaciones aplicadas en código (sin LLM).
+# Antes, validate_pdf devolvia un texto libre y el LLM de cada agente lo volvia a leer para decidir si la
+# solicitud era válida, con mas tokens y mas turnos. Ahora el LLM solo entrega los datos del PDF
+# (VacationRequestValidation) y aca se revisan las 3 condiciones de validez de make_system_prompt:
+#   1. El asunto o cuerpo estan relacionados con una solicitud de vacaciones
+#   2. Tiene un archivo adjunto con formato PDF, de una solicitud de vacaciones con una firma
+#   3. El nombre en el archivo de la solicitud debe corresponder al remitente del correo
+#=======================================================================================
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+
+#Motivos de rechazo, se usan en el borrador de respuesta a las solicitudes invalidas
+REASON_NOT_RELATED = "el correo no está relacionado con una solicitud de vacaciones"
+REASON_NO_PDF = "no tiene un archivo adjunto con formato PDF de una solicitud de vacaciones"
+REASON_NOT_REQUEST = "el archivo adjunto no es una solicitud de vacaciones"
+REASON_NO_SIGNATURE = "la solicitud de vacaciones adjunta no tiene firma"
+REASON_NAME_MISMATCH = "el nombre en la solicitud de vacaciones no corresponde al remitente del correo"
+
+
+class VacationRequestVerdict(BaseModel):
+    """Veredicto final de un correo según las condiciones del procedimiento"""
+
+    es_valida: bool = Field(description="True si la solicitud cumple todas las condiciones")
+    motivo_rechazo: Optional[str] = Field(default=None, description="Motivo por el que la solicitud es invalida")
+    condiciones: Dict[str, bool] = Field(default_factory=dict, description="Resultado de cada condición")
+    nombre_solicitante: Optional[str] = None
+    fecha_solicitud: Optional[str] = None
+    fecha_inicio: Optional[str] = None
+    fecha_fin: Optional[str] = None
+    confianza: Optional[float] = None
+
+
+def _tokens(text: Optional[str]) -> List[str]:
+    #Palabras sin tildes ni mayusculas, se ignoran las de una letra
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return [token for token in re.split(r"[^a-zñ]+", text) if len(token) > 1]
+
+
+def is_vacation_related(subject: Optional[str], body: Optional[str]) -> bool:
+    """Condición 1: el asunto o el cuerpo estan relacionados con vacaciones"""
+    return any(token.startswith("vacacion") for token in _tokens(f"{subject or ''} {body or ''}"))
+
+
+def name_matches_sender(applicant_name: Optional[str], sender: Optional[str]) -> bool:
+    """
+    Condición 3: el nombre de la solicitud corresponde al remitente del correo
+    (directorio de empleados y comparación aproximada en directorio_empleados.py, solo los casos ambiguos usan el LLM)
+
+    Args:
+        applicant_name: nombre del solicitante que está en el PDF
+        sender: remitente del correo, por ejemplo "Juan Perez <jperez@empresa.com>"
+    """
+    from directorio_empleados import applicant_matches_sender
+    return applicant_matches_sender(applicant_name, sender)
+
+
+def evaluate_request(subject: Optional[str], body: Optional[str], sender: Optional[str], validations: Iterable) -> VacationRequestVerdict:
+    """
+    Aplica las condiciones de validez a un correo y a los datos de sus PDFs adjuntos
+
+    Args:
+        subject: asunto del correo
+        body: cuerpo del correo
+        sender: remitente del correo
+        validations: datos de cada PDF adjunto (VacationRequestValidation de validar_solicitud.py), puede ser un
+            generador: los PDFs se validan solo hasta encontrar uno válido
+    """
+    conditions = {"relacionado_vacaciones": is_vacation_related(subject, body)}
+    if not conditions["relacionado_vacaciones"]:
+        return VacationRequestVerdict(es_valida=False, motivo_rechazo=REASON_NOT_RELATED, condiciones=conditions)
+
+    #Se usa el primer PDF que cumple las condiciones, si ninguno las cumple se informa el motivo del PDF que mas avanzó
+    best = None
+    for validation in validations:
+        signed = validation.es_solicitud_vacaciones and validation.tiene_firma
+        matches = signed and name_matches_sender(validation.nombre_solicitante, sender)
+        if not validation.es_solicitud_vacaciones:
+            reason, rank = REASON_NOT_REQUEST, 0
+        elif not validation.tiene_firma:
+            reason, rank = REASON_NO_SIGNATURE, 1
+        elif not matches:
+            reason, rank = REASON_NAME_MISMATCH, 2
+        else:
+            reason, rank = None, 3
+        verdict = VacationRequestVerdict(
+            es_valida=reason is None,
+            motivo_rechazo=reason,
+            condiciones={**conditions, "pdf_solicitud_firmada": signed, "nombre_corresponde_remitente": matches},
+            nombre_solicitante=validation.nombre_solicitante,
+            fecha_solicitud=validation.fecha_solicitud,
+            fecha_inicio=validation.fecha_inicio,
+            fecha_fin=validation.fecha_fin,
+            confianza=validation.confianza,
+        )
+        if verdict.es_valida:
+            return verdict
+        if best is None or rank > best[0]:
+            best = (rank, verdict)
+    if best is None:
+        conditions["pdf_solicitud_firmada"] = False
+        return VacationRequestVerdict(es_valida=False, motivo_rechazo=REASON_NO_PDF, condiciones=conditions)
+    return best[1]
@@ -0,0 +1,49 @@
+#=======================================================================================
+# Servidor MCP local respaldado por SQLite, reemplaza al servidor MCP de Postgres para pruebas sin Docker.
+# Tiene la herramienta "execute_sql" (igual que postgres-mcp) y además acepta parametros,
+# devuelve las filas en formato JSON.
+# Se ejecuta con SSE en http://localhost:8000/sse (python servidor_mcp_sqlite.py)
+# o como subproceso con stdio (python servidor_mcp_sqlite.py --transport stdio).
+#=======================================================================================
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("sqlite-sql", port=int(os.getenv("MCP_SQLITE_PORT", "8000")))
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        db_path = os.getenv("MCP_SQLITE_PATH", "./cache/solicitudes_mcp.sqlite")
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(db_path, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+    return _connection
+
+
+@mcp.tool()
+def execute_sql(sql: str, params: Optional[List] = None) -> str:
+    """Executes a SQL statement (with optional ? parameters) and returns the resulting rows as JSON"""
+    with _lock:
+        conn = _get_connection()
+        cursor = conn.execute(sql, params or [])
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.commit()
+    return json.dumps(rows, default=str)
+
+
+#Solo se iniciará el servidor si se ejecuta este modulo directamente
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Servidor MCP local respaldado por SQLite")
+    parser.add_argument("--transport", default="sse", choices=["sse", "stdio", "streamable-http"])
+    mcp.run(transport=parser.parse_args().transport)
@@ -0,0 +1,355 @@
+#=======================================================================================
+# Sincronización incremental de la bandeja de entrada con el historyId de GMail.
+# En lugar de buscar los correos de los ultimos 7 días en cada ejecución, se guarda el ultimo historyId procesado
+# y un registro de los correos ya procesados, y en la siguiente ejecución se consulta el API de historial
+# para obtener solo los correos nuevos. Si el historial expiró (GMail lo guarda por un tiempo limitado)
+# se vuelve a hacer la busqueda completa.
+# El estado solo se confirma (commit) cuando la ejecución termina bien, si falla se vuelven a procesar los mismos correos.
+# Los correos que fallaron (o que los agentes no terminaron) no se marcan como procesados y mientras haya alguno
+# no se avanza el historyId, asi se vuelven a obtener en la siguiente ejecución.
+#=======================================================================================
+import ast
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Type
+
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForToolRun
+from pydantic import BaseModel, Field
+
+from langchain_community.tools.gmail.base import GmailBaseTool
+
+
+class InboxSyncState:
+    """
+    Estado de la sincronización incremental guardado en SQLite: ultimo historyId y correos procesados
+
+    Args:
+        db_path: ruta del archivo SQLite
+    """
+
+    def __init__(self, db_path: str = "./cache/sincronizacion_bandeja.sqlite"):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS processed_messages (
+                message_id TEXT PRIMARY KEY,
+                processed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        #Datos de la ejecución actual, se guardan en commit()
+        self._pending_history_id: Optional[str] = None
+        self._pending_message_ids: List[str] = []
+        self._failed_message_ids: Set[str] = set()
+
+    def get_history_id(self) -> Optional[str]:
+        """Devuelve el ultimo historyId confirmado, None si nunca se sincronizó"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE name = 'history_id'").fetchone()
+        return row[0] if row else None
+
+    def is_processed(self, message_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed_messages WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return row is not None
+
+    def set_pending(self, history_id: Optional[str], message_ids: List[str]) -> None:
+        """Registra el historyId y los correos de la ejecución actual (todavia sin confirmar)"""
+        with self._lock:
+            if history_id is not None:
+                self._pending_history_id = history_id
+            self._pending_message_ids.extend(m for m in message_ids if m not in self._pending_message_ids)
+
+    def pending_message_ids(self) -> List[str]:
+        """Devuelve los correos de la ejecución actual (todavia sin confirmar)"""
+        with self._lock:
+            return list(self._pending_message_ids)
+
+    def mark_failed(self, message_ids: Iterable[str]) -> None:
+        """Registra los correos de la ejecución actual que fallaron, commit() no los marca como procesados"""
+        with self._lock:
+            self._failed_message_ids.update(message_ids)
+
+    def commit(self) -> Dict:
+        """
+        Confirma la ejecución: marca como procesados los correos que no fallaron y guarda el nuevo historyId
+        (solo si ningún correo falló, si no la siguiente ejecución vuelve a obtener los correos del mismo historial)
+        """
+        now = time.time()
+        with self._lock:
+            processed = [m for m in self._pending_message_ids if m not in self._failed_message_ids]
+            failed = len(self._pending_message_ids) - len(processed)
+            history_id = self._pending_history_id if not failed else None
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO processed_messages (message_id, processed_at) VALUES (?, ?)",
+                [(message_id, now) for message_id in processed],
+            )
+            if history_id is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (name, value) VALUES ('history_id', ?)",
+                    (history_id,),
+                )
+            self._conn.commit()
+            committed = {"history_id": history_id, "processed_messages": len(processed), "failed_messages": failed}
+            self._pending_history_id = None
+            self._pending_message_ids = []
+            self._failed_message_ids = set()
+        return committed
+
+    def reset(self) -> None:
+        """Borra el estado para que la siguiente ejecución haga la busqueda completa"""
+        with self._lock:
+            self._conn.execute("DELETE FROM sync_state")
+            self._conn.execute("DELETE FROM processed_messages")
+            self._conn.commit()
+
+
+def _is_history_expired(error: Exception) -> bool:
+    #GMail responde 404 cuando el startHistoryId es muy antiguo o no es válido
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None) == 404 or getattr(error, "status_code", None) == 404
+
+
+def _list_history_message_ids(api_resource, start_history_id: str, label_id: str):
+    message_ids = []
+    history_id = start_history_id
+    page_token = None
+    while True:
+        response = (
+            api_resource.users()
+            .history()
+            .list(
+                userId="me",
+                startHistoryId=start_history_id,
+                historyTypes=["messageAdded"],
+                labelId=label_id,
+                pageToken=page_token,
+            )
+            .execute()
+        )
+        for history in response.get("history", []):
+            for added in history.get("messagesAdded", []):
+                message_ids.append(added["message"]["id"])
+        history_id = response.get("historyId", history_id)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return message_ids, history_id
+
+
+def list_query_message_ids(api_resource, query: str, max_results: int) -> List[str]:
+    """Devuelve los ids de los correos que cumplen la busqueda (query con el formato de GMail), paginando los resultados"""
+    message_ids = []
+    page_token = None
+    while len(message_ids) < max_results:
+        response = (
+            api_resource.users()
+            .messages()
+            .list(userId="me", q=query, pageToken=page_token, maxResults=min(500, max_results - len(message_ids)))
+            .execute()
+        )
+        message_ids.extend(message["id"] for message in response.get("messages", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+    return message_ids
+
+
+def list_new_message_ids(
+    api_resource,
+    state: InboxSyncState,
+    full_scan_query: str = "in:inbox newer_than:7d",
+    label_id: str = "INBOX",
+    max_results: int = 500,
+) -> Dict:
+    """
+    Devuelve los ids de los correos nuevos que no fueron procesados y el historyId hasta el que se sincronizó
+    (no modifica el estado, se debe registrar con state.set_pending y confirmar con state.commit)
+
+    Args:
+        api_resource: recurso del API de GMail
+        state: estado de la sincronización
+        full_scan_query: busqueda que se usa en la primera ejecución o si el historial expiró
+        label_id: etiqueta de los correos a sincronizar
+        max_results: cantidad máxima de correos en la busqueda completa
+    """
+    history_id = state.get_history_id()
+    mode = "incremental"
+    message_ids = None
+    if history_id:
+        try:
+            message_ids, new_history_id = _list_history_message_ids(api_resource, history_id, label_id)
+        except Exception as e:
+            if not _is_history_expired(e):
+                raise
+            mode = "full_rescan_history_expired"
+    else:
+        mode = "full_scan"
+
+    if message_ids is None:
+        #El historyId se obtiene antes de la busqueda para no perder correos que lleguen mientras tanto
+        new_history_id = api_resource.users().getProfile(userId="me").execute()["historyId"]
+        message_ids = list_query_message_ids(api_resource, full_scan_query, max_results)
+
+    #Se quitan duplicados y los correos que ya se procesaron en ejecuciones anteriores
+    new_message_ids = [m for m in dict.fromkeys(message_ids) if not state.is_processed(m)]
+    return {
+        "mode": mode,
+        "history_id": str(new_history_id),
+        "message_ids": new_message_ids,
+        "already_processed": len(set(message_ids)) - len(new_message_ids),
+    }
+
+
+class SearchNewArgsSchema(BaseModel):
+    """Input for GmailSearchNewMessages."""
+
+    max_results: int = Field(
+        default=100,
+        description="Maximum number of new messages to return",
+    )
+
+
+class GmailSearchNewMessages(GmailBaseTool):  # type: ignore[override, override]
+    """
+    Tool that returns only the inbox messages that arrived since the last processed run,
+    using the Gmail history API (historyId) and a ledger of processed messages
+
+    Args:
+        max_results: maximum number of messages to return
+        run_manager: Optional, not send
+    """
+
+    name: str = "search_new_gmail_messages"
+    description: str = (
+        """Use this tool to get the new inbox emails that were not processed in previous runs.
+        Returns the list of new message IDs."""
+    )
+    args_schema: Type[SearchNewArgsSchema] = SearchNewArgsSchema
+
+    state: InboxSyncState
+    full_scan_query: str = "in:inbox newer_than:7d"
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _run(
+        self,
+        max_results: int = 100,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Dict:
+        """Run the tool."""
+        result = list_new_message_ids(self.api_resource, self.state, self.full_scan_query)
+        message_ids = result["message_ids"][:max_results]
+        #Si quedan correos pendientes no se avanza el historyId, en la siguiente ejecución se obtienen de nuevo
+        #(los ya procesados se descartan con el registro de correos procesados)
+        truncated = len(result["message_ids"]) > len(message_ids)
+        self.state.set_pending(None if truncated else result["history_id"], message_ids)
+        return {
+            "mode": result["mode"],
+            "messages": [{"id": message_id} for message_id in message_ids],
+            "pending": len(result["message_ids"]) - len(message_ids),
+        }
+
+
+def _input_message_ids(inputs) -> List[str]:
+    #Ids de correo de los argumentos de una herramienta: message_id(s), o la carpeta de adjuntos (ruta/<message_id>)
+    if not isinstance(inputs, dict):
+        return []
+    message_ids = list(inputs.get("message_ids") or [])
+    if inputs.get("message_id"):
+        message_ids.append(inputs["message_id"])
+    if inputs.get("folder"):
+        message_ids.append(os.path.basename(os.path.normpath(str(inputs["folder"]))))
+    return message_ids
+
+
+def _tool_output(output):
+    #Las herramientas que devuelven un diccionario llegan al callback como ToolMessage con el JSON (o repr) en el texto
+    content = getattr(output, "content", output)
+    if isinstance(content, str):
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                return parse(content)
+            except (ValueError, SyntaxError):
+                continue
+    return content
+
+
+class InboxSyncCallback(BaseCallbackHandler):
+    """
+    Callback que registra en el estado de sincronización los correos cuyas herramientas fallaron (excepción o errores
+    por correo en el resultado) y los que el triaje descartó, para que commit() solo marque los correos terminados
+
+    Args:
+        state: estado de la sincronización de la ejecución
+    """
+
+    def __init__(self, state: InboxSyncState):
+        self.state = state
+        self._lock = threading.Lock()
+        self._inputs: Dict = {}
+        self._discarded: Set[str] = set()
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs) -> None:
+        with self._lock:
+            self._inputs[run_id] = inputs
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        with self._lock:
+            inputs = self._inputs.pop(run_id, None)
+        data = _tool_output(output)
+        if not isinstance(data, dict):
+            return
+        errors = data.get("errors") or []
+        self.state.mark_failed(error["id"] for error in errors if isinstance(error, dict) and error.get("id"))
+        if "candidates" in data and "without_pdf" in data:
+            #Resultado del triaje: los correos que no son candidatos ni solicitudes sin PDF ya quedan resueltos
+            kept = set(data["candidates"]) | {m.get("id") for m in data["without_pdf"] if isinstance(m, dict)}
+            with self._lock:
+                self._discarded.update(m for m in _input_message_ids(inputs) if m not in kept)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        from langgraph.errors import GraphBubbleUp
+
+        with self._lock:
+            inputs = self._inputs.pop(run_id, None)
+        #Las interrupciones de LangGraph no son errores del correo
+        if not isinstance(error, GraphBubbleUp):
+            self.state.mark_failed(_input_message_ids(inputs))
+
+    def mark_unfinished(self, completed_ids: Iterable[str]) -> List[str]:
+        """
+        Marca como fallidos los correos de la ejecución que el triaje no descartó y que no se marcaron como terminados
+        (por ejemplo si el supervisor no los asignó), y devuelve sus ids
+
+        Args:
+            completed_ids: correos terminados en la ejecución (puntos_control.py)
+        """
+        completed = set(completed_ids)
+        with self._lock:
+            unfinished = [
+                m for m in self.state.pending_message_ids() if m not in completed and m not in self._discarded
+            ]
+        self.state.mark_failed(unfinished)
+        return unfinished
+
+
+_state: Optional[InboxSyncState] = None
+
+
+def get_inbox_sync_state() -> InboxSyncState:
+    """Devuelve el estado de sincronización del proceso, la ruta se configura con INBOX_SYNC_STATE_PATH"""
+    global _state
+    if _state is None:
+        _state = InboxSyncState(os.getenv("INBOX_SYNC_STATE_PATH", "./cache/sincronizacion_bandeja.sqlite"))
+    return _state
@@ -0,0 +1,261 @@
+#=======================================================================================
+# Triaje de los correos de la busqueda solo con sus metadatos, antes de leerlos completos.
+# Antes se leia cada correo encontrado con GmailGetMessageWithAttachments (contenido y adjuntos), incluyendo
+# boletines, borradores propios de ejecuciones anteriores y correos ya procesados, y el LLM los revisaba.
+# Ahora se obtienen en peticiones batch solo los encabezados, las etiquetas, el snippet y la lista de partes MIME
+# (nombre y tipo de cada adjunto, sin su contenido) y se aplican reglas locales en este orden:
+#   - procesado: el correo ya se procesó (registro de sincronización o solicitud ya registrada)
+#   - propio: borradores y correos enviados por la cuenta (etiquetas DRAFT o SENT)
+#   - boletin: correos masivos (encabezados List-Id, List-Unsubscribe o Precedence bulk/list)
+#   - no_relacionado: correo sin adjunto PDF cuyo asunto e inicio del cuerpo (snippet) no mencionan vacaciones
+#     (los correos con PDF siempre se leen completos, la mención puede estar mas abajo en el cuerpo)
+#   - sin_pdf: solicitud sin adjunto PDF, es invalida sin leerla (se responde el rechazo, pero no se descarga ni va al LLM).
+#     Si la lista de partes MIME quedó incompleta (mas niveles que TRIAGE_FIELDS) el correo se lee completo
+# Solo los correos restantes se descargan y se envian al LLM.
+#=======================================================================================
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Type
+
+from langchain_core.callbacks import CallbackManagerForToolRun
+from pydantic import BaseModel, Field
+
+from langchain_community.tools.gmail.base import GmailBaseTool
+
+#Campos de la respuesta parcial del API de GMail: encabezados, etiquetas, snippet y partes MIME sin su contenido
+#(format="metadata" no incluye las partes, y format="full" sin este filtro incluye el texto del correo)
+TRIAGE_FIELDS = (
+    "id,threadId,labelIds,snippet,"
+    "payload(mimeType,filename,headers,parts(mimeType,filename,parts(mimeType,filename,parts(mimeType,filename))))"
+)
+
+#Reglas en el orden en que se aplican
+RULE_PROCESSED = "procesado"
+RULE_OWN = "propio"
+RULE_BULK = "boletin"
+RULE_NOT_RELATED = "no_relacionado"
+RULE_NO_PDF = "sin_pdf"
+TRIAGE_RULES = [RULE_PROCESSED, RULE_OWN, RULE_BULK, RULE_NOT_RELATED, RULE_NO_PDF]
+
+_OWN_LABELS = {"DRAFT", "SENT"}
+_BULK_HEADERS = ("list-id", "list-unsubscribe")
+
+
+def _pdf_attachments(payload: Dict) -> List[str]:
+    from gmail_get_message_with_attachments import _walk_parts
+
+    return [
+        part["filename"] for part in _walk_parts(payload)
+        if part.get("filename") and (part["filename"].lower().endswith(".pdf") or part.get("mimeType") == "application/pdf")
+    ]
+
+
+def _is_part_tree_truncated(payload: Dict) -> bool:
+    """
+    True si TRIAGE_FIELDS no alcanzó a incluir todos los niveles de partes MIME (por ejemplo un correo reenviado
+    con el PDF mas abajo): una parte contenedora sin la lista de sus partes
+    """
+    from gmail_get_message_with_attachments import _walk_parts
+
+    return any(
+        (part.get("mimeType", "").startswith("multipart/") or part.get("mimeType") == "message/rfc822")
+        and not part.get("parts")
+        for part in _walk_parts(payload)
+    )
+
+
+def classify_message(message_data: Dict, processed_ids: Iterable[str] = ()) -> Dict:
+    """
+    Aplica las reglas del triaje a un correo obtenido con TRIAGE_FIELDS y devuelve sus datos y la regla que lo descarta
+
+    Args:
+        message_data: respuesta del API de GMail (messages.get con format="full" y fields=TRIAGE_FIELDS)
+        processed_ids: correos ya procesados
+    """
+    from email.utils import parsedate_to_datetime
+    from gmail_get_message_with_attachments import _headers_to_dict
+    from reglas_solicitud import is_vacation_related
+
+    payload = message_data.get("payload", {})
+    headers = _headers_to_dict(payload.get("headers", []))
+    date = headers.get("date")
+    if date:
+        try:
+            date = parsedate_to_datetime(date).strftime("%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            pass
+    message = {
+        "id": message_data["id"],
+        "subject": headers.get("subject"),
+        "sender": headers.get("from"),
+        "date": date,
+        "snippet": message_data.get("snippet", ""),
+        "pdf_attachments": _pdf_attachments(payload),
+    }
+    #Si las partes estan incompletas puede haber un PDF que no se ve, el correo se lee completo en lugar de rechazarlo
+    truncated = _is_part_tree_truncated(payload)
+
+    if message["id"] in processed_ids:
+        rule = RULE_PROCESSED
+    elif _OWN_LABELS & set(message_data.get("labelIds", [])):
+        rule = RULE_OWN
+    elif any(name in headers for name in _BULK_HEADERS) or headers.get("precedence", "").lower() in ("bulk", "list"):
+        rule = RULE_BULK
+    elif message["pdf_attachments"] or truncated:
+        #El snippet es solo el inicio del cuerpo: con un PDF adjunto la mención de vacaciones puede estar mas abajo,
+        #se lee completo y se valida como antes
+        rule = None
+    elif not is_vacation_related(message["subject"], message["snippet"]):
+        rule = RULE_NOT_RELATED
+    else:
+        rule = RULE_NO_PDF
+    return {**message, "rule": rule}
+
+
+def _fetch_structures(api_resource, message_ids: List[str], batch_size: int = 50):
+    """Obtiene los metadatos de los correos con peticiones batch, devuelve las respuestas y los errores por id"""
+    responses, errors = {}, {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = str(exception)
+        else:
+            responses[request_id] = response
+
+    for start in range(0, len(message_ids), batch_size):
+        batch = api_resource.new_batch_http_request(callback=callback)
+        for message_id in message_ids[start:start + batch_size]:
+            batch.add(
+                api_resource.users().messages().get(userId="me", id=message_id, format="full", fields=TRIAGE_FIELDS),
+                request_id=message_id,
+            )
+        batch.execute()
+    return responses, errors
+
+
+def get_processed_ids(message_ids: List[str], sync_state=None) -> set:
+    """
+    Correos ya procesados: los del registro de la sincronización incremental y los que ya tienen una solicitud registrada
+
+    Args:
+        message_ids: correos a revisar
+        sync_state: estado de la sincronización incremental (sincronizacion_bandeja.py), None si no se usa
+    """
+    from registro_solicitudes import get_request_store
+
+    processed = set(get_request_store().registered_ids(message_ids))
+    if sync_state is not None:
+        processed.update(message_id for message_id in message_ids if sync_state.is_processed(message_id))
+    return processed
+
+
+def triage_messages(api_resource, message_ids: List[str], processed_ids: Optional[Iterable[str]] = None,
+                    batch_size: int = 50) -> Dict:
+    """
+    Clasifica los correos solo con sus metadatos y devuelve los que se deben leer, los que son invalidos por no tener PDF
+    y cuantos descartó cada regla
+
+    Args:
+        api_resource: recurso del API de GMail
+        message_ids: ids de los correos encontrados en la busqueda
+        processed_ids: correos ya procesados, por defecto get_processed_ids
+        batch_size: peticiones por cada petición batch al API de GMail
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    processed_ids = set(get_processed_ids(message_ids) if processed_ids is None else processed_ids)
+    responses, errors = _fetch_structures(api_resource, message_ids, batch_size)
+
+    candidates, without_pdf = [], []
+    dropped = {rule: 0 for rule in TRIAGE_RULES}
+    for message_id in message_ids:
+        if message_id not in responses:
+            #Si no se pudieron obtener los metadatos el correo se lee completo, como antes
+            candidates.append({"id": message_id})
+            continue
+        message = classify_message(responses[message_id], processed_ids)
+        rule = message.pop("rule")
+        if rule is None:
+            candidates.append(message)
+            continue
+        dropped[rule] += 1
+        if rule == RULE_NO_PDF:
+            without_pdf.append(message)
+    _record(len(message_ids), len(candidates), dropped)
+    return {
+        "candidates": candidates,
+        "without_pdf": without_pdf,
+        "dropped": dropped,
+        "errors": [{"id": message_id, "error": error} for message_id, error in errors.items()],
+    }
+
+
+def is_triage_enabled() -> bool:
+    """El triaje se puede deshabilitar con TRIAGE_ENABLED=0 (se leen todos los correos de la busqueda)"""
+    return os.getenv("TRIAGE_ENABLED", "1") != "0"
+
+
+class TriageArgsSchema(BaseModel):
+    """Input for GmailTriageMessages."""
+
+    message_ids: List[str] = Field(
+        ...,
+        description="The IDs of the email messages retrieved from a search.",
+    )
+
+
+class GmailTriageMessages(GmailBaseTool):  # type: ignore[override, override]
+    """
+    Tool that classifies the messages of a search using only their metadata (headers, labels, snippet
+    and attachment names), before fetching them in full
+
+    Args:
+        message_ids: IDs from GMail
+        run_manager: Optional, not send
+    """
+
+    name: str = "triage_gmail_messages"
+    description: str = (
+        """Use this tool with the message IDs of a search before reading the emails.
+        Returns the candidates (the only emails that must be read and validated), the vacation emails without
+        a PDF attachment (invalid requests, with sender, subject and date, they don't need to be read)
+        and how many emails were discarded by each rule."""
+    )
+    args_schema: Type[TriageArgsSchema] = TriageArgsSchema
+
+    sync_state: Optional[object] = None
+    batch_size: int = 50
+
+    def _run(
+        self,
+        message_ids: List[str],
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Dict:
+        """Run the tool."""
+        processed_ids = get_processed_ids(message_ids, self.sync_state)
+        result = triage_messages(self.api_resource, message_ids, processed_ids, self.batch_size)
+        #El agente solo necesita los ids de los candidatos y los datos de los rechazos
+        return {
+            "candidates": [message["id"] for message in result["candidates"]],
+            "without_pdf": [
+                {key: message[key] for key in ("id", "sender", "subject", "date")} for message in result["without_pdf"]
+            ],
+            "dropped": result["dropped"],
+        }
+
+
+_lock = threading.Lock()
+_stats: Dict = {"messages": 0, "candidates": 0, "dropped": {rule: 0 for rule in TRIAGE_RULES}}
+
+
+def _record(messages: int, candidates: int, dropped: Dict[str, int]) -> None:
+    with _lock:
+        _stats["messages"] += messages
+        _stats["candidates"] += candidates
+        for rule, count in dropped.items():
+            _stats["dropped"][rule] += count
+
+
+def get_triage_stats() -> Dict:
+    """Devuelve cuantos correos se revisaron, cuantos se leyeron completos y cuantos descartó cada regla"""
+    with _lock:
+        return {"messages": _stats["messages"], "candidates": _stats["candidates"], "dropped": dict(_stats["dropped"])}
@@ -1,19 +1,107 @@
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+#Modelo y versión del prompt usados para validar, forman parte de la llave de la cache de validaciones
+#(si se cambia el modelo o el texto del prompt, se debe cambiar la versión para no reutilizar resultados anteriores)
+VALIDATION_MODEL = "google_genai:gemini-2.0-flash-lite"
+PROMPT_VERSION = "v1"
+
+#Texto de la consulta que se envia al LLM junto con el PDF
+VALIDATION_QUERY = """"
+                            ¿El contenido del documento es una solicitud de vacaciones?, 
+                            si es así, obtener lo siguiente:
+                            el nombre del solicitante 
+                            si hay una firma
+                            """
+
+#Versión del prompt de la validación estructurada (se guarda en la cache con su propia llave)
+STRUCTURED_PROMPT_VERSION = "v1-estructurado"
+
+#Texto de la consulta de la validación estructurada, la respuesta se obtiene con with_structured_output
+STRUCTURED_VALIDATION_QUERY = """
+                            Revisa si el contenido del documento es una solicitud de vacaciones, 
+                            y obtén el nombre del solicitante, si hay una firma y las fechas de la solicitud.
+                            Indica tu confianza en la respuesta entre 0 y 1.
+                            """
+
+#Resultado de la validación estructurada de un PDF, las condiciones de validez se aplican en código (reglas_solicitud.py)
+class VacationRequestValidation(BaseModel):
+    """Datos de un documento PDF que podria ser una solicitud de vacaciones"""
+
+    es_solicitud_vacaciones: bool = Field(description="True si el documento es una solicitud de vacaciones")
+    nombre_solicitante: Optional[str] = Field(default=None, description="Nombre del solicitante que está en el documento")
+    tiene_firma: bool = Field(default=False, description="True si el documento tiene una firma")
+    fecha_solicitud: Optional[str] = Field(default=None, description="Fecha de la solicitud en el documento (AAAA-MM-DD)")
+    fecha_inicio: Optional[str] = Field(default=None, description="Fecha de inicio de las vacaciones (AAAA-MM-DD)")
+    fecha_fin: Optional[str] = Field(default=None, description="Fecha de fin de las vacaciones (AAAA-MM-DD)")
+    confianza: float = Field(default=1.0, ge=0, le=1, description="Confianza en la respuesta, entre 0 y 1")
+
+#Modelos de la validación estructurada, del mas barato al mas capaz (cascada_modelos.py): el segundo solo se usa
+#si la respuesta no cumple el esquema, le falta el nombre del solicitante o su confianza es baja
+VALIDATION_CASCADE = [VALIDATION_MODEL, "google_genai:gemini-2.5-flash"]
+
+def _is_consistent(validation: VacationRequestValidation) -> bool:
+    #Sin el nombre del solicitante no se puede revisar la condición 3
+    return not validation.es_solicitud_vacaciones or bool(validation.nombre_solicitante)
+
+def get_validation_cascade():
+    """Cascada de modelos de la validación estructurada, se configura con VALIDATION_CASCADE y CASCADE_MIN_CONFIDENCE"""
+    from cascada_modelos import get_model_cascade
+    return get_model_cascade("validation", VALIDATION_CASCADE, VacationRequestValidation, check=_is_consistent)
+
+#Modo de validación de los agentes: "structured" (veredicto final) o "text" (texto libre de validate_pdf)
+def get_validation_mode() -> str:
+    import os
+    return os.getenv("VALIDATION_MODE", "structured")
+
 #Funcion para convertir un archivo local a Base64
+#Si el PDF tiene mas páginas de las necesarias, se codifica un PDF reducido con las páginas del formato (recorte_pdf.py),
+#si no, el archivo se mapea en memoria y se codifica por bloques, sin leer antes una copia completa del archivo
 def _get_base64_file(folder: str, file_name: str)-> str:
-    """Obtiene el contenido de un archivo en base64"""
-    import base64
+    """Obtiene el contenido de un archivo (o de su versión reducida) en base64"""
     from pathlib import Path
+    from archivos_pdf import encode_base64, open_pdf_buffer
+    from recorte_pdf import trim_pdf
 
     folder_path = Path(folder)
     file_path = folder_path / file_name
 
-    with open(file_path, "rb") as f:
-        pdf = base64.b64encode(f.read()).decode("utf-8")
+    trimmed = trim_pdf(file_path)
+    if trimmed.data is not None:
+        return encode_base64(trimmed.data)
+
+    with open_pdf_buffer(file_path) as buffer:
+        pdf = encode_base64(buffer)
     return pdf
 
+#Funcion que crea los mensajes con el contenido del PDF (en base64) y la consulta
+#Al momento de esta publicación, Langchain no soporta archivo PDF de forma dinámica (con plantillas), 
+#por eso se crea un mensaje estático con el contenido de cada PDF, y se envia junto al texto de la consulta
+#(los mensajes se crean directamente, sin armar una plantilla y una cadena en cada llamada)
+def _build_validation_messages(folder: str, file_name: str, query: str) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    #Obtengo el contenido del archivo en Base64 para poder enviarlo al API del LLM
+    pdf_base64 = _get_base64_file(folder, file_name)
+    return [
+        SystemMessage("""Asegurate que las respuestas sean en español."""),
+        HumanMessage(
+            [
+                {
+                    "type": "file",
+                    "source_type": "base64",
+                    "data": pdf_base64,
+                    "filename": file_name,
+                    "mime_type": "application/pdf",
+                }                    
+            ]),
+        HumanMessage(query),
+    ]
+
 #Funcion que usara un LLM para validar si un archivo es una solicitud de vacaciones válida
 #Al momento de esta publicación, Langchain no soporta archivo PDF de forma dinámica (con plantillas), 
-#por eso se crea un mensaje estático con el contenido de cada PDF, pero el texto si es dinámico
+#por eso se crea un mensaje estático con el contenido de cada PDF, y se envia junto al texto de la consulta
 def validate_pdf(folder: str, file_name: str)-> str:
     """Devuelve  si el contenido del archivo pdf es una solicitud de vacaciones, 
     el nombre del solicitante y si el documento tiene una firma
@@ -24,52 +112,94 @@ def validate_pdf(folder: str, file_name: str)-> str:
     """
     if file_name[-4:].lower()!=".pdf":
         return "El archivo no es un PDF, no es una solicitud de vacaciones"
-    
-    from langchain.chat_models import init_chat_model
-    from langchain_core.messages import HumanMessage, SystemMessage
-    from langchain_core.prompts import ChatPromptTemplate
-    
-    #Se crea el chat model usando un modelo que soporta recibir PDFs
-    #En este ejemplo se usara gemini 2.0 flash
-    llm = init_chat_model("google_genai:gemini-2.0-flash-lite", temperature=0)
 
+    #Si el mismo PDF (por contenido) ya fue validado con el mismo modelo y prompt, se devuelve el resultado guardado
+    from pathlib import Path
+    from cache_validacion import get_validation_cache, file_sha256
+    from recorte_pdf import get_trim_cache_tag
+    cache = get_validation_cache()
+    cache_key = cache.make_key(file_sha256(Path(folder) / file_name), VALIDATION_MODEL, PROMPT_VERSION, get_trim_cache_tag())
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        return cached_result
 
-    #Obtengo el contenido del archivo en Base64 para poder enviarlo al API del LLM
-    pdf_base64 = _get_base64_file(folder, file_name)
-
-    #Se crea el prompt desde los mensajes y plantilla (ultimo mensaje con {query})
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            SystemMessage("""Asegurate que las respuestas sean en español."""),
-            HumanMessage(
-                [
-                    {
-                        "type": "file",
-                        "source_type": "base64",
-                        "data": pdf_base64,
-                        "filename": file_name,
-                        "mime_type": "application/pdf",
-                    }                    
-                ]),
-            ("human", "{query}"),
-        ]
-    )
+    #Prefiltro local: los PDFs que claramente no son solicitudes se descartan sin llamar al LLM
+    from prefiltro_solicitud import check_pdf
+    rejection = check_pdf(Path(folder) / file_name)
+    if rejection is not None:
+        return rejection
     
-    #Se encadena el output del prompt con el input del llm
-    chain = prompt | llm
+    from registro_modelos import get_chat_model
     
-    # Ejecuta la cadena 
+    #Se obtiene el chat model usando un modelo que soporta recibir PDFs
+    #En este ejemplo se usara gemini 2.0 flash, el cliente se crea una sola vez y se reutiliza en cada validación
+    llm = get_chat_model(VALIDATION_MODEL, temperature=0)
+
     # Envio el PDF al LLM para que lo valide segun las instrucciones indicadas
-    response = chain.invoke({"query":""""
-                            ¿El contenido del documento es una solicitud de vacaciones?, 
-                            si es así, obtener lo siguiente:
-                            el nombre del solicitante 
-                            si hay una firma
-                            """})
+    response = llm.invoke(_build_validation_messages(folder, file_name, VALIDATION_QUERY))
+
+    #Se guarda la respuesta en la cache para no volver a enviar el mismo PDF al LLM
+    if isinstance(response.content, str):
+        cache.set(cache_key, response.content)
 
     #Solo se devuleve un texto con la respuesta del pedido de validación del PDF (el formato es libre y lo redacta el LLM)
     return response.content
 
+#Funcion que usara un LLM para obtener los datos del PDF de forma estructurada (sin texto libre que interpretar)
+def extract_pdf_validation(folder: str, file_name: str) -> Tuple[VacationRequestValidation, str]:
+    """Devuelve los datos estructurados del PDF y su origen ("llm", "escalado" si respondió un modelo mas capaz
+    de la cascada, "cache", "prefiltro" o "formato")
+    
+    Args: 
+        folder: carpeta del archivo a validar
+        file_name: nombre del archivo a validar
+    """
+    if file_name[-4:].lower()!=".pdf":
+        return VacationRequestValidation(es_solicitud_vacaciones=False), "formato"
+
+    #Se usa la misma cache que validate_pdf, con la versión del prompt estructurado (se guarda el JSON del resultado)
+    from pathlib import Path
+    from cache_validacion import get_validation_cache, file_sha256
+    from recorte_pdf import get_trim_cache_tag
+    cache = get_validation_cache()
+    cascade = get_validation_cascade()
+    cache_key = cache.make_key(file_sha256(Path(folder) / file_name), cascade.cache_name, STRUCTURED_PROMPT_VERSION,
+                               get_trim_cache_tag())
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        return VacationRequestValidation.model_validate_json(cached_result), "cache"
+
+    #Prefiltro local: los PDFs que claramente no son solicitudes se descartan sin llamar al LLM
+    from prefiltro_solicitud import check_pdf
+    if check_pdf(Path(folder) / file_name) is not None:
+        return VacationRequestValidation(es_solicitud_vacaciones=False), "prefiltro"
+
+    #Primero el modelo mas barato, solo se escala si la respuesta no es confiable
+    response = cascade.invoke(_build_validation_messages(folder, file_name, STRUCTURED_VALIDATION_QUERY))
+
+    cache.set(cache_key, response.result.model_dump_json())
+    return response.result, "escalado" if response.escalations else "llm"
+
+#Herramienta para los agentes: valida los PDFs de un correo y aplica las condiciones del procedimiento en código,
+#el agente recibe el veredicto final en lugar de un texto que debe interpretar
+def validate_vacation_request(folder: str, file_names: List[str], sender: str, subject: str, body: str = "")-> dict:
+    """Valida si un correo es una solicitud de vacaciones válida y devuelve el veredicto final (es_valida y motivo_rechazo),
+    con el nombre del solicitante y las fechas de la solicitud
+    
+    Args: 
+        folder: carpeta con los archivos adjuntos del correo
+        file_names: nombres de los archivos adjuntos del correo
+        sender: remitente del correo
+        subject: asunto del correo
+        body: cuerpo del correo
+    """
+    from reglas_solicitud import evaluate_request
+
+    #Generador: los PDFs se envian al LLM solo hasta encontrar uno válido
+    validations = (extract_pdf_validation(folder, file_name)[0] for file_name in file_names
+                   if file_name.lower().endswith(".pdf"))
+    return evaluate_request(subject, body, sender, validations).model_dump()
+
 #Esta es la lógica principal del ejemplo
 def main(args=None):
     from dotenv import load_dotenv
@@ -81,6 +211,28 @@ def main(args=None):
     print( validate_pdf('../pdfs', 'vacaciones.pdf'))
     print('\n', 'Prueba de archivo PDF random------------------')
     print( validate_pdf('../pdfs', 'Primera_División_del_Perú.pdf'))
+    print('\n', 'Prueba de validación estructurada (cascada de modelos)------------------')
+    print( extract_pdf_validation('../pdfs', 'vacaciones.pdf'))
+
+    #Se muestran los aciertos y fallos de la cache de validaciones (al ejecutar de nuevo, los PDFs no se envian al LLM)
+    from cache_validacion import get_validation_cache
+    print('\n', 'Estadísticas de la cache de validaciones------------------')
+    print(get_validation_cache().stats())
+
+    #Se muestra cuantas llamadas al LLM se ahorraron con el prefiltro local
+    from prefiltro_solicitud import get_prefilter_stats
+    print('\n', 'Estadísticas del prefiltro------------------')
+    print(get_prefilter_stats())
+
+    #Se muestran los bytes y páginas enviados al LLM antes y despues de reducir los PDFs
+    from recorte_pdf import get_trim_stats
+    print('\n', 'Estadísticas de la reducción de PDFs------------------')
+    print(get_trim_stats())
+
+    #Se muestran las respuestas aceptadas y escaladas de cada modelo de la cascada y el ahorro estimado
+    from cascada_modelos import get_cascade_stats
+    print('\n', 'Estadísticas de la cascada de modelos------------------')
+    print(get_cascade_stats())
 
 #Solo se llamará al método principal si se ejecuta este modulo directamente
 if __name__ == "__main__":